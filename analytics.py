@@ -0,0 +1,195 @@
+# analytics.py
+
+"""Vectorised quiz analytics for LearningAI admin and cohort reports.
+The quiz table is loaded as columnar NumPy arrays (user_id, subject_id,
+score) and every aggregate is computed with array operations, so reports
+over millions of attempts take seconds instead of a Python loop per row.
+
+Levels use the same thresholds as recommender._classify_score and
+check_levels() raises if the two disagree.
+
+NumPy is only needed here, not by the web app; without it every function
+raises RuntimeError:
+
+    pip install -r requirements-analytics.txt
+    python analytics.py [--out report.json]
+"""
+
+import argparse
+import json
+import sys
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency, see requirements-analytics.txt
+    np = None
+
+from db import get_connection
+from recommender import WEAK_THRESHOLD, INTERMEDIATE_THRESHOLD, _classify_score
+
+LEVELS = ("weak", "intermediate", "strong")
+HISTOGRAM_BINS = list(range(0, 101, 10))   # [0,10) ... [90,100]
+FETCH_ROWS = 500_000
+NUMPY_MISSING = "analytics.py needs NumPy: pip install -r requirements-analytics.txt"
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError(NUMPY_MISSING)
+
+# ---------- Loading ----------
+
+def load_quiz_columns(conn=None):
+    """Return (user_ids, subject_ids, scores) arrays in quiz id order."""
+    _require_numpy()
+    cur = (conn or get_connection()).cursor()
+    cur.row_factory = None
+    cur.execute("SELECT user_id, subject_id, score FROM quizzes ORDER BY id")
+    parts = []
+    while True:
+        rows = cur.fetchmany(FETCH_ROWS)
+        if not rows:
+            break
+        parts.append(np.array(rows, dtype=np.int64))
+    data = np.concatenate(parts) if parts else np.empty((0, 3), dtype=np.int64)
+    return data[:, 0], data[:, 1], data[:, 2]
+
+def load_subject_columns(conn=None):
+    """Return (subject_ids, branch_codes, semesters, branch_names) arrays."""
+    _require_numpy()
+    cur = (conn or get_connection()).cursor()
+    cur.row_factory = None
+    rows = cur.execute("SELECT id, branch, semester FROM subjects ORDER BY id").fetchall()
+    branch_names = sorted({row[1] for row in rows})
+    codes = {name: i for i, name in enumerate(branch_names)}
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    branches = np.array([codes[row[1]] for row in rows], dtype=np.int64)
+    semesters = np.array([row[2] for row in rows], dtype=np.int64)
+    return ids, branches, semesters, branch_names
+
+# ---------- Classification ----------
+
+def classify_levels(scores):
+    """Vectorised _classify_score: 0 = weak, 1 = intermediate, 2 = strong."""
+    _require_numpy()
+    scores = np.asarray(scores)
+    return (scores >= WEAK_THRESHOLD).astype(np.int8) + (scores > INTERMEDIATE_THRESHOLD)
+
+def check_levels(scores):
+    """Raise ValueError if classify_levels disagrees with the scalar classifier
+    on any of `scores`."""
+    _require_numpy()
+    distinct = np.unique(np.asarray(scores))
+    vectorised = classify_levels(distinct)
+    for score, code in zip(distinct.tolist(), vectorised.tolist()):
+        if LEVELS[code] != _classify_score(score):
+            raise ValueError(f"score {score}: classify_levels says {LEVELS[code]!r}, "
+                             f"_classify_score says {_classify_score(score)!r}")
+
+def latest_attempts(user_ids, subject_ids, scores):
+    """Reduce attempts (in id order) to the latest one per (user, subject).
+    Returns (user_ids, subject_ids, scores) with one entry per pair.
+    """
+    _require_numpy()
+    if len(user_ids) == 0:
+        return user_ids, subject_ids, scores
+    pair = user_ids * (int(subject_ids.max()) + 1) + subject_ids
+    # First occurrence in the reversed arrays is the last attempt overall
+    _, first_rev = np.unique(pair[::-1], return_index=True)
+    last = len(pair) - 1 - first_rev
+    return user_ids[last], subject_ids[last], scores[last]
+
+# ---------- Aggregates ----------
+
+def _grouped(keys, values=None):
+    """Group by `keys`; return (unique_keys, inverse, counts, sums of `values`)."""
+    unique, inverse = np.unique(keys, return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(unique))
+    sums = np.bincount(inverse, weights=values, minlength=len(unique)) if values is not None else None
+    return unique, inverse, counts, sums
+
+def _level_counts(inverse, levels, groups):
+    """Count weak/intermediate/strong per group as a (groups, 3) array."""
+    out = np.zeros((groups, len(LEVELS)), dtype=np.int64)
+    np.add.at(out, (inverse, levels), 1)
+    return out
+
+def build_report(conn=None):
+    """Compute the full analytics report as a JSON-serialisable dict."""
+    _require_numpy()
+    q_users, q_subjects, q_scores = load_quiz_columns(conn)
+    check_levels(q_scores)
+    s_ids, s_branches, s_semesters, branch_names = load_subject_columns(conn)
+
+    users, subjects, scores = latest_attempts(q_users, q_subjects, q_scores)
+    levels = classify_levels(scores)
+
+    # Per user: subjects attempted and level counts on the latest attempt
+    u_keys, u_inv, u_counts, u_sums = _grouped(users, scores)
+    u_levels = _level_counts(u_inv, levels, len(u_keys))
+
+    # Per subject: attempts over all rows, levels of each user's latest attempt
+    subj_keys, _, subj_attempts, subj_score_sums = _grouped(q_subjects, q_scores)
+    l_keys, l_inv, _, _ = _grouped(subjects)
+    l_levels = _level_counts(l_inv, levels, len(l_keys))
+
+    # Per branch/semester, via an id -> row lookup into the subject columns
+    lookup = np.full(int(max(s_ids.max(initial=0), q_subjects.max(initial=0))) + 1, -1, dtype=np.int64)
+    lookup[s_ids] = np.arange(len(s_ids))
+    rows = lookup[subjects]
+    known = rows >= 0
+    group = s_branches[rows[known]] * 100 + s_semesters[rows[known]]
+    g_keys, g_inv, g_counts, g_sums = _grouped(group, scores[known])
+    g_levels = _level_counts(g_inv, levels[known], len(g_keys))
+
+    histogram, _ = np.histogram(q_scores, bins=HISTOGRAM_BINS)
+    latest_histogram, _ = np.histogram(scores, bins=HISTOGRAM_BINS)
+
+    return {
+        "attempts": int(len(q_scores)),
+        "users": int(len(u_keys)),
+        "level_totals": dict(zip(LEVELS, np.bincount(levels, minlength=3).tolist())),
+        "score_histogram": {
+            "bins": HISTOGRAM_BINS,
+            "all_attempts": histogram.tolist(),
+            "latest_attempts": latest_histogram.tolist(),
+        },
+        "weak_subject_count_distribution": dict(
+            zip(*[a.tolist() for a in np.unique(u_levels[:, 0], return_counts=True)])
+        ),
+        "users_detail": [
+            {"user_id": uid, "subjects": n, "mean_latest_score": round(total / n, 2),
+             "weak": lv[0], "intermediate": lv[1], "strong": lv[2]}
+            for uid, n, total, lv in zip(u_keys.tolist(), u_counts.tolist(),
+                                         u_sums.tolist(), u_levels.tolist())
+        ],
+        "subjects": [
+            {"subject_id": sid, "attempts": n, "mean_score": round(total / n, 2)}
+            for sid, n, total in zip(subj_keys.tolist(), subj_attempts.tolist(),
+                                     subj_score_sums.tolist())
+        ],
+        "subject_levels": [
+            {"subject_id": sid, "weak": lv[0], "intermediate": lv[1], "strong": lv[2]}
+            for sid, lv in zip(l_keys.tolist(), l_levels.tolist())
+        ],
+        "branch_semester": [
+            {"branch": branch_names[key // 100], "semester": key % 100, "pairs": n,
+             "mean_latest_score": round(total / n, 2),
+             "weak": lv[0], "intermediate": lv[1], "strong": lv[2]}
+            for key, n, total, lv in zip(g_keys.tolist(), g_counts.tolist(),
+                                         g_sums.tolist(), g_levels.tolist())
+        ],
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", help="write the report here instead of stdout")
+    args = parser.parse_args()
+    if np is None:
+        sys.exit(NUMPY_MISSING)
+    report = build_report()
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f)
+        print(f"Wrote report for {report['attempts']} attempts to {args.out}")
+    else:
+        print(json.dumps(report, indent=2))
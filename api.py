@@ -0,0 +1,199 @@
+# api.py
+
+"""Versioned JSON API (/api/v1) for the mobile client and reporting jobs.
+Uses the same login session as the HTML pages (log in through /login).
+
+Small documents are compact JSON. Collections that grow without bound (quiz
+history, a whole branch's catalog) stream as NDJSON, one object per line,
+straight from a database cursor or the catalog cache, so the first byte goes
+out after the first rows whatever the total size. Responses are gzip or
+brotli compressed (brotli if the package is installed) when the client's
+Accept-Encoding allows it.
+"""
+
+import json
+import zlib
+
+from flask import Blueprint, Response, abort, jsonify, request, session, stream_with_context
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+import catalog
+import db
+import planner
+import roadmaps
+from recommender import get_recommendations, STRATEGIES
+
+bp = Blueprint("api", __name__, url_prefix="/api/v1")
+
+STREAM_CHUNK_BYTES = 16 * 1024      # flush a streamed chunk once it reaches this size
+STREAM_FIRST_ROWS = 32              # ...or after this many rows for the first chunk
+MIN_COMPRESS_BYTES = 1024           # smaller JSON documents are sent as-is
+
+_encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False)
+
+# ---------- Encoding ----------
+
+def _negotiate():
+    """Pick the response Content-Encoding from Accept-Encoding (None = identity)."""
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(offered)
+
+def _compressor(encoding):
+    """Return (compress, flush, finish) callables for a streaming encoder."""
+    if encoding == "br":
+        comp = brotli.Compressor(quality=5)
+        return comp.process, comp.flush, comp.finish
+    comp = zlib.compressobj(6, zlib.DEFLATED, 31)   # wbits 31: gzip container
+    return comp.compress, lambda: comp.flush(zlib.Z_SYNC_FLUSH), comp.flush
+
+def _encode_stream(chunks, encoding):
+    if encoding is None:
+        yield from chunks
+        return
+    compress, flush, finish = _compressor(encoding)
+    for chunk in chunks:
+        # Sync-flush every chunk so the client can decode rows as they arrive
+        data = compress(chunk) + flush()
+        if data:
+            yield data
+    yield finish()
+
+def _ndjson_chunks(records):
+    """Serialise records one per line, grouped into chunks of ~STREAM_CHUNK_BYTES."""
+    buffer = []
+    size = 0
+    rows = 0
+    for record in records:
+        line = (_encoder.encode(record) + "\n").encode("utf-8")
+        buffer.append(line)
+        size += len(line)
+        rows += 1
+        if size >= STREAM_CHUNK_BYTES or rows == STREAM_FIRST_ROWS:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+def stream_ndjson(records):
+    """Stream an iterable of dicts as (possibly compressed) NDJSON."""
+    encoding = _negotiate()
+    body = _encode_stream(_ndjson_chunks(records), encoding)
+    response = Response(stream_with_context(body), mimetype="application/x-ndjson")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+def json_document(payload):
+    """Compact JSON, compressed when it is worth it and the client accepts it."""
+    body = _encoder.encode(payload).encode("utf-8")
+    encoding = _negotiate() if len(body) >= MIN_COMPRESS_BYTES else None
+    if encoding:
+        compress, _, finish = _compressor(encoding)
+        body = compress(body) + finish()
+    response = Response(body, mimetype="application/json")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+# ---------- Endpoints ----------
+
+@bp.before_request
+def require_login():
+    if "user_id" not in session:
+        response = jsonify(error="login required")
+        response.status_code = 401
+        return response
+
+@bp.errorhandler(400)
+@bp.errorhandler(404)
+def json_error(exc):
+    response = jsonify(error=exc.description)
+    response.status_code = exc.code
+    return response
+
+def _subject_json(subject):
+    return {
+        "id": subject["id"],
+        "branch": subject["branch"],
+        "semester": subject["semester"],
+        "name": subject["name"],
+        "roadmap": subject["roadmap"],
+        "notes": subject["notes"],
+        "videos": subject["videos"],
+    }
+
+DASHBOARD_SCORES_SQL = (
+    "SELECT s.id, s.name, m.latest_score AS score, m.best_score, m.attempts, m.level "
+    "FROM mastery m JOIN subjects s ON m.subject_id = s.id "
+    "WHERE m.user_id = ? ORDER BY m.last_quiz_id"
+)
+
+@bp.route("/dashboard")
+def dashboard():
+    """The dashboard page's data: profile, current subjects, latest scores, domain roadmap."""
+    branch, semester = session["branch"], session["semester"]
+    scores = db.get_connection().execute(DASHBOARD_SCORES_SQL, (session["user_id"],)).fetchall()
+    return json_document({
+        "user": {"id": session["user_id"], "name": session["name"], "branch": branch, "semester": semester},
+        "subjects": [_subject_json(s) for s in catalog.get_semester(branch, semester)],
+        "scores": [dict(row) for row in scores],
+        "domain_roadmap": roadmaps.get_branch_roadmap(branch),
+    })
+
+@bp.route("/semesters/<int:sem>")
+def semester(sem):
+    """Subjects of one semester (?branch= defaults to the user's branch)."""
+    branch = request.args.get("branch") or session["branch"]
+    return json_document({
+        "branch": branch,
+        "semester": sem,
+        "subjects": [_subject_json(s) for s in catalog.get_semester(branch, sem)],
+    })
+
+SEMESTERS_SQL = "SELECT DISTINCT semester FROM subjects WHERE branch = ? ORDER BY semester"
+
+@bp.route("/subjects")
+def subjects():
+    """Every subject of a branch (?branch=, default the user's), streamed as NDJSON."""
+    branch = request.args.get("branch") or session["branch"]
+    semesters = [row[0] for row in db.get_connection().execute(SEMESTERS_SQL, (branch,))]
+
+    def records():
+        for sem in semesters:
+            for subject in catalog.get_semester(branch, sem):
+                yield _subject_json(subject)
+    return stream_ndjson(records())
+
+@bp.route("/recommendations")
+def recommendations():
+    """get_recommendations() output as a list (?strategy=rule|cf), plus the
+    prerequisite-ordered learning path for the user's weak subjects."""
+    strategy = request.args.get("strategy", "rule")
+    if strategy not in STRATEGIES:
+        abort(400, description=f"unknown strategy {strategy!r}; expected one of {', '.join(STRATEGIES)}")
+    recs = get_recommendations(session["user_id"], strategy=strategy)
+    return json_document({
+        "strategy": strategy,
+        "recommendations": [dict(data, subject=name) for name, data in recs.items()],
+        "learning_path": planner.get_learning_path(session["user_id"], session["branch"]),
+    })
+
+HISTORY_SQL = (
+    "SELECT q.id, q.subject_id, s.name AS subject, q.score FROM quizzes q "
+    "JOIN subjects s ON s.id = q.subject_id WHERE q.user_id = ? AND q.id > ? ORDER BY q.id"
+)
+
+@bp.route("/quizzes")
+def quizzes():
+    """The user's quiz history, oldest first, streamed as NDJSON.
+    ?after=<quiz id> resumes after the last record already received.
+    """
+    after = request.args.get("after", type=int, default=0)
+    cursor = db.get_connection().execute(HISTORY_SQL, (session["user_id"], after))
+    return stream_ndjson(dict(row) for row in cursor)
@@ -4,26 +4,77 @@
 Provides routes for signup, login, dashboard, semester view, quiz handling, and recommendations.
 """
 
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, abort, make_response, flash
+from itsdangerous import BadSignature, TimestampSigner
+from werkzeug.middleware.proxy_fix import ProxyFix
 from db_init import init_db
-from werkzeug.security import generate_password_hash, check_password_hash
-import sqlite3
+import db
+import catalog
+import roadmaps
+import quizbank
+import quiz_writer
+import instrumentation
+import api
+import passwords
+import ratelimit
+import sessions
+import planner
+import jobs
+import fragments
+import assets
+from recommender import get_recommendations, STRATEGIES
 import os
 import json
+import hashlib
+import math
+from datetime import datetime, timezone
 
 app = Flask(__name__)
+# Reverse proxies in front of the app: none by default, so a client cannot pick
+# its own address; the procfile declares Render's router (1). With the client
+# address taken from X-Forwarded-For, rate limits key on the student, not the proxy.
+PROXY_HOPS = int(os.environ.get("PROXY_HOPS", "0"))
+if PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_HOPS, x_proto=PROXY_HOPS)
 init_db()
-app.secret_key = os.urandom(24)
+instrumentation.install(app)   # no-op unless LEARNING_AI_METRICS is set; before anything opens a connection
+sessions.install(app)          # shared secret key + server-side sessions
+app.register_blueprint(api.bp)  # JSON API under /api/v1
+jobs.install(app)              # background job scheduler, unless LEARNING_AI_JOBS=0
+fragments.install(app)         # {% cache %} blocks in templates
+assets.install(app)            # fingerprinted, precompressed static files
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "learning_ai.db")
+DB_PATH = db.DB_PATH
 
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # Pooled per-thread connection; do not close it
+    return db.get_connection()
+
+@app.teardown_appcontext
+def release_db_connection(exc):
+    db.release()
 
 # ---------- Authentication ----------
+# Login/signup floods are refused per IP and per email before they reach the
+# (deliberately slow) password hash; hashing itself runs on passwords' pool.
+# The per-email bucket does the real throttling. The per-IP one is only a
+# flood backstop, set high because a whole class can share one campus NAT address.
+LOGIN_IP_LIMIT = ratelimit.TokenBucketLimiter(
+    rate=float(os.environ.get("LOGIN_IP_RATE", "20")), burst=int(os.environ.get("LOGIN_IP_BURST", "600")))
+LOGIN_EMAIL_LIMIT = ratelimit.TokenBucketLimiter(
+    rate=float(os.environ.get("LOGIN_EMAIL_RATE", "0.05")), burst=int(os.environ.get("LOGIN_EMAIL_BURST", "5")))
+
+def _too_many_attempts(template, wait):
+    retry_after = math.ceil(wait)
+    response = make_response(render_template(template, error=f'Too many attempts, try again in {retry_after} s'), 429)
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def _server_busy(template):
+    response = make_response(render_template(template, error='Server is busy, please try again in a moment'), 503)
+    response.headers['Retry-After'] = '1'
+    return response
+
 @app.route('/signup', methods=['GET', 'POST'])
 def signup():
     if request.method == 'POST':
@@ -32,28 +83,45 @@ def signup():
         password = request.form['password']
         branch = request.form['branch']
         semester = int(request.form['semester'])
-        pw_hash = generate_password_hash(password)
-        conn = get_db_connection()
+        wait = LOGIN_IP_LIMIT.acquire(request.remote_addr)
+        if wait:
+            return _too_many_attempts('signup.html', wait)
         try:
+            pw_hash = passwords.hash_password(password)
+        except passwords.Busy:
+            return _server_busy('signup.html')
+        with db.transaction() as conn:
             conn.execute(
                 "INSERT INTO users (name, email, password_hash, branch, semester) VALUES (?,?,?,?,?)",
                 (name, email, pw_hash, branch, semester)
             )
-            conn.commit()
-        finally:
-            conn.close()
         return redirect(url_for('login'))
     return render_template('signup.html')
 
+USER_BY_EMAIL_SQL = 'SELECT * FROM users WHERE email = ?'
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         email = request.form['email']
         password = request.form['password']
+        wait = max(LOGIN_IP_LIMIT.acquire(request.remote_addr), LOGIN_EMAIL_LIMIT.acquire(email.lower()))
+        if wait:
+            return _too_many_attempts('login.html', wait)
         conn = get_db_connection()
-        user = conn.execute('SELECT * FROM users WHERE email = ?', (email,)).fetchone()
-        conn.close()
-        if user and check_password_hash(user['password_hash'], password):
+        user = conn.execute(USER_BY_EMAIL_SQL, (email,)).fetchone()
+        try:
+            valid, new_hash = passwords.verify_password(user['password_hash'], password) if user else (False, None)
+        except passwords.Busy:
+            return _server_busy('login.html')
+        if valid:
+            if new_hash:
+                # Hash was made with outdated parameters; store the upgraded one
+                with db.transaction() as conn:
+                    conn.execute(
+                        "UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?",
+                        (new_hash, user['id'], user['password_hash'])
+                    )
             session['user_id'] = user['id']
             session['name'] = user['name']
             session['branch'] = user['branch']
@@ -69,33 +137,25 @@ def logout():
     return redirect(url_for('login'))
 
 # ---------- Dashboard ----------
+DASHBOARD_SCORES_SQL = (
+    "SELECT s.name, m.latest_score AS score FROM mastery m JOIN subjects s ON m.subject_id = s.id "
+    "WHERE m.user_id = ? ORDER BY m.last_quiz_id"
+)
+
 @app.route('/')
 @app.route('/dashboard')
 def dashboard():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     user_id = session['user_id']
-    conn = get_db_connection()
     # Get subjects for current branch & semester
-    subjects = conn.execute(
-        "SELECT * FROM subjects WHERE branch = ? AND semester = ?",
-        (session['branch'], session['semester'])
-    ).fetchall()
+    subjects = catalog.get_semester(session['branch'], session['semester'])
     # Get quiz scores for this user
-    scores = conn.execute(
-        "SELECT s.name, q.score FROM quizzes q JOIN subjects s ON q.subject_id = s.id WHERE q.user_id = ?",
-        (user_id,)
-    ).fetchall()
-    conn.close()
+    conn = get_db_connection()
+    scores = conn.execute(DASHBOARD_SCORES_SQL, (user_id,)).fetchall()
     
-    # Load Domain Roadmap
-    roadmap_path = os.path.join(os.path.dirname(__file__), 'data', 'domain_roadmaps.json')
-    domain_roadmap = []
-    if os.path.exists(roadmap_path):
-        import json
-        with open(roadmap_path, 'r') as f:
-            all_roadmaps = json.load(f)
-            domain_roadmap = all_roadmaps.get(session['branch'], [])
+    # Domain Roadmap (parsed once, reloaded when the file changes)
+    domain_roadmap = roadmaps.get_branch_roadmap(session['branch'])
 
     # Build a dict of subject -> score (or None)
     score_map = {row['name']: row['score'] for row in scores}
@@ -106,77 +166,75 @@ def dashboard():
 def semester_view(sem):
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    conn = get_db_connection()
-    rows = conn.execute(
-        "SELECT * FROM subjects WHERE branch = ? AND semester = ?",
-        (session['branch'], sem)
-    ).fetchall()
-    conn.close()
-
-    # Parse roadmap_json for each subject
-    subjects = []
-    for row in rows:
-        s = dict(row)
-        try:
-            s['roadmap'] = json.loads(s['roadmap_json'])
-        except (TypeError, ValueError):
-            s['roadmap'] = []
-        subjects.append(s)
-
-    return render_template('semester.html', semester=sem, subjects=subjects)
+    # Roadmaps come pre-parsed from the catalog cache
+    subjects = catalog.get_semester(session['branch'], sem)
+    return render_template('semester.html', branch=session['branch'], semester=sem, subjects=subjects)
 
 # ---------- Quiz ----------
+QUIZ_TOKEN_MAX_AGE = 6 * 3600   # seconds a served quiz can be submitted for
+
+# The questions served are signed into the form (user, subject, question ids,
+# time) rather than remembered in the session, so a quiz GET writes nothing
+def _quiz_signer():
+    return TimestampSigner(app.secret_key, salt="learning-ai-quiz")
+
+def _quiz_token(subject_id, question_ids):
+    payload = f"{session['user_id']}:{subject_id}:{','.join(map(str, question_ids))}"
+    return _quiz_signer().sign(payload).decode("ascii")
+
+def _served_questions(subject_id, token):
+    """Question ids signed into `token` for this user and subject, or None."""
+    try:
+        payload = _quiz_signer().unsign(token, max_age=QUIZ_TOKEN_MAX_AGE).decode("ascii")
+    except BadSignature:    # also SignatureExpired
+        return None
+    user_id, signed_subject, ids = payload.split(":")
+    if user_id != str(session['user_id']) or signed_subject != str(subject_id):
+        return None
+    return [int(qid) for qid in ids.split(",") if qid]
+
 @app.route('/quiz/<int:subject_id>', methods=['GET', 'POST'])
 def quiz(subject_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    conn = get_db_connection()
-    subject = conn.execute('SELECT * FROM subjects WHERE id = ?', (subject_id,)).fetchone()
+    subject = catalog.get_subject(subject_id)
+    if subject is None:
+        abort(404)
     
     if request.method == 'POST':
-        # Backend-controlled Grading Logic
-        # Correct answer key (corresponding to the mock quiz in quiz.html)
-        # In a real app, this would be fetched from a 'questions' table
-        answer_key = {
-            'q1': 'correct',
-            'q2': 'correct',
-            'q3': 'correct',
-            'q4': 'correct',
-            'q5': 'correct'
-        }
-        
-        score_counter = 0
-        total_questions = len(answer_key)
-        
-        for q_id, correct_val in answer_key.items():
-            user_answer = request.form.get(q_id)
-            if user_answer == correct_val:
-                score_counter += 1
+        # Graded against exactly what was handed out, whatever else the form claims
+        served = _served_questions(subject_id, request.form.get('quiz_token', ''))
+        if served is None:
+            flash("This quiz has expired. Here is a fresh one.")
+            return redirect(url_for('quiz', subject_id=subject_id))
+        # Backend-controlled Grading Logic: answer keys come from the
+        # cached question bank, so grading needs no database read
+        final_score = quizbank.grade(subject_id, served, request.form)
+        if final_score is None:
+            flash("The questions for this subject were updated. Please take the new quiz.")
+            return redirect(url_for('quiz', subject_id=subject_id))
         
-        # Calculate percentage
-        final_score = int((score_counter / total_questions) * 100)
-        
-        # Store in DB
-        conn.execute(
-            "INSERT INTO quizzes (user_id, subject_id, score) VALUES (?,?,?)",
-            (session['user_id'], subject_id, final_score)
-        )
-        conn.commit()
-        conn.close()
+        # Store in DB (and the mastery summary), per QUIZ_WRITE_MODE
+        quiz_writer.store_attempt(session['user_id'], subject_id, final_score)
         return redirect(url_for('dashboard'))
         
-    conn.close()
-    return render_template('quiz.html', subject=subject)
+    questions = quizbank.sample_questions(subject_id)
+    token = _quiz_token(subject_id, [q['id'] for q in questions])
+    return render_template('quiz.html', subject=subject, questions=questions, quiz_token=token)
 
 # ---------- Recommendations ----------
 @app.route('/recommendations')
 def recommendations():
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    from recommender import get_recommendations
-    recs = get_recommendations(session['user_id'])
-    return render_template('recommendations.html', recommendations=recs)
+    strategy = request.args.get('strategy', 'rule')
+    if strategy not in STRATEGIES:
+        strategy = 'rule'
+    with instrumentation.timed('recommender'):
+        recs = get_recommendations(session['user_id'], strategy=strategy)
+        path = planner.get_learning_path(session['user_id'], session['branch'])
+    return render_template('recommendations.html', recommendations=recs, strategy=strategy, path=path)
 
 # ---------- Update Profile ----------
 @app.route('/update_profile', methods=['POST'])
@@ -187,13 +245,11 @@ def update_profile():
     new_branch = request.form['branch']
     new_sem = int(request.form['semester'])
     
-    conn = get_db_connection()
-    conn.execute(
-        "UPDATE users SET branch = ?, semester = ? WHERE id = ?",
-        (new_branch, new_sem, session['user_id'])
-    )
-    conn.commit()
-    conn.close()
+    with db.transaction() as conn:
+        conn.execute(
+            "UPDATE users SET branch = ?, semester = ? WHERE id = ?",
+            (new_branch, new_sem, session['user_id'])
+        )
     
     # Update session
     session['branch'] = new_branch
@@ -202,6 +258,43 @@ def update_profile():
     return redirect(url_for('dashboard'))
 
 # ---------- Global Library ----------
+BRANCHES = (
+    "Computer Science Engineering", "Information Technology", "Artificial Intelligence & Machine Learning",
+    "Data Science", "Web Development", "Cyber Security", "Cloud & DevOps",
+    "Mechanical Engineering", "Electrical Engineering", "Electronics & Communication Engineering",
+    "Civil Engineering", "Chemical Engineering", "Biotechnology",
+    "Automobile Engineering", "Aerospace Engineering", "Instrumentation Engineering"
+)
+
+def _deployed_build():
+    """(id, unix time) of the deployed templates, app code and asset set.
+    Cached catalog pages embed all three, so a deploy must change their validators."""
+    digest = hashlib.sha1(os.environ.get("BUILD_ID", "").encode())
+    digest.update(assets.build_id().encode())
+    deployed_at = 0
+    paths = [os.path.abspath(__file__)]
+    for root, _, files in os.walk(os.path.join(app.root_path, app.template_folder)):
+        paths.extend(os.path.join(root, name) for name in files)
+    for path in sorted(paths):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+        deployed_at = max(deployed_at, int(os.stat(path).st_mtime))
+    return digest.hexdigest()[:12], deployed_at
+
+BUILD_ID, DEPLOYED_AT = _deployed_build()
+
+def _catalog_validators(*key):
+    """Weak ETag and Last-Modified for a catalog page identified by `key`."""
+    version, updated_at = catalog.get_version()
+    digest = hashlib.sha1(json.dumps([BUILD_ID, version, *key]).encode()).hexdigest()[:16]
+    last_modified = datetime.fromtimestamp(max(updated_at or 0, DEPLOYED_AT), timezone.utc)
+    return digest, last_modified
+
+def _not_modified(etag):
+    # Only the ETag decides: Last-Modified has one-second resolution and
+    # cannot tell two builds deployed within the same second apart
+    return bool(request.if_none_match) and request.if_none_match.contains_weak(etag)
+
 @app.route('/library', methods=['GET', 'POST'])
 def library():
     if 'user_id' not in session:
@@ -213,45 +306,38 @@ def library():
         selected_sem = int(request.form.get('semester') or request.args.get('semester') or session['semester'])
     except:
         selected_sem = 1
-        
-    conn = get_db_connection()
-    
-    # Get subjects
-    subjects = conn.execute(
-        "SELECT id, name, branch, semester FROM subjects WHERE branch = ? AND semester = ?",
-        (selected_branch, selected_sem)
-    ).fetchall()
-    
-    # For each subject, get resources
-    library_data = []
-    for sub in subjects:
-        res = conn.execute(
-            "SELECT note_url, video_url FROM resources WHERE subject_id = ?",
-            (sub['id'],)
-        ).fetchall()
-        
-        library_data.append({
-            "name": sub['name'],
-            "notes": [r['note_url'] for r in res],
-            "videos": [r['video_url'] for r in res]
-        })
-        
-    conn.close()
-    
-    # Pass branch list for dropdown
-    branches = [
-        "Computer Science Engineering", "Information Technology", "Artificial Intelligence & Machine Learning",
-        "Data Science", "Web Development", "Cyber Security", "Cloud & DevOps",
-        "Mechanical Engineering", "Electrical Engineering", "Electronics & Communication Engineering",
-        "Civil Engineering", "Chemical Engineering", "Biotechnology",
-        "Automobile Engineering", "Aerospace Engineering", "Instrumentation Engineering"
-    ]
-    
-    return render_template('library.html', 
-                           library_data=library_data, 
-                           current_branch=selected_branch, 
-                           current_sem=selected_sem,
-                           branches=branches)
+    after = request.args.get('after', type=int, default=0)
+
+    # Conditional GET: the page only changes when the catalog is reseeded
+    etag, last_modified = _catalog_validators('library', selected_branch, selected_sem, after)
+    if request.method == 'GET' and _not_modified(etag):
+        response = app.response_class(status=304)
+    else:
+        # One page of subjects with their resources, from the catalog cache
+        library_data, next_cursor = catalog.get_semester_page(selected_branch, selected_sem, after)
+        response = make_response(render_template('library.html',
+                                                 library_data=library_data,
+                                                 current_branch=selected_branch,
+                                                 current_sem=selected_sem,
+                                                 after=after,
+                                                 next_cursor=next_cursor,
+                                                 branches=BRANCHES))
+    response.set_etag(etag, weak=True)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
+
+# ---------- Search ----------
+@app.route('/search')
+def search():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    query = request.args.get('q', '').strip()
+    branch = request.args.get('branch') or None
+    results = catalog.search(query, branch=branch) if query else []
+    return render_template('search.html', query=query, branch=branch, results=results)
 
 # ---------- Resource Viewer ----------
 @app.route('/view_resource')
@@ -267,26 +353,23 @@ def view_resource():
     except:
         semester = session['semester']
     
-    conn = get_db_connection()
-    row = conn.execute(
-        """
-        SELECT r.note_url, r.video_url 
-        FROM resources r
-        JOIN subjects s ON r.subject_id = s.id
-        WHERE s.name = ? AND s.branch = ? AND s.semester = ?
-        """,
-        (subject_name, branch, semester)
-    ).fetchone()
-    conn.close()
-
-    if not row:
+    subject = catalog.find_subject(subject_name, branch, semester)
+    if not subject and subject_name:
+        # Not in that semester: the same subject elsewhere in the branch, by
+        # exact name only, or else the external search below
+        wanted = subject_name.casefold()
+        match = next((m for m in catalog.search(subject_name, branch=branch)
+                      if m['branch'] == branch and m['name'].casefold() == wanted), None)
+        subject = catalog.get_subject(match['id']) if match else None
+
+    if not subject or not subject['notes']:
         # Fallback to a search if not found in our seed data
         if res_type == 'video':
             embed_url = f"https://www.youtube.com/embed?listType=search&list={subject_name}+tutorial"
         else:
             embed_url = f"https://www.bing.com/search?q={subject_name}+notes+pdf"
     else:
-        embed_url = row['video_url'] if res_type == 'video' else row['note_url']
+        embed_url = subject['videos'][0] if res_type == 'video' else subject['notes'][0]
 
     return render_template('viewer.html', subject=subject_name, res_type=res_type, embed_url=embed_url)
 
@@ -0,0 +1,249 @@
+# assets.py
+
+"""Fingerprinted, precompressed static assets.
+`python assets.py build` copies every file under static/ into static/dist/
+under a content-hashed name (style.css -> style.3f9a1c2b7d40.css), minifying
+CSS and JS on the way and writing .gz (and .br, if the brotli package is
+installed) variants next to each file that compresses well. A manifest maps
+the logical names to the hashed ones.
+
+Templates link assets with ``{{ asset_url('style.css') }}``, which resolves the
+hashed name, and /assets/<name> serves the precompressed variant the client
+accepts with a one-year ``immutable`` Cache-Control: a changed file gets a new
+URL, so browsers never revalidate the old one and repeat page loads fetch no
+static bytes at all. Without a build, asset_url falls back to Flask's plain
+/static URL.
+
+install() rebuilds at startup when a source file has changed since the last
+build (ASSETS_AUTOBUILD=0 turns that off for read-only deployments).
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import sys
+import threading
+
+from flask import Response, abort, request, url_for
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_PATH = os.path.join(DIST_DIR, "manifest.json")
+
+AUTOBUILD = os.environ.get("ASSETS_AUTOBUILD", "1") != "0"
+URL_PREFIX = "/assets"
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+HASH_LENGTH = 12
+MIN_SAVING = 0.1        # keep a compressed variant only if it is at least 10% smaller
+
+_manifest = None        # {"files": {logical: hashed}, "sources": {logical: stamp}}
+_bodies = {}            # (hashed, encoding) -> bytes, filled on first request
+_lock = threading.Lock()
+_stats = {"requests": 0, "br": 0, "gzip": 0, "identity": 0, "bytes_sent": 0}
+
+# ---------- Minification ----------
+
+# Quoted strings are copied verbatim; only the text between them is minified
+_STRING = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')""")
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_CSS_SPACE_AROUND = re.compile(r"\s*([{};,>])\s*")
+_CSS_SPACE_AFTER_COLON = re.compile(r":\s+")   # a space *before* ':' is a descendant combinator
+
+def minify_css(text):
+    text = _CSS_COMMENT.sub("", text)
+    out = []
+    for i, part in enumerate(_STRING.split(text)):
+        if i % 2 == 0:
+            part = re.sub(r"\s+", " ", part)
+            part = _CSS_SPACE_AROUND.sub(r"\1", part)
+            part = _CSS_SPACE_AFTER_COLON.sub(":", part)
+            part = part.replace(";}", "}")
+        out.append(part)
+    return "".join(out).strip()
+
+def minify_js(text):
+    """Drop indentation, blank lines and whole-line // comments.
+    Lines are never joined, so automatic semicolon insertion is unaffected."""
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith("//"):
+            lines.append(line)
+    return "\n".join(lines)
+
+MINIFIERS = {".css": minify_css, ".js": minify_js}
+
+# ---------- Build ----------
+
+def _file_stamp(path):
+    st = os.stat(path)
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+def _sources():
+    """Yield (logical name, path) for every file under static/ except the build output."""
+    for root, dirs, files in os.walk(STATIC_DIR):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != DIST_DIR)
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            yield os.path.relpath(path, STATIC_DIR).replace(os.sep, "/"), path
+
+def _write(path, data):
+    """Write atomically, so a concurrent reader (or builder) never sees a partial file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def _compressed(data):
+    """Return {encoding: bytes} for the variants worth keeping."""
+    variants = {"gzip": gzip.compress(data, 9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=11)
+    return {enc: body for enc, body in variants.items()
+            if len(body) <= len(data) * (1 - MIN_SAVING)}
+
+_SUFFIX = {"gzip": ".gz", "br": ".br"}
+
+def build():
+    """Build static/dist/ and its manifest. Returns the manifest."""
+    files, sources, encodings = {}, {}, {}
+    total_in = total_out = 0
+    for logical, path in _sources():
+        with open(path, "rb") as f:
+            data = f.read()
+        stamp = _file_stamp(path)
+        stem, ext = os.path.splitext(logical)
+        minify = MINIFIERS.get(ext.lower())
+        if minify is not None:
+            data = minify(data.decode("utf-8")).encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        hashed = f"{stem}.{digest}{ext}"
+        target = os.path.join(DIST_DIR, hashed)
+        variants = _compressed(data)
+        if not os.path.exists(target):
+            for enc, body in variants.items():
+                _write(target + _SUFFIX[enc], body)
+            _write(target, data)     # last: its presence marks the set complete
+        files[logical] = hashed
+        sources[logical] = stamp
+        encodings[hashed] = sorted(variants)
+        total_in += os.path.getsize(path)
+        total_out += min([len(data)] + [len(body) for body in variants.values()])
+    manifest = {"files": files, "sources": sources, "encodings": encodings}
+    _write(MANIFEST_PATH, json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+    print(f"assets: built {len(files)} files, {total_in} -> {total_out} bytes "
+          f"(brotli {'on' if brotli is not None else 'off'})")
+    return manifest
+
+def _read_manifest():
+    try:
+        with open(MANIFEST_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _is_stale(manifest):
+    if manifest is None:
+        return True
+    current = {}
+    for logical, path in _sources():
+        current[logical] = _file_stamp(path)
+    return current != manifest.get("sources")
+
+def load(autobuild=AUTOBUILD):
+    """Load the manifest, rebuilding first if the sources changed."""
+    global _manifest
+    manifest = _read_manifest()
+    if autobuild and _is_stale(manifest):
+        try:
+            manifest = build()
+        except OSError as exc:
+            print(f"assets: build failed ({exc}); serving plain /static files")
+    with _lock:
+        _manifest = manifest
+        _bodies.clear()
+    return manifest
+
+# ---------- Serving ----------
+
+def asset_url(filename):
+    """URL of a static file: the fingerprinted /assets URL if it has been built."""
+    manifest = _manifest
+    hashed = manifest["files"].get(filename) if manifest else None
+    if hashed is None:
+        return url_for("static", filename=filename)
+    return f"{URL_PREFIX}/{hashed}"
+
+def _body(hashed, encoding):
+    key = (hashed, encoding)
+    body = _bodies.get(key)
+    if body is None:
+        path = os.path.join(DIST_DIR, hashed) + _SUFFIX.get(encoding, "")
+        try:
+            with open(path, "rb") as f:
+                body = f.read()
+        except FileNotFoundError:
+            return None
+        _bodies[key] = body
+    return body
+
+def serve(filename):
+    manifest = _manifest
+    offered = manifest["encodings"].get(filename) if manifest else None
+    if offered is None:
+        abort(404)
+    if brotli is None and "br" in offered:
+        offered = [enc for enc in offered if enc != "br"]
+    encoding = request.accept_encodings.best_match(sorted(offered)) if offered else None
+    body = _body(filename, encoding)
+    if body is None:
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    if mimetype.startswith("text/") or mimetype == "application/javascript":
+        mimetype += "; charset=utf-8"
+    resp = Response(body, content_type=mimetype)
+    resp.headers["Cache-Control"] = CACHE_CONTROL
+    resp.headers["Vary"] = "Accept-Encoding"
+    # The hash in the name is already a strong validator for the identity body
+    resp.set_etag(filename.rsplit(".", 2)[-2] + ("-" + encoding if encoding else ""))
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+    _stats["requests"] += 1
+    _stats[encoding or "identity"] += 1
+    _stats["bytes_sent"] += len(body)
+    return resp.make_conditional(request)
+
+def build_id():
+    """Short digest of the built asset set, "" without a build. Changes with any asset."""
+    manifest = _manifest
+    if not manifest:
+        return ""
+    return hashlib.sha256(json.dumps(manifest["files"], sort_keys=True).encode("utf-8")).hexdigest()[:HASH_LENGTH]
+
+def get_stats():
+    manifest = _manifest
+    return dict(_stats, files=len(manifest["files"]) if manifest else 0,
+                cached_bodies=len(_bodies))
+
+def install(app):
+    """Build/load the manifest, add the /assets route and the asset_url() template global."""
+    load()
+    app.add_url_rule(URL_PREFIX + "/<path:filename>", "assets", serve)
+    app.jinja_env.globals["asset_url"] = asset_url
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["build"]:
+        build()
+    else:
+        print("usage: python assets.py build")
+        sys.exit(2)
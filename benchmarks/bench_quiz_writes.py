@@ -0,0 +1,69 @@
+# benchmarks/bench_quiz_writes.py
+
+"""Sustained quiz submissions per second for each QUIZ_WRITE_MODE.
+Worker threads stand in for concurrent quiz() POSTs and each calls
+quiz_writer.store_attempt() against a fresh database.
+
+    python benchmarks/bench_quiz_writes.py --threads 32 --per-thread 200
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORKDIR = tempfile.mkdtemp(prefix="bench-quiz-writes-")
+os.environ["LEARNING_AI_DB"] = os.path.join(WORKDIR, "bench.db")
+
+import db  # noqa: E402
+import db_init  # noqa: E402
+import quiz_writer  # noqa: E402
+
+
+def run(mode, threads, per_thread):
+    db.DB_PATH = os.path.join(WORKDIR, f"{mode}.db")
+    db_init.init_db(db.DB_PATH, seed=False)
+    errors = []
+
+    def worker(n):
+        rng = random.Random(n)
+        try:
+            for _ in range(per_thread):
+                quiz_writer.store_attempt(rng.randint(1, 1000), rng.randint(1, 640), rng.randint(0, 100), mode=mode)
+        except Exception as exc:
+            errors.append(exc)
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    quiz_writer.get_writer().flush()
+    seconds = time.perf_counter() - started
+    total = threads * per_thread
+    rows = db.get_connection().execute("SELECT COUNT(*) FROM quizzes").fetchone()[0]
+    return {"submissions": total, "stored": rows, "errors": len(errors),
+            "seconds": round(seconds, 3), "per_second": round(total / seconds)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--per-thread", type=int, default=200)
+    parser.add_argument("--modes", default=",".join(quiz_writer.WRITE_MODES))
+    args = parser.parse_args()
+    results = {mode: run(mode, args.threads, args.per_thread) for mode in args.modes.split(",")}
+    results["writer"] = quiz_writer.get_writer().get_stats()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+# benchmarks/bench_routes.py
+
+"""Latency and throughput for every LearningAI route.
+Builds a synthetic database (catalog, users, quiz history), then drives each
+route either in-process through Flask's test client or over HTTP against a
+gunicorn started from the procfile, and reports p50/p95/p99 latency and
+requests per second as JSON.
+
+    python benchmarks/bench_routes.py --users 500 --attempts 40 --out before.json
+    python benchmarks/bench_routes.py --gunicorn --workers 1 --out gunicorn.json
+
+Use --db to keep the database between runs (it is only built if missing).
+With --base-url the server must already be running on a database built by
+this script (LEARNING_AI_DB=<--db path> gunicorn app:app).
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import platform
+import random
+import re
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Every benchmark client logs in from one address, over and over: lift the
+# login rate limits (inherited by --gunicorn) so they do not show up as errors.
+os.environ.setdefault("LOGIN_IP_BURST", "1000000")
+os.environ.setdefault("LOGIN_EMAIL_BURST", "1000000")
+
+from generate_data import LOAD_TEST_PASSWORD as PASSWORD, SEMESTERS  # noqa: E402
+
+ROUTES = ("login", "dashboard", "semester", "quiz_get", "quiz_post",
+          "recommendations", "library", "view_resource")
+
+QUIZ_TOKEN_RE = re.compile(r'name="quiz_token" value="([^"]+)"')
+
+# ---------- Synthetic database ----------
+
+def build_database(path, users, subjects_per_branch, attempts, seed):
+    """Create a database at `path` with generate_data.py: the catalog padded to
+    `subjects_per_branch`, `users` students and about `attempts` quizzes each."""
+    from generate_data import iter_catalog, write_sqlite
+    started = time.perf_counter()
+    write_sqlite(path, iter_catalog(max(1, subjects_per_branch // SEMESTERS)), users, attempts, seed)
+    print(f"Built {path} in {time.perf_counter() - started:.1f}s")
+
+def load_fixtures(path):
+    """Read what the workload needs (users, subjects, answer keys) from the database."""
+    import sqlite3
+    import db
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    db.attach_catalog(conn, db.catalog_path(path))
+    users = [dict(row) for row in conn.execute("SELECT id, email, branch, semester FROM users")]
+    subjects = defaultdict(list)
+    for row in conn.execute("SELECT id, branch, semester, name FROM subjects"):
+        subjects[row["branch"], row["semester"]].append((row["id"], row["name"]))
+    questions = defaultdict(list)
+    for row in conn.execute("SELECT subject_id, id FROM questions ORDER BY subject_id, position"):
+        questions[row["subject_id"]].append(row["id"])
+    conn.close()
+    return users, subjects, questions
+
+# ---------- Clients ----------
+
+class TestClient:
+    """In-process requests through app.test_client(). The last response body is kept in `body`."""
+
+    def __init__(self, app):
+        self._client = app.test_client()
+        self.body = ""
+
+    def request(self, method, path, data=None):
+        response = self._client.open(path, method=method, data=data)
+        self.body = response.get_data(as_text=True)
+        return response.status_code, response.headers.get("Location", "")
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+class HttpClient:
+    """Requests to a running server, with its own cookie jar and no redirect following."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.body = ""
+        self._opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect)
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self._opener.open(req) as response:
+                self.body = response.read().decode("utf-8", "replace")
+                return response.status, response.headers.get("Location", "")
+        except urllib.error.HTTPError as exc:
+            self.body = exc.read().decode("utf-8", "replace")
+            return exc.code, exc.headers.get("Location", "")
+
+# ---------- Workload ----------
+
+class Session:
+    """One simulated student: a client logged in as a benchmark user."""
+
+    def __init__(self, client, user, subjects, questions, rng):
+        self.client, self.user, self.rng = client, user, rng
+        self.subjects = subjects[user["branch"], user["semester"]] or [(1, "Unknown")]
+        self.questions = questions
+        self._served = None
+
+    def login(self):
+        return self.client.request("POST", "/login", {"email": self.user["email"], "password": PASSWORD})
+
+    def prepare(self, route):
+        """Untimed setup for the next call(route): a quiz must be served before it is submitted."""
+        if route == "quiz_post":
+            subject_id, _ = self.rng.choice(self.subjects)
+            self.client.request("GET", f"/quiz/{subject_id}")
+            match = QUIZ_TOKEN_RE.search(self.client.body)
+            self._served = (subject_id, match.group(1) if match else "")
+
+    def call(self, route):
+        """Issue one request for `route`. Returns (status, location, expected status)."""
+        rng = self.rng
+        subject_id, subject_name = rng.choice(self.subjects)
+        if route == "login":
+            return self.login() + (302,)
+        if route == "dashboard":
+            return self.client.request("GET", "/dashboard") + (200,)
+        if route == "semester":
+            return self.client.request("GET", f"/semester/{rng.randint(1, SEMESTERS)}") + (200,)
+        if route == "quiz_get":
+            return self.client.request("GET", f"/quiz/{subject_id}") + (200,)
+        if route == "quiz_post":
+            # Submits the quiz served by prepare()
+            subject_id, token = self._served
+            served = self.questions.get(subject_id, [])
+            form = {f"q{qid}": str(rng.randint(0, 2)) for qid in served}
+            form["quiz_token"] = token
+            return self.client.request("POST", f"/quiz/{subject_id}", form) + (302,)
+        if route == "recommendations":
+            return self.client.request("GET", "/recommendations") + (200,)
+        if route == "library":
+            query = urllib.parse.urlencode({"branch": self.user["branch"],
+                                            "semester": rng.randint(1, SEMESTERS)})
+            return self.client.request("GET", f"/library?{query}") + (200,)
+        if route == "view_resource":
+            query = urllib.parse.urlencode({"type": rng.choice(["notes", "video"]),
+                                            "subject": subject_name,
+                                            "branch": self.user["branch"],
+                                            "semester": self.user["semester"]})
+            return self.client.request("GET", f"/view_resource?{query}") + (200,)
+        raise ValueError(f"unknown route {route!r}")
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+def run_route(route, sessions, requests, warmup):
+    """Spread `requests` calls of one route over the sessions' threads.
+
+    Only call() is timed; the untimed prepare() step is left out of the
+    latencies and of the requests per second, which sums each thread's
+    requests over the time it spent in call()."""
+    for session in sessions:
+        for _ in range(warmup):
+            session.prepare(route)
+            session.call(route)
+    latencies = [[] for _ in sessions]
+    errors = [0] * len(sessions)
+    share = [requests // len(sessions) + (i < requests % len(sessions)) for i in range(len(sessions))]
+
+    def worker(i):
+        session = sessions[i]
+        for _ in range(share[i]):
+            session.prepare(route)
+            started = time.perf_counter()
+            status, location, expected = session.call(route)
+            latencies[i].append(time.perf_counter() - started)
+            # Authenticated routes bounce to /login when the session is lost,
+            # and a rejected quiz submission back to the quiz
+            if (status != expected or (route != "login" and "/login" in location)
+                    or (route == "quiz_post" and not location.endswith("/dashboard"))):
+                errors[i] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(sessions))]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seconds = time.perf_counter() - started
+
+    values = sorted(ms * 1000 for part in latencies for ms in part)
+    rps = sum(len(part) / sum(part) for part in latencies if part and sum(part))
+    return {
+        "requests": len(values),
+        "errors": sum(errors),
+        "seconds": round(seconds, 3),
+        "rps": round(rps, 1) if rps else None,
+        "mean_ms": round(sum(values) / len(values), 3) if values else None,
+        "p50_ms": round(percentile(values, 50), 3) if values else None,
+        "p95_ms": round(percentile(values, 95), 3) if values else None,
+        "p99_ms": round(percentile(values, 99), 3) if values else None,
+        "max_ms": round(values[-1], 3) if values else None,
+    }
+
+# ---------- gunicorn ----------
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_gunicorn(db_path, workers, timeout=30):
+    """Start the procfile `web` command on a free local port. Returns (process, base_url)."""
+    with open(os.path.join(ROOT, "procfile"), encoding="utf-8") as f:
+        command = next(line.split(":", 1)[1] for line in f if line.startswith("web:"))
+    port = _free_port()
+    argv = shlex.split(command) + ["--bind", f"127.0.0.1:{port}", "--workers", str(workers)]
+    env = dict(os.environ, LEARNING_AI_DB=db_path)
+    process = subprocess.Popen(argv, cwd=ROOT, env=env)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start listening in time")
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="database to build or reuse (default: a temporary file)")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--subjects-per-branch", type=int, default=40)
+    parser.add_argument("--attempts", type=int, default=20, help="quiz attempts per user")
+    parser.add_argument("--requests", type=int, default=500, help="measured requests per route")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests per client and route")
+    parser.add_argument("--concurrency", type=int, default=4, help="simultaneous clients")
+    parser.add_argument("--routes", default=",".join(ROUTES))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--base-url", help="benchmark a running server instead of the test client")
+    parser.add_argument("--gunicorn", action="store_true", help="start the procfile web command and benchmark it")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn workers for --gunicorn")
+    parser.add_argument("--out", help="write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    db_path = os.path.abspath(args.db or os.path.join(tempfile.mkdtemp(prefix="bench-routes-"), "bench.db"))
+    os.environ["LEARNING_AI_DB"] = db_path
+    if not os.path.exists(db_path):
+        build_database(db_path, args.users, args.subjects_per_branch, args.attempts, args.seed)
+    users, subjects, questions = load_fixtures(db_path)
+
+    server = None
+    if args.gunicorn:
+        server, base_url = start_gunicorn(db_path, args.workers)
+    else:
+        base_url = args.base_url
+    try:
+        if base_url:
+            make_client, target = (lambda: HttpClient(base_url)), base_url
+        else:
+            from app import app
+            make_client, target = (lambda: TestClient(app)), "test_client"
+
+        rng = random.Random(args.seed)
+        sessions = []
+        for user in rng.sample(users, min(args.concurrency, len(users))):
+            session = Session(make_client(), user, subjects, questions, random.Random(rng.random()))
+            session.login()
+            sessions.append(session)
+
+        results = {}
+        for route in args.routes.split(","):
+            results[route] = run_route(route, sessions, args.requests, args.warmup)
+            print(f"{route:16} p50 {results[route]['p50_ms']:>8} ms  p99 {results[route]['p99_ms']:>8} ms  "
+                  f"{results[route]['rps']:>8} req/s  errors {results[route]['errors']}", file=sys.stderr)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "target": target,
+        "config": {key: getattr(args, key) for key in
+                   ("users", "subjects_per_branch", "attempts", "requests", "warmup",
+                    "concurrency", "seed", "workers")},
+        "database": db_path,
+        "routes": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.out}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
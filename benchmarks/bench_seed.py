@@ -0,0 +1,126 @@
+# benchmarks/bench_seed.py
+
+"""Compare the bulk seed loader with the original row-by-row seeding.
+Both paths load the same synthetic catalog from generate_data.py into fresh
+files and report rows per second.
+
+    python benchmarks/bench_seed.py --subjects 100000 --legacy-subjects 5000
+
+The legacy path runs against the schema init_db() created back then, without
+the indexes later migrations added, so each of its per-row SELECTs scans the
+whole table. It is run on a smaller slice by default; rates are per row, but
+the scans make the legacy rate fall as the slice grows.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_init  # noqa: E402
+from generate_data import iter_synthetic_subjects, iter_resources  # noqa: E402
+
+
+# The tables as init_db() created them before the migrations: no indexes
+LEGACY_SCHEMA = """
+CREATE TABLE subjects (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    branch TEXT NOT NULL,
+    semester INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    roadmap_json TEXT NOT NULL
+);
+CREATE TABLE resources (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    subject_id INTEGER NOT NULL,
+    note_url TEXT NOT NULL,
+    video_url TEXT NOT NULL,
+    FOREIGN KEY(subject_id) REFERENCES subjects(id) ON DELETE CASCADE
+);
+"""
+
+
+def legacy_seed(c, subjects, resources):
+    """The seeding loop init_db() used before the bulk loader."""
+    for sub in subjects:
+        c.execute("SELECT id FROM subjects WHERE branch=? AND semester=? AND name=?",
+                  (sub["branch"], sub["semester"], sub["name"]))
+        if c.fetchone() is None:
+            c.execute(
+                "INSERT INTO subjects (branch, semester, name, roadmap_json) VALUES (?,?,?,?)",
+                (sub["branch"], sub["semester"], sub["name"], json.dumps(sub["roadmap"]))
+            )
+    for res in resources:
+        c.execute(
+            "SELECT id FROM subjects WHERE branch=? AND semester=? AND name=?",
+            (res["branch"], res["semester"], res["subject"]))
+        row = c.fetchone()
+        if row:
+            subject_id = row[0]
+            c.execute("SELECT id FROM resources WHERE subject_id=? AND note_url=?", (subject_id, res["note_url"]))
+            if c.fetchone() is None:
+                c.execute(
+                    "INSERT INTO resources (subject_id, note_url, video_url) VALUES (?,?,?)",
+                    (subject_id, res["note_url"], res["video_url"]))
+
+
+def bulk_seed(c, subjects, resources):
+    db_init.bulk_load(c, subjects, resources)
+
+
+def _seed_args(n_subjects):
+    return iter_synthetic_subjects(n_subjects), iter_resources(iter_synthetic_subjects(n_subjects))
+
+
+def run_bulk(n_subjects, workdir):
+    path = os.path.join(workdir, "bulk.catalog.db")
+    # Time the seeding itself, not the ANALYZE/VACUUM the builder runs on exit
+    with db_init.catalog_builder(path) as c:
+        started = time.perf_counter()
+        bulk_seed(c, *_seed_args(n_subjects))
+        seconds = time.perf_counter() - started
+    return _result(n_subjects, seconds)
+
+
+def run_legacy(n_subjects, workdir):
+    # Like the old init_db(): one connection, default pragmas, one commit at the end
+    conn = sqlite3.connect(os.path.join(workdir, "legacy.db"))
+    try:
+        conn.executescript(LEGACY_SCHEMA)
+        started = time.perf_counter()
+        legacy_seed(conn.cursor(), *_seed_args(n_subjects))
+        conn.commit()
+        seconds = time.perf_counter() - started
+    finally:
+        conn.close()
+    return _result(n_subjects, seconds)
+
+
+def _result(n_subjects, seconds):
+    rows = 2 * n_subjects
+    return {"subjects": n_subjects, "rows": rows, "seconds": round(seconds, 3),
+            "rows_per_second": round(rows / seconds)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subjects", type=int, default=100000)
+    parser.add_argument("--legacy-subjects", type=int, default=5000,
+                        help="catalog size for the row-by-row path (0 to skip)")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        results["bulk"] = run_bulk(args.subjects, workdir)
+        if args.legacy_subjects:
+            results["legacy"] = run_legacy(args.legacy_subjects, workdir)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# catalog.py
+
+"""In-process read-through cache for the subject/resource catalog.
+The catalog only changes when db_init builds a new catalog file (see db.py),
+so each (branch, semester) group is loaded once, with roadmaps already parsed
+and resource links attached, and served from memory until the catalog
+version changes.
+"""
+
+import bisect
+import itertools
+import json
+import re
+import threading
+import time
+
+from db import get_connection, get_meta
+
+# How often (seconds) to ask the database whether the catalog was replaced
+CATALOG_RECHECK_SECONDS = 5
+PAGE_SIZE = 24              # subjects per get_semester_page()
+SEARCH_LIMIT = 20
+SEARCH_MAX_TERMS = 8
+SEARCH_MIN_PREFIX = 2       # shorter last words only match whole words
+SEARCH_CANDIDATES = 200     # most matches a query may have and still be ranked
+
+_lock = threading.Lock()
+_version = None
+_updated_at = None  # unix time of the last catalog change, if recorded
+_checked_at = 0.0
+_semesters = {}     # (branch, semester) -> list of subject dicts
+_by_id = {}         # subject id -> subject dict
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+def _read_version():
+    conn = get_connection()
+    updated_at = get_meta(conn, "catalog_updated_at", "catalog")
+    return get_meta(conn, "catalog_version", "catalog") or "0", int(updated_at) if updated_at else None
+
+def _validate():
+    """Drop everything cached if db_init has bumped the catalog version."""
+    global _version, _updated_at, _checked_at
+    now = time.monotonic()
+    if now - _checked_at < CATALOG_RECHECK_SECONDS:
+        return
+    version, updated_at = _read_version()
+    with _lock:
+        _checked_at = now
+        _updated_at = updated_at
+        if version != _version:
+            if _version is not None:
+                _stats["invalidations"] += 1
+            _version = version
+            _semesters.clear()
+            _by_id.clear()
+
+# One query: subjects with their resources joined, grouped by subject in _load_semester
+SEMESTER_SQL = (
+    "SELECT s.id, s.branch, s.semester, s.name, s.roadmap_json, r.note_url, r.video_url "
+    "FROM subjects s LEFT JOIN resources r ON r.subject_id = s.id "
+    "WHERE s.branch = ? AND s.semester = ? ORDER BY s.id, r.id"
+)
+
+def _load_semester(branch, semester):
+    rows = get_connection().execute(SEMESTER_SQL, (branch, semester))
+    subjects = []
+    for _, group in itertools.groupby(rows, key=lambda row: row["id"]):
+        group = list(group)
+        row = group[0]
+        try:
+            roadmap = json.loads(row["roadmap_json"])
+        except (TypeError, ValueError):
+            roadmap = []
+        subjects.append({
+            "id": row["id"],
+            "branch": row["branch"],
+            "semester": row["semester"],
+            "name": row["name"],
+            "roadmap": roadmap,
+            "notes": [res["note_url"] for res in group if res["note_url"] is not None],
+            "videos": [res["video_url"] for res in group if res["video_url"] is not None],
+        })
+    return subjects
+
+def get_semester(branch, semester):
+    """Return the subjects of one branch/semester as dicts with
+    id, branch, semester, name, roadmap, notes and videos.
+    The result is shared between requests; treat it as read-only.
+    """
+    _validate()
+    key = (branch, semester)
+    subjects = _semesters.get(key)
+    if subjects is not None:
+        with _lock:
+            _stats["hits"] += 1
+        return subjects
+    version = _version
+    subjects = _load_semester(branch, semester)
+    with _lock:
+        _stats["misses"] += 1
+        # Don't store a group loaded from a catalog that was replaced meanwhile
+        if version == _version:
+            _semesters[key] = subjects
+            for s in subjects:
+                _by_id[s["id"]] = s
+    return subjects
+
+def get_semester_page(branch, semester, after=0, limit=PAGE_SIZE):
+    """Return (subjects, next_cursor): up to `limit` subjects of a branch/semester
+    with id greater than `after`. next_cursor is the `after` value for the
+    following page, or None on the last page.
+    """
+    subjects = get_semester(branch, semester)
+    start = bisect.bisect_right(subjects, after, key=lambda s: s["id"])
+    page = subjects[start:start + limit]
+    next_cursor = page[-1]["id"] if start + limit < len(subjects) else None
+    return page, next_cursor
+
+def get_version():
+    """Return (catalog version, unix time it was last changed or None)."""
+    _validate()
+    return _version, _updated_at
+
+SUBJECT_GROUP_SQL = "SELECT branch, semester FROM subjects WHERE id = ?"
+
+def get_subject(subject_id):
+    """Return one subject dict by id, or None."""
+    _validate()
+    subject = _by_id.get(subject_id)
+    if subject is not None:
+        with _lock:
+            _stats["hits"] += 1
+        return subject
+    row = get_connection().execute(SUBJECT_GROUP_SQL, (subject_id,)).fetchone()
+    if row is None:
+        return None
+    get_semester(row["branch"], row["semester"])
+    return _by_id.get(subject_id)
+
+def find_subject(name, branch, semester):
+    """Return the subject called `name` in a branch/semester, or None."""
+    for subject in get_semester(branch, semester):
+        if subject["name"] == name:
+            return subject
+    return None
+
+def _fts_phrase(words):
+    return '"' + " ".join(words) + '"'
+
+SEARCH_CANDIDATES_SQL = (
+    "SELECT rowid AS id, name, branch, semester FROM catalog_fts WHERE catalog_fts MATCH ? LIMIT ?"
+)
+SEARCH_SQL = (
+    "SELECT rowid AS id, name, branch, semester FROM catalog_fts "
+    "WHERE catalog_fts MATCH ? ORDER BY rank LIMIT ?"
+)
+
+def search(text, branch=None, limit=SEARCH_LIMIT):
+    """Full-text search over subject names, roadmaps and resource links.
+    Every word must match and the last one may be a prefix (search as you
+    type). Returns dicts with id, name, branch and semester, best first.
+
+    Queries matching up to SEARCH_CANDIDATES subjects are ranked with bm25.
+    Scoring a word found in most of the catalog means reading its whole
+    posting list, so for broader queries the first SEARCH_CANDIDATES matches
+    are ordered by how many of the words start a word of the subject name.
+    """
+    words = re.findall(r"\w+", text.lower())[:SEARCH_MAX_TERMS]
+    if not words:
+        return []
+    terms = [_fts_phrase([w]) for w in words]
+    if len(words[-1]) >= SEARCH_MIN_PREFIX:
+        terms[-1] += "*"
+    query = "{name roadmap resources} : (" + " ".join(terms) + ")"
+    branch_words = re.findall(r"\w+", (branch or "").lower())
+    if branch_words:
+        query += " AND branch : " + _fts_phrase(branch_words)
+
+    conn = get_connection()
+    candidates = conn.execute(SEARCH_CANDIDATES_SQL, (query, SEARCH_CANDIDATES + 1)).fetchall()
+    if len(candidates) <= SEARCH_CANDIDATES:
+        rows = conn.execute(SEARCH_SQL, (query, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def name_hits(row):
+        name_words = re.findall(r"\w+", row["name"].lower())
+        return sum(any(n.startswith(w) for n in name_words) for w in words)
+    candidates.sort(key=lambda row: (-name_hits(row), row["id"]))
+    return [dict(row) for row in candidates[:limit]]
+
+def get_stats():
+    """Return hit/miss counters and the size of the cache."""
+    with _lock:
+        stats = dict(_stats)
+        stats["version"] = _version
+        stats["semesters"] = len(_semesters)
+        stats["subjects"] = len(_by_id)
+    return stats
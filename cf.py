@@ -0,0 +1,161 @@
+# cf.py
+
+"""Collaborative-filtering recommender for LearningAI.
+"Students who struggled with X also struggled with Y": subjects are compared
+by which students are weak in them (cosine similarity over the sparse
+user x subject matrix of weak levels in the mastery table), and the top-k
+neighbours of every subject are precomputed into `subject_neighbors`.
+
+The index is rebuilt offline (``python cf.py build`` or rebuild_index_async())
+in one transaction and each worker swaps its in-memory copy when the
+`cf_index_version` meta value changes, so serving is a dict lookup.
+"""
+
+import argparse
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+
+import catalog
+import db
+
+TOP_K = 10              # neighbours kept per subject
+MIN_SUPPORT = 2         # students weak in both subjects before we trust a pair
+CF_RECHECK_SECONDS = 30
+RECOMMENDATION_LIMIT = 5
+
+_lock = threading.Lock()
+_version = None
+_checked_at = 0.0
+_neighbors = {}         # subject_id -> tuple of (neighbor_id, similarity)
+_rebuild_lock = threading.Lock()
+
+# ---------- Offline build ----------
+
+def build_index(conn, top_k=TOP_K, min_support=MIN_SUPPORT):
+    """Return {subject_id: [(neighbor_id, similarity), ...]} best first."""
+    rows = conn.execute(
+        "SELECT user_id, subject_id FROM mastery WHERE level = 'weak' ORDER BY user_id"
+    )
+    weak_counts = Counter()
+    pair_counts = Counter()
+    for _, group in itertools.groupby(rows, key=lambda row: row[0]):
+        subjects = sorted(row[1] for row in group)
+        weak_counts.update(subjects)
+        pair_counts.update(itertools.combinations(subjects, 2))
+
+    candidates = defaultdict(list)
+    for (a, b), together in pair_counts.items():
+        if together < min_support:
+            continue
+        similarity = together / math.sqrt(weak_counts[a] * weak_counts[b])
+        candidates[a].append((similarity, -b))
+        candidates[b].append((similarity, -a))
+
+    return {
+        subject_id: [(-neg_id, round(sim, 6)) for sim, neg_id in heapq.nlargest(top_k, pairs)]
+        for subject_id, pairs in candidates.items()
+    }
+
+def rebuild_index():
+    """Recompute the neighbour table and publish it atomically. Returns subjects indexed."""
+    with _rebuild_lock:
+        started = time.perf_counter()
+        neighbors = build_index(db.get_connection())
+        with db.transaction() as conn:
+            conn.execute("DELETE FROM subject_neighbors")
+            conn.executemany(
+                "INSERT INTO subject_neighbors (subject_id, rank, neighbor_id, similarity) VALUES (?,?,?,?)",
+                (
+                    (subject_id, rank, neighbor_id, similarity)
+                    for subject_id, pairs in neighbors.items()
+                    for rank, (neighbor_id, similarity) in enumerate(pairs)
+                )
+            )
+            version = int(db.get_meta(conn, "cf_index_version") or 0) + 1
+            db.set_meta(conn, "cf_index_version", str(version))
+        print(f"CF index v{version}: {len(neighbors)} subjects in {time.perf_counter() - started:.2f}s")
+        return len(neighbors)
+
+def rebuild_index_async():
+    """Rebuild the index on a background thread; readers keep the old one meanwhile."""
+    thread = threading.Thread(target=rebuild_index, name="cf-index-rebuild", daemon=True)
+    thread.start()
+    return thread
+
+# ---------- Serving ----------
+
+def _load():
+    global _version, _checked_at, _neighbors
+    now = time.monotonic()
+    if now - _checked_at < CF_RECHECK_SECONDS:
+        return
+    conn = db.get_connection()
+    version = db.get_meta(conn, "cf_index_version")
+    if version == _version:
+        _checked_at = now
+        return
+    neighbors = defaultdict(list)
+    for row in conn.execute(
+        "SELECT subject_id, neighbor_id, similarity FROM subject_neighbors ORDER BY subject_id, rank"
+    ):
+        neighbors[row[0]].append((row[1], row[2]))
+    with _lock:
+        # Single assignment: requests see either the old index or the new one
+        _neighbors = {subject_id: tuple(pairs) for subject_id, pairs in neighbors.items()}
+        _version, _checked_at = version, now
+
+def neighbors_of(subject_id):
+    """Return the precomputed ((neighbor_id, similarity), ...) for a subject."""
+    _load()
+    return _neighbors.get(subject_id, ())
+
+MASTERY_SQL = "SELECT subject_id, latest_score, level FROM mastery WHERE user_id = ?"
+
+def get_recommendations(user_id, limit=RECOMMENDATION_LIMIT):
+    """Return subjects that students weak in the same subjects as this user
+    also struggled with, in the same shape as recommender.get_recommendations().
+    Entries have level "at-risk", the user's latest score (or None) and a
+    `because` list of the weak subjects that led to them.
+    """
+    _load()
+    index = _neighbors
+    rows = db.get_connection().execute(MASTERY_SQL, (user_id,)).fetchall()
+    mastery = {row["subject_id"]: (row["latest_score"], row["level"]) for row in rows}
+    weak = [subject_id for subject_id, (_, level) in mastery.items() if level == "weak"]
+
+    scores = defaultdict(float)
+    because = defaultdict(list)
+    for subject_id in weak:
+        for neighbor_id, similarity in index.get(subject_id, ()):
+            level = mastery.get(neighbor_id, (None, None))[1]
+            if level in ("weak", "strong"):
+                continue  # already flagged by the rule engine, or mastered
+            scores[neighbor_id] += similarity
+            because[neighbor_id].append(subject_id)
+
+    recommendations = {}
+    for neighbor_id in heapq.nlargest(limit, scores, key=lambda sid: (scores[sid], -sid)):
+        subject = catalog.get_subject(neighbor_id)
+        if subject is None or subject["name"] in recommendations:
+            continue  # keyed by name like the rule engine; keep the stronger match
+        reasons = [catalog.get_subject(sid) for sid in because[neighbor_id]]
+        recommendations[subject["name"]] = {
+            "level": "at-risk",
+            "score": mastery.get(neighbor_id, (None, None))[0],
+            "similarity": round(scores[neighbor_id], 4),
+            "because": [s["name"] for s in reasons if s is not None],
+            "notes": list(subject["notes"]),
+            "videos": list(subject["videos"]),
+        }
+    return recommendations
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["build"], help="build: recompute the neighbour index")
+    args = parser.parse_args()
+    if args.command == "build":
+        rebuild_index()
@@ -0,0 +1,188 @@
+# db.py
+
+"""Shared SQLite access layer for LearningAI.
+Both app.py and recommender.py get their connections from here. Each thread
+keeps one connection, configured once (WAL journal, synchronous=NORMAL, mmap,
+page cache, prepared-statement cache) and reused for every later request.
+
+The read-only catalog (subjects, resources, questions, prerequisites and the
+search index) lives in a separate file built by db_init.build_catalog() and is
+ATTACHed to every connection as ``catalog``, opened with ``immutable=1`` and a
+large mmap: reading it takes no locks and never touches the user database's
+WAL. Apart from ``meta`` (unqualified, the user database's) table names are
+unique across the two files, so queries and joins between quizzes and
+subjects need no schema prefix. A new catalog is deployed by replacing the
+file; each connection re-attaches the next time it is handed out after the
+swap is noticed.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DB_PATH = os.environ.get("LEARNING_AI_DB", os.path.join(BASE_DIR, "learning_ai.db"))
+# Defaults to <user database>.catalog.db next to it (see catalog_path())
+CATALOG_DB_PATH = os.environ.get("LEARNING_AI_CATALOG_DB")
+
+# Connection tuning
+BUSY_TIMEOUT = 5                    # seconds to wait for the write lock
+MMAP_SIZE = 256 * 1024 * 1024       # bytes of the file mapped into memory
+CACHE_SIZE_KIB = 64 * 1024          # page cache per connection
+STATEMENT_CACHE = 256               # prepared statements kept per connection
+CATALOG_MMAP_SIZE = 1024 * 1024 * 1024  # map the whole catalog file
+CATALOG_RECHECK_SECONDS = 1         # how often to stat the catalog file for a swap
+
+# Connection class used for new connections; instrumentation.py swaps in a
+# timing subclass when metrics are enabled
+CONNECTION_FACTORY = sqlite3.Connection
+
+# A BEGIN IMMEDIATE slower than this is counted as having waited for the lock
+LOCK_WAIT_THRESHOLD = 0.001
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_stats = {
+    "connects": 0,
+    "reuses": 0,
+    "lock_waits": 0,
+    "lock_wait_seconds": 0.0,
+    "catalog_attaches": 0,
+}
+_catalog_checked_at = 0.0
+_catalog_current = None             # identity of the catalog file last seen on disk
+
+def _bump(key, amount=1):
+    with _stats_lock:
+        _stats[key] += amount
+
+def get_stats():
+    """Return a snapshot of the connection counters for this process."""
+    with _stats_lock:
+        return dict(_stats)
+
+def catalog_path(db_path=None):
+    """The catalog file that goes with the user database at `db_path`."""
+    if CATALOG_DB_PATH:
+        return CATALOG_DB_PATH
+    return os.path.splitext(db_path or DB_PATH)[0] + ".catalog.db"
+
+def _file_identity(path):
+    """(inode, mtime, size) of `path`; changes when the file is swapped. None if missing."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def attach_catalog(conn, path=None):
+    """ATTACH the catalog at `path` to `conn` as ``catalog``. Returns its file identity."""
+    path = path or catalog_path()
+    identity = _file_identity(path)   # before opening: a swap in between is caught next check
+    if identity is None:
+        raise FileNotFoundError(f"catalog database {path} not found; "
+                                "run `python db_init.py` to build it (or set LEARNING_AI_CATALOG_DB)")
+    uri = "file:" + urllib.request.pathname2url(os.path.abspath(path)) + "?mode=ro&immutable=1"
+    conn.execute("ATTACH DATABASE ? AS catalog", (uri,))
+    conn.execute(f"PRAGMA catalog.mmap_size = {CATALOG_MMAP_SIZE}")
+    _bump("catalog_attaches")
+    return identity
+
+def _current_catalog():
+    """Identity of the catalog file on disk, re-read at most every CATALOG_RECHECK_SECONDS."""
+    global _catalog_checked_at, _catalog_current
+    now = time.monotonic()
+    if now - _catalog_checked_at >= CATALOG_RECHECK_SECONDS:
+        _catalog_current = _file_identity(catalog_path()) or _catalog_current
+        _catalog_checked_at = now
+    return _catalog_current
+
+def _refresh_catalog(conn):
+    """Re-attach the catalog if the file was replaced since `conn` attached it."""
+    current = _current_catalog()
+    if current == _local.catalog or conn.in_transaction:
+        return
+    try:
+        conn.execute("DETACH DATABASE catalog")
+    except sqlite3.OperationalError:
+        return  # a cursor is still reading the old file; try again on a later call
+    _local.catalog = attach_catalog(conn)
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, cached_statements=STATEMENT_CACHE,
+                           factory=CONNECTION_FACTORY, uri=True)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    _bump("connects")
+    return conn
+
+def get_connection():
+    """Return this thread's connection, opening it on first use.
+
+    Callers must not close it. A connection inherited across ``fork()`` is
+    never reused; the child opens its own. One opened before
+    CONNECTION_FACTORY was swapped (e.g. at import time, before
+    instrumentation.install) is replaced once no transaction is open.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid() and _local.path == DB_PATH:
+        if type(conn) is CONNECTION_FACTORY or conn.in_transaction:
+            _bump("reuses")
+            _refresh_catalog(conn)
+            return conn
+        conn.close()
+    conn = _connect(DB_PATH)
+    _local.catalog = attach_catalog(conn)
+    _local.conn, _local.pid, _local.path = conn, os.getpid(), DB_PATH
+    return conn
+
+def release():
+    """End-of-request hook: roll back anything a failed handler left open."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
+META_SQL = "SELECT value FROM {schema}.meta WHERE key = ?"
+
+def get_meta(conn, key, schema="main"):
+    """Read a value from the `meta` key/value table (None if unset).
+    Catalog bookkeeping (versions, seed checksums) is in ``schema="catalog"``."""
+    row = conn.execute(META_SQL.format(schema=schema), (key,)).fetchone()
+    return row[0] if row else None
+
+def set_meta(conn, key, value):
+    conn.execute(
+        "INSERT INTO meta (key, value) VALUES (?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (key, value)
+    )
+
+@contextmanager
+def transaction():
+    """Run a write transaction on this thread's connection.
+
+    Takes the write lock up front (``BEGIN IMMEDIATE``) so the statements
+    inside never fail half-way with SQLITE_BUSY, and records how long the
+    lock took to acquire.
+    """
+    conn = get_connection()
+    started = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE")
+    waited = time.perf_counter() - started
+    if waited > LOCK_WAIT_THRESHOLD:
+        with _stats_lock:
+            _stats["lock_waits"] += 1
+            _stats["lock_wait_seconds"] += waited
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
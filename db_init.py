@@ -3,34 +3,59 @@
 """Create SQLite database and seed initial data for LearningAI.
 The script defines tables and loads JSON files containing subject definitions,
 roadmaps, and resource links for all branches.
+
+Schema changes are applied as numbered migrations (tracked with
+``PRAGMA user_version``) and the seed files are only re-applied when their
+checksum changes, so ``init_db()`` can run on every worker boot without
+wiping users or quiz history.
+
+The catalog (subjects, resources, questions, prerequisites, search index) is
+a separate file with its own migrations (see db.py). build_catalog() seeds a
+copy of the current file and renames it over the old one, so a reseed never
+takes the user database's write lock and readers switch to the new file
+without downtime. To prepare a catalog elsewhere and deploy it by hand:
+
+    python db_init.py --catalog-out /tmp/new.catalog.db
+    mv /tmp/new.catalog.db learning_ai.catalog.db
 """
 
 import sqlite3
 import os
 import json
+import hashlib
+import argparse
+import re
+import shutil
+import time
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from contextlib import contextmanager
+
+from db import DB_PATH, attach_catalog, catalog_path, get_meta, set_meta
+from recommender import rebuild_mastery
+from quizbank import DEFAULT_QUESTIONS
+from planner import default_requirements, topological_order
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-DB_PATH = os.path.join(BASE_DIR, "learning_ai.db")
 
 # Paths to seed JSON files
 SUBJECTS_JSON = os.path.join(BASE_DIR, "data", "subjects.json")
 RESOURCES_JSON = os.path.join(BASE_DIR, "data", "resources.json")
+QUESTIONS_JSON = os.path.join(BASE_DIR, "data", "questions.json")
+PREREQUISITES_JSON = os.path.join(BASE_DIR, "data", "prerequisites.json")
+SEED_FILES = (SUBJECTS_JSON, RESOURCES_JSON, QUESTIONS_JSON, PREREQUISITES_JSON)
+
+# How long a worker waits for another worker holding the migration lock
+LOCK_TIMEOUT = 30
+# ... and for another worker building the catalog file
+BUILD_LOCK_TIMEOUT = 600
 
-def init_db():
-    # Remove existing DB to ensure clean state with new seed data
-    if os.path.exists(DB_PATH):
-        try:
-            os.remove(DB_PATH)
-            print("Removed existing database.")
-        except PermissionError:
-            print("Could not remove existing database (might be open). Proceeding to use existing file...")
-
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    # Enable foreign keys
-    c.execute('PRAGMA foreign_keys = ON;')
-    
-    # Create Tables
+# ---------- Migrations ----------
+# Each migration takes a cursor inside an open write transaction. The schema
+# version is the number of migrations applied, so only ever append here.
+
+def _migration_1(c):
     c.execute('''
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -41,7 +66,7 @@ def init_db():
             semester INTEGER NOT NULL
         );
     ''')
-    
+
     c.execute('''
         CREATE TABLE IF NOT EXISTS subjects (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -51,7 +76,7 @@ def init_db():
             roadmap_json TEXT NOT NULL
         );
     ''')
-    
+
     c.execute('''
         CREATE TABLE IF NOT EXISTS quizzes (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -62,7 +87,7 @@ def init_db():
             FOREIGN KEY(subject_id) REFERENCES subjects(id) ON DELETE CASCADE
         );
     ''')
-    
+
     c.execute('''
         CREATE TABLE IF NOT EXISTS resources (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -83,49 +108,886 @@ def init_db():
             FOREIGN KEY(subject_id) REFERENCES subjects(id) ON DELETE CASCADE
         );
     ''')
-    conn.commit()
-
-    # Load seed data
-    print("Seeding subjects...")
-    if os.path.exists(SUBJECTS_JSON):
-        with open(SUBJECTS_JSON, "r", encoding="utf-8") as f:
-            subjects = json.load(f)
-        
-        # Use a set to avoid duplicate insertions if running multiple times (though we dropped DB mostly)
-        for sub in subjects:
-            # Check overlap if we didn't drop DB
-            c.execute("SELECT id FROM subjects WHERE branch=? AND semester=? AND name=?", 
-                      (sub["branch"], sub["semester"], sub["name"]))
-            if c.fetchone() is None:
-                c.execute(
-                    "INSERT INTO subjects (branch, semester, name, roadmap_json) VALUES (?,?,?,?)",
-                    (sub["branch"], sub["semester"], sub["name"], json.dumps(sub["roadmap"]))
-                )
-        conn.commit()
-
-    print("Seeding resources...")
-    if os.path.exists(RESOURCES_JSON):
-        with open(RESOURCES_JSON, "r", encoding="utf-8") as f:
-            resources = json.load(f)
-        
-        for res in resources:
-            # Resolve subject_id
-            c.execute(
-                "SELECT id FROM subjects WHERE branch=? AND semester=? AND name=?",
-                (res["branch"], res["semester"], res["subject"]))
-            row = c.fetchone()
-            if row:
-                subject_id = row[0]
-                # Check exist
-                c.execute("SELECT id FROM resources WHERE subject_id=? AND note_url=?", (subject_id, res["note_url"]))
-                if c.fetchone() is None:
-                    c.execute(
-                        "INSERT INTO resources (subject_id, note_url, video_url) VALUES (?,?,?)",
-                        (subject_id, res["note_url"], res["video_url"]))
-        conn.commit()
-    
-    conn.close()
-    print("Database initialized successfully at", DB_PATH)
+
+    # Key/value bookkeeping (seed file checksums etc.)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    ''')
+
+def _migration_2(c):
+    # Collapse duplicate subjects onto the lowest id before enforcing the natural key
+    c.execute('''
+        CREATE TEMP TABLE subject_remap AS
+        SELECT s.id AS old_id, k.keep_id AS new_id
+        FROM subjects s
+        JOIN (SELECT branch, semester, name, MIN(id) AS keep_id
+              FROM subjects GROUP BY branch, semester, name) k
+          ON s.branch = k.branch AND s.semester = k.semester AND s.name = k.name
+        WHERE s.id != k.keep_id;
+    ''')
+    for table in ("quizzes", "resources", "recommendations"):
+        c.execute(f'''
+            UPDATE {table} SET subject_id =
+                (SELECT new_id FROM subject_remap WHERE old_id = {table}.subject_id)
+            WHERE subject_id IN (SELECT old_id FROM subject_remap);
+        ''')
+    c.execute("DELETE FROM subjects WHERE id IN (SELECT old_id FROM subject_remap);")
+    c.execute("DROP TABLE subject_remap;")
+    c.execute('''
+        DELETE FROM resources WHERE id NOT IN
+            (SELECT MIN(id) FROM resources GROUP BY subject_id, note_url);
+    ''')
+
+    # (branch, semester, name) also serves the (branch, semester) prefix lookups
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_subjects_natural ON subjects(branch, semester, name);")
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_resources_natural ON resources(subject_id, note_url);")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_quizzes_user ON quizzes(user_id, subject_id);")
+
+def _migration_3(c):
+    # Per-(user, subject) quiz summary maintained on every quiz submit
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS mastery (
+            user_id INTEGER NOT NULL,
+            subject_id INTEGER NOT NULL,
+            latest_score INTEGER NOT NULL,
+            best_score INTEGER NOT NULL,
+            attempts INTEGER NOT NULL,
+            level TEXT NOT NULL,
+            last_quiz_id INTEGER NOT NULL,
+            PRIMARY KEY (user_id, subject_id),
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY(subject_id) REFERENCES subjects(id) ON DELETE CASCADE
+        ) WITHOUT ROWID;
+    ''')
+    rebuild_mastery(c)
+
+def _migration_4(c):
+    # Top-k "also struggled with" neighbours per subject, written by cf.py
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS subject_neighbors (
+            subject_id INTEGER NOT NULL,
+            rank INTEGER NOT NULL,
+            neighbor_id INTEGER NOT NULL,
+            similarity REAL NOT NULL,
+            PRIMARY KEY (subject_id, rank)
+        ) WITHOUT ROWID;
+    ''')
+
+def _migration_5(c):
+    # Per-subject question bank; `answer` is the index of the correct option
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS questions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            subject_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            prompt TEXT NOT NULL,
+            options_json TEXT NOT NULL,
+            answer INTEGER NOT NULL,
+            FOREIGN KEY(subject_id) REFERENCES subjects(id) ON DELETE CASCADE,
+            UNIQUE (subject_id, position)
+        );
+    ''')
+    if _add_default_questions(c):
+        bump_question_bank_version(c)
+
+def _migration_6(c):
+    # Full-text index over subject names, roadmap steps and resource links;
+    # rowid is the subject id. Kept in sync by rebuild_search_index().
+    c.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS catalog_fts USING fts5(
+            name, roadmap, resources, branch, semester UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        );
+    ''')
+    # Rank name matches above roadmap matches above resource matches
+    c.execute(f"INSERT INTO catalog_fts (catalog_fts, rank) VALUES ('rank', '{SEARCH_RANK}')")
+    rebuild_search_index(c)
+
+def _migration_7(c):
+    # Quiz history in id order per user (the API streams it without sorting)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_quizzes_user_history ON quizzes(user_id, id)")
+
+def _migration_8(c):
+    # Server-side sessions (sessions.py); `data` is the session as JSON
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            expires_at INTEGER NOT NULL
+        ) WITHOUT ROWID;
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)")
+
+def _migration_9(c):
+    # Subject prerequisite graph (planner.py): subject_id builds on requires_id
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS prerequisites (
+            subject_id INTEGER NOT NULL,
+            requires_id INTEGER NOT NULL,
+            PRIMARY KEY (subject_id, requires_id),
+            FOREIGN KEY(subject_id) REFERENCES subjects(id) ON DELETE CASCADE,
+            FOREIGN KEY(requires_id) REFERENCES subjects(id) ON DELETE CASCADE
+        ) WITHOUT ROWID;
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_prerequisites_requires ON prerequisites(requires_id)")
+    _load_prerequisites(c)
+    bump_catalog_version(c)
+
+def _migration_10(c):
+    # Background jobs (jobs.py): one row per job with its schedule, the lease
+    # that keeps it to a single run across workers, and its last outcome
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            name TEXT PRIMARY KEY,
+            next_run_at REAL,
+            lease_owner TEXT,
+            lease_until REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            runs INTEGER NOT NULL DEFAULT 0,
+            failures INTEGER NOT NULL DEFAULT 0,
+            last_started_at REAL,
+            last_finished_at REAL,
+            last_seconds REAL,
+            last_status TEXT,
+            last_error TEXT
+        ) WITHOUT ROWID;
+    ''')
+    # Precomputed rule recommendations (recommender.refresh_snapshots)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS recommendation_snapshots (
+            user_id INTEGER PRIMARY KEY,
+            last_quiz_id INTEGER NOT NULL,
+            catalog_version TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+        );
+    ''')
+
+def _migration_11(c):
+    # The catalog moves to its own read-only file. Unless one is already in
+    # place, copy it there with its ids, then drop it here. Subject ids in the
+    # user tables now point into that file; SQLite cannot enforce foreign keys
+    # across files, so their REFERENCES subjects clauses are dropped below.
+    path = catalog_path(_main_file(c))
+    if not os.path.exists(path):
+        with catalog_builder(path) as out:
+            for table in CATALOG_TABLES:
+                rows = c.connection.execute(f"SELECT * FROM main.{table}")
+                marks = ",".join("?" * len(rows.description))
+                for batch in _batched(rows, SEED_BATCH_SIZE):
+                    out.executemany(f"INSERT INTO {table} VALUES ({marks})", batch)
+            # Keep AUTOINCREMENT from reusing ids of subjects deleted in the past
+            sequences = c.execute(
+                f"SELECT name, seq FROM sqlite_sequence WHERE name IN ({','.join('?' * len(CATALOG_TABLES))})",
+                CATALOG_TABLES
+            ).fetchall()
+            out.execute("DELETE FROM sqlite_sequence")
+            out.executemany("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", sequences)
+            out.executemany("INSERT INTO meta (key, value) VALUES (?, ?)",
+                            c.execute(f"SELECT key, value FROM meta WHERE {_CATALOG_META}").fetchall())
+            rebuild_search_index(out)
+    c.execute("DROP TABLE catalog_fts")
+    for table in reversed(CATALOG_TABLES):
+        c.execute(f"DROP TABLE {table}")
+    c.execute(f"DELETE FROM meta WHERE {_CATALOG_META}")
+    tables = c.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND sql LIKE '%REFERENCES subjects%'"
+    ).fetchall()
+    for table, sql in tables:
+        _rebuild_table(c, table, _SUBJECT_FK.sub("", sql))
+
+# `, FOREIGN KEY(subject_id) REFERENCES subjects(id) ON DELETE CASCADE`
+_SUBJECT_FK = re.compile(r",\s*FOREIGN KEY\s*\(\w+\)\s*REFERENCES subjects\s*\(id\)[^,)]*")
+
+def _rebuild_table(c, table, sql):
+    """Recreate `table` from the CREATE TABLE statement `sql` (same columns,
+    new constraints), keeping its rows, indexes and AUTOINCREMENT counter."""
+    indexes = [row[0] for row in c.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,))]
+    sequence = c.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone() \
+        if "AUTOINCREMENT" in sql.upper() else None
+    c.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+    c.execute(sql)
+    c.execute(f"INSERT INTO {table} SELECT * FROM {table}_old")
+    c.execute(f"DROP TABLE {table}_old")
+    for index in indexes:
+        c.execute(index)
+    if sequence is not None:
+        c.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table,))
+        c.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table, sequence[0]))
+
+MIGRATIONS = [
+    _migration_1,
+    _migration_2,
+    _migration_3,
+    _migration_4,
+    _migration_5,
+    _migration_6,
+    _migration_7,
+    _migration_8,
+    _migration_9,
+    _migration_10,
+    _migration_11,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def _main_file(c):
+    return next(row[2] for row in c.execute("PRAGMA database_list") if row[1] == "main")
+
+# ---------- Catalog migrations ----------
+# Same scheme as above, applied to the catalog file by catalog_builder().
+
+def _catalog_migration_1(c):
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS subjects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            branch TEXT NOT NULL,
+            semester INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            roadmap_json TEXT NOT NULL
+        );
+    ''')
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_subjects_natural ON subjects(branch, semester, name);")
+
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS resources (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            subject_id INTEGER NOT NULL,
+            note_url TEXT NOT NULL,
+            video_url TEXT NOT NULL,
+            FOREIGN KEY(subject_id) REFERENCES subjects(id) ON DELETE CASCADE
+        );
+    ''')
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_resources_natural ON resources(subject_id, note_url);")
+
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS questions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            subject_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            prompt TEXT NOT NULL,
+            options_json TEXT NOT NULL,
+            answer INTEGER NOT NULL,
+            FOREIGN KEY(subject_id) REFERENCES subjects(id) ON DELETE CASCADE,
+            UNIQUE (subject_id, position)
+        );
+    ''')
+
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS prerequisites (
+            subject_id INTEGER NOT NULL,
+            requires_id INTEGER NOT NULL,
+            PRIMARY KEY (subject_id, requires_id),
+            FOREIGN KEY(subject_id) REFERENCES subjects(id) ON DELETE CASCADE,
+            FOREIGN KEY(requires_id) REFERENCES subjects(id) ON DELETE CASCADE
+        ) WITHOUT ROWID;
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_prerequisites_requires ON prerequisites(requires_id)")
+
+    c.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS catalog_fts USING fts5(
+            name, roadmap, resources, branch, semester UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        );
+    ''')
+    c.execute(f"INSERT INTO catalog_fts (catalog_fts, rank) VALUES ('rank', '{SEARCH_RANK}')")
+
+    # Catalog and question bank versions, seed file checksums
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    ''')
+
+CATALOG_MIGRATIONS = [
+    _catalog_migration_1,
+]
+CATALOG_SCHEMA_VERSION = len(CATALOG_MIGRATIONS)
+
+# Tables _migration_11 copies out of the user database (catalog_fts is rebuilt)
+CATALOG_TABLES = ("subjects", "resources", "questions", "prerequisites")
+_CATALOG_META = ("key IN ('catalog_version', 'catalog_updated_at', 'question_bank_version') "
+                 "OR key LIKE 'seed_sha256:%' OR key LIKE 'seed_stamp:%'")
+
+# ---------- Seed bookkeeping ----------
+
+def _file_stamp(path):
+    """Cheap change marker for a seed file (mtime + size), or None if missing."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _stale_seed_files(c):
+    """Return the seed files whose mtime/size differ from the recorded stamp."""
+    stale = []
+    for path in SEED_FILES:
+        stamp = _file_stamp(path)
+        if stamp is None:
+            continue
+        if get_meta(c, "seed_stamp:" + os.path.basename(path)) != stamp:
+            stale.append(path)
+    return stale
+
+def _schema_is_current(c):
+    return c.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+
+def _catalog_is_current(path, seed=True):
+    """True if the catalog at `path` exists, has the current schema and (with
+    `seed`) was built from the seed files as they are now."""
+    if not os.path.exists(path):
+        return False
+    uri = "file:" + urllib.request.pathname2url(os.path.abspath(path)) + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True)
+    try:
+        if conn.execute("PRAGMA user_version").fetchone()[0] != CATALOG_SCHEMA_VERSION:
+            return False
+        return not (seed and _stale_seed_files(conn))
+    finally:
+        conn.close()
+
+# ---------- Seeding ----------
+# Seed rows are streamed from disk (JSON array or NDJSON) and written with
+# executemany in batches, resolving subject_id through an in-memory key map
+# instead of a SELECT per row.
+
+SEED_BATCH_SIZE = 5000
+
+_RECORD_SEPARATORS = re.compile(r"[\s,\[]*")
+
+def iter_seed_records(path, chunk_size=1 << 20):
+    """Yield seed objects from a JSON array or NDJSON file without loading it whole."""
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".ndjson", ".jsonl")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        decoder = json.JSONDecoder()
+        buf, idx = "", 0
+        while True:
+            idx = _RECORD_SEPARATORS.match(buf, idx).end()
+            if buf.startswith("]", idx):
+                return
+            try:
+                obj, idx = decoder.raw_decode(buf, idx)
+            except json.JSONDecodeError:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    if idx >= len(buf):
+                        return
+                    raise
+                buf, idx = buf[idx:] + chunk, 0
+                continue
+            yield obj
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _load_subjects(c, subjects, batch_size):
+    """Insert new subjects and update changed roadmaps. Returns (inserted, updated, rows)."""
+    existing = {
+        (row[1], row[2], row[3]): row[4]
+        for row in c.execute("SELECT id, branch, semester, name, roadmap_json FROM subjects")
+    }
+    inserted = updated = rows = 0
+    for batch in _batched(subjects, batch_size):
+        to_insert, to_update = [], []
+        for sub in batch:
+            key = (sub["branch"], sub["semester"], sub["name"])
+            roadmap_json = json.dumps(sub["roadmap"])
+            current = existing.get(key)
+            if current is None:
+                to_insert.append(key + (roadmap_json,))
+            elif current != roadmap_json:
+                to_update.append((roadmap_json,) + key)
+            existing[key] = roadmap_json
+        c.executemany(
+            "INSERT INTO subjects (branch, semester, name, roadmap_json) VALUES (?,?,?,?)",
+            to_insert
+        )
+        c.executemany(
+            "UPDATE subjects SET roadmap_json = ? WHERE branch = ? AND semester = ? AND name = ?",
+            to_update
+        )
+        inserted += len(to_insert)
+        updated += len(to_update)
+        rows += len(batch)
+    return inserted, updated, rows
+
+def _load_resources(c, resources, batch_size):
+    """Insert new resource links and update changed video URLs. Returns (inserted, updated, rows)."""
+    subject_ids = {
+        (row[1], row[2], row[3]): row[0]
+        for row in c.execute("SELECT id, branch, semester, name FROM subjects")
+    }
+    existing = {
+        (row[0], row[1]): row[2]
+        for row in c.execute("SELECT subject_id, note_url, video_url FROM resources")
+    }
+    inserted = updated = rows = 0
+    for batch in _batched(resources, batch_size):
+        to_insert, to_update = [], []
+        for res in batch:
+            subject_id = subject_ids.get((res["branch"], res["semester"], res["subject"]))
+            if subject_id is None:
+                continue
+            key = (subject_id, res["note_url"])
+            current = existing.get(key)
+            if current is None:
+                to_insert.append(key + (res["video_url"],))
+            elif current != res["video_url"]:
+                to_update.append((res["video_url"],) + key)
+            existing[key] = res["video_url"]
+        c.executemany(
+            "INSERT INTO resources (subject_id, note_url, video_url) VALUES (?,?,?)",
+            to_insert
+        )
+        c.executemany(
+            "UPDATE resources SET video_url = ? WHERE subject_id = ? AND note_url = ?",
+            to_update
+        )
+        inserted += len(to_insert)
+        updated += len(to_update)
+        rows += len(batch)
+    return inserted, updated, rows
+
+def _report(label, inserted, updated, rows, seconds):
+    rate = rows / seconds if seconds > 0 else float("inf")
+    print(f"  {label}: {inserted} inserted, {updated} updated, "
+          f"{rows} rows in {seconds:.2f}s ({rate:,.0f} rows/s)")
+
+def bulk_load(c, subjects=(), resources=(), batch_size=SEED_BATCH_SIZE):
+    """Upsert seed subjects and resources (any iterables of seed dicts).
+
+    Must be called inside an open transaction. Returns a dict of per-table
+    ``{"inserted", "updated", "rows", "seconds"}`` stats.
+    """
+    stats = {}
+    for label, loader, records in (("subjects", _load_subjects, subjects),
+                                   ("resources", _load_resources, resources)):
+        started = time.perf_counter()
+        inserted, updated, rows = loader(c, records, batch_size)
+        seconds = time.perf_counter() - started
+        stats[label] = {"inserted": inserted, "updated": updated, "rows": rows, "seconds": seconds}
+        _report(label, inserted, updated, rows, seconds)
+    return stats
+
+def _load_questions(c, records):
+    """Replace the question set of every subject named in the seed records.
+
+    Each record is ``{"branch", "semester", "subject", "questions": [
+    {"prompt", "options", "answer"}, ...]}``. Returns the number of questions written.
+    """
+    subject_ids = {
+        (row[1], row[2], row[3]): row[0]
+        for row in c.execute("SELECT id, branch, semester, name FROM subjects")
+    }
+    written = 0
+    for batch in _batched(records, SEED_BATCH_SIZE):
+        targets, rows = [], []
+        for rec in batch:
+            subject_id = subject_ids.get((rec["branch"], rec["semester"], rec["subject"]))
+            if subject_id is None:
+                continue
+            targets.append((subject_id,))
+            rows.extend(
+                (subject_id, position, q["prompt"], json.dumps(q["options"]), q["answer"])
+                for position, q in enumerate(rec["questions"])
+            )
+        c.executemany("DELETE FROM questions WHERE subject_id = ?", targets)
+        c.executemany(
+            "INSERT INTO questions (subject_id, position, prompt, options_json, answer) VALUES (?,?,?,?,?)",
+            rows
+        )
+        written += len(rows)
+    return written
+
+def _add_default_questions(c):
+    """Give every subject without questions the DEFAULT_QUESTIONS set. Returns rows added."""
+    templates = json.dumps([
+        [position, q["prompt"], q["options"], q["answer"]]
+        for position, q in enumerate(DEFAULT_QUESTIONS)
+    ])
+    cur = c.execute(
+        '''
+        INSERT INTO questions (subject_id, position, prompt, options_json, answer)
+        SELECT s.id,
+               json_extract(t.value, '$[0]'),
+               replace(json_extract(t.value, '$[1]'), '{subject}', s.name),
+               (SELECT json_group_array(replace(o.value, '{subject}', s.name))
+                FROM json_each(t.value, '$[2]') o),
+               json_extract(t.value, '$[3]')
+        FROM subjects s, json_each(?) t
+        WHERE NOT EXISTS (SELECT 1 FROM questions q WHERE q.subject_id = s.id)
+        ''',
+        (templates,)
+    )
+    return cur.rowcount
+
+def _load_prerequisites(c, records=None):
+    """Rebuild the prerequisites table from subject names.
+
+    `records` are ``{"subject", "requires": [names], "branch" (optional)}``
+    dicts; without them planner.default_requirements() is used. Names resolve
+    within each branch: a subject requires the latest offering of each named
+    subject before its own semester (else the first offering). Raises
+    ValueError if the result has a cycle. Returns the number of edges.
+    """
+    if records is None:
+        requirements = lambda branch, name: default_requirements(name)
+    else:
+        table = {}
+        for rec in records:
+            table[rec.get("branch"), rec["subject"]] = rec["requires"]
+        requirements = lambda branch, name: table.get((branch, name), table.get((None, name), []))
+
+    offerings = defaultdict(lambda: defaultdict(list))   # branch -> name -> [(semester, id)]
+    for sid, branch, sem, name in c.execute(
+            "SELECT id, branch, semester, name FROM subjects ORDER BY branch, semester, id"):
+        offerings[branch][name].append((sem, sid))
+    edges = []
+    for branch, names in offerings.items():
+        branch_edges = []
+        for name, subjects in names.items():
+            for required in requirements(branch, name):
+                options = names.get(required)
+                if not options or required == name:
+                    continue
+                for sem, sid in subjects:
+                    earlier = [option for option in options if option[0] < sem]
+                    branch_edges.append((sid, (earlier[-1] if earlier else options[0])[1]))
+        topological_order([(sid, sid) for subjects in names.values() for _, sid in subjects], branch_edges)
+        edges.extend(branch_edges)
+    c.execute("DELETE FROM prerequisites")
+    c.executemany("INSERT OR IGNORE INTO prerequisites (subject_id, requires_id) VALUES (?, ?)", edges)
+    return len(edges)
+
+SEARCH_RANK = "bm25(10.0, 2.0, 1.0, 0.0)"
+
+def _link_terms(url):
+    """Searchable words of a resource link: host, decoded path and query."""
+    parts = urllib.parse.urlsplit(url)
+    host = parts.netloc[4:] if parts.netloc.startswith("www.") else parts.netloc
+    return " ".join((host, urllib.parse.unquote_plus(parts.path), urllib.parse.unquote_plus(parts.query)))
+
+def rebuild_search_index(c, batch_size=SEED_BATCH_SIZE):
+    """Repopulate catalog_fts from subjects, roadmaps and resources. Returns rows indexed."""
+    started = time.perf_counter()
+    c.execute("DELETE FROM catalog_fts")
+    rows = c.connection.execute(
+        '''
+        SELECT s.id, s.name, s.roadmap_json, s.branch, s.semester,
+               (SELECT group_concat(r.note_url || ' ' || r.video_url, ' ')
+                FROM resources r WHERE r.subject_id = s.id)
+        FROM subjects s
+        '''
+    )
+    indexed = 0
+    for batch in _batched(rows, batch_size):
+        records = []
+        for subject_id, name, roadmap_json, branch, semester, links in batch:
+            try:
+                roadmap = " ".join(json.loads(roadmap_json))
+            except (TypeError, ValueError):
+                roadmap = ""
+            resources = " ".join(_link_terms(url) for url in (links or "").split())
+            records.append((subject_id, name, roadmap, resources, branch, semester))
+        c.executemany(
+            "INSERT INTO catalog_fts (rowid, name, roadmap, resources, branch, semester) VALUES (?,?,?,?,?,?)",
+            records
+        )
+        indexed += len(records)
+    _report("search index", indexed, 0, indexed, time.perf_counter() - started)
+    return indexed
+
+def _apply_seed(c, stale_paths):
+    """Re-apply seed files whose content actually changed and record their stamps."""
+    changed = set()
+    for path in stale_paths:
+        name = os.path.basename(path)
+        checksum = _file_sha256(path)
+        if get_meta(c, "seed_sha256:" + name) != checksum:
+            changed.add(path)
+        set_meta(c, "seed_sha256:" + name, checksum)
+        set_meta(c, "seed_stamp:" + name, _file_stamp(path))
+
+    # Resources and questions resolve against subjects, so a subject change re-syncs them
+    if SUBJECTS_JSON in changed:
+        changed.add(RESOURCES_JSON)
+        if os.path.exists(QUESTIONS_JSON):
+            changed.add(QUESTIONS_JSON)
+    if changed & {SUBJECTS_JSON, RESOURCES_JSON}:
+        print("Seeding catalog...")
+        bulk_load(
+            c,
+            iter_seed_records(SUBJECTS_JSON) if SUBJECTS_JSON in changed else (),
+            iter_seed_records(RESOURCES_JSON) if RESOURCES_JSON in changed else (),
+        )
+        rebuild_search_index(c)
+    # Prerequisites are stored by subject id, so a subject change re-resolves them
+    if changed & {SUBJECTS_JSON, PREREQUISITES_JSON}:
+        records = iter_seed_records(PREREQUISITES_JSON) if os.path.exists(PREREQUISITES_JSON) else None
+        print(f"  prerequisites: {_load_prerequisites(c, records)} edges")
+    if changed & {SUBJECTS_JSON, RESOURCES_JSON, PREREQUISITES_JSON}:
+        bump_catalog_version(c)
+    questions = 0
+    if QUESTIONS_JSON in changed:
+        questions += _load_questions(c, iter_seed_records(QUESTIONS_JSON))
+    if SUBJECTS_JSON in changed:
+        questions += _add_default_questions(c)
+    if questions:
+        print(f"  questions: {questions} written")
+        bump_question_bank_version(c)
+    return bool(changed)
+
+def bump_catalog_version(c):
+    """Tell running workers (see catalog.py) that cached catalog data is stale."""
+    version = int(get_meta(c, "catalog_version") or 0) + 1
+    set_meta(c, "catalog_version", str(version))
+    set_meta(c, "catalog_updated_at", str(int(time.time())))
+    return version
+
+def bump_question_bank_version(c):
+    """Tell running workers (see quizbank.py) that cached questions are stale."""
+    version = int(get_meta(c, "question_bank_version") or 0) + 1
+    set_meta(c, "question_bank_version", str(version))
+    return version
+
+# ---------- Catalog file ----------
+
+@contextmanager
+def catalog_builder(path, base=None):
+    """Yield a cursor on a writable copy of the catalog, then swap it in at `path`.
+
+    The copy starts from `base` (default: the catalog now at `path`, so subject
+    ids stay stable) or from nothing, is brought to the current catalog schema
+    and is written in one transaction. Afterwards it is analyzed and compacted
+    (readers open it immutable, so this is the only chance) and renamed over
+    `path`. If the body raises, the copy is deleted and `path` is untouched.
+    """
+    base = base or path
+    tmp = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(base):
+        shutil.copyfile(base, tmp)
+    elif os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp, isolation_level=None)
+    try:
+        c = conn.cursor()
+        # Nothing else has the copy open and a failed build is thrown away: no journal needed
+        c.execute("PRAGMA journal_mode = OFF")
+        c.execute("PRAGMA synchronous = OFF")
+        c.execute("BEGIN")
+        version = c.execute("PRAGMA user_version").fetchone()[0]
+        for number in range(version + 1, CATALOG_SCHEMA_VERSION + 1):
+            CATALOG_MIGRATIONS[number - 1](c)
+        c.execute(f"PRAGMA user_version = {CATALOG_SCHEMA_VERSION}")
+        yield c
+        c.execute("COMMIT")
+        c.execute("ANALYZE")
+        c.execute("INSERT INTO catalog_fts (catalog_fts) VALUES ('optimize')")
+        c.execute("VACUUM")
+        conn.close()
+        with open(tmp, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        conn.close()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+@contextmanager
+def _build_lock(path):
+    """Hold an exclusive lock on `path` + ".lock" across processes.
+
+    The lock is a write transaction on a scratch SQLite file, so it works
+    wherever SQLite does and is released by the OS if the holder dies.
+    """
+    conn = sqlite3.connect(path + ".lock", timeout=BUILD_LOCK_TIMEOUT, isolation_level=None)
+    try:
+        conn.execute("BEGIN EXCLUSIVE")
+        yield
+    finally:
+        conn.close()
+
+def build_catalog(path=None, seed=True, base=None):
+    """Bring the catalog file at `path` up to date with the seed files.
+
+    Builds are serialised across processes: workers booting at the same time
+    wait for the first one's build and then find the catalog current. With
+    `base`, always builds `path` from that catalog (to stage a file for
+    deployment). Returns True if a new file was written.
+    """
+    path = path or catalog_path()
+    if base is None and _catalog_is_current(path, seed):
+        return False
+    with _build_lock(path):
+        if base is None and _catalog_is_current(path, seed):
+            return False
+        started = time.perf_counter()
+        with catalog_builder(path, base) as c:
+            if seed:
+                _apply_seed(c, _stale_seed_files(c))
+            version = get_meta(c, "catalog_version") or "0"
+    print(f"Catalog version {version} written to {path} in {time.perf_counter() - started:.2f}s")
+    return True
+
+# ---------- Query plan check ----------
+# Every lookup on a request path. check_query_plans() fails if any of them
+# would fall back to a full table SCAN. The SQL is the modules' own, so add
+# a route's new queries here when writing them.
+
+def route_queries():
+    """{name: sql} for every query run on a request path."""
+    # Imported here: app and api import this module
+    import api
+    import app
+    import catalog
+    import cf
+    import db
+    import planner
+    import quizbank
+    import recommender
+    import sessions
+    return {
+        "login": app.USER_BY_EMAIL_SQL,
+        "dashboard.scores": app.DASHBOARD_SCORES_SQL,
+        "meta": db.META_SQL.format(schema="main"),
+        "catalog.meta": db.META_SQL.format(schema="catalog"),
+        "catalog.semester": catalog.SEMESTER_SQL,
+        "catalog.subject_group": catalog.SUBJECT_GROUP_SQL,
+        "catalog.search_candidates": catalog.SEARCH_CANDIDATES_SQL,
+        "catalog.search": catalog.SEARCH_SQL,
+        "recommender.user_scores": recommender.USER_SCORES_SQL,
+        "recommender.snapshot": recommender.SNAPSHOT_SQL,
+        "recommender.resources": recommender.RESOURCES_SQL,
+        "quizbank.questions": quizbank.QUESTIONS_SQL,
+        "cf.mastery": cf.MASTERY_SQL,
+        "api.dashboard": api.DASHBOARD_SCORES_SQL,
+        "api.semesters": api.SEMESTERS_SQL,
+        "api.history": api.HISTORY_SQL,
+        "sessions.load": sessions.LOAD_SQL,
+        "sessions.expiry": sessions.EXPIRY_SQL,
+        "sessions.purge": sessions.PURGE_SQL,
+        "planner.subjects": planner.SUBJECTS_SQL,
+        "planner.edges": planner.EDGES_SQL,
+        "planner.mastery": planner.MASTERY_SQL,
+    }
+
+def check_query_plans(conn):
+    """Return ``[(query_name, plan_detail)]`` for every route query that scans a table.
+    `conn` needs the catalog attached (db.attach_catalog)."""
+    failures = []
+    for name, sql in route_queries().items():
+        params = (None,) * sql.count("?")
+        for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params):
+            detail = row[-1]
+            # Scanning json_each() just walks the bound id list, not a table
+            if detail.startswith("SCAN") and "VIRTUAL TABLE" not in detail:
+                failures.append((name, detail))
+    return failures
+
+# ---------- Entry point ----------
+
+def init_db(db_path=DB_PATH, seed=True):
+    """Bring the database up to the current schema and the catalog up to date
+    with the seed files.
+
+    The common case (nothing to do) is two version checks and a few ``stat``
+    calls. Migrations run under ``BEGIN IMMEDIATE`` so concurrently booting
+    workers serialise on them and all but the first find nothing to do. The
+    catalog is rebuilt by build_catalog(), outside that lock.
+    """
+    conn = sqlite3.connect(db_path, timeout=LOCK_TIMEOUT, isolation_level=None)
+    migrated = False
+    try:
+        c = conn.cursor()
+        if not _schema_is_current(c):
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                version = c.execute("PRAGMA user_version").fetchone()[0]
+                for number in range(version + 1, SCHEMA_VERSION + 1):
+                    print(f"Applying migration {number}...")
+                    MIGRATIONS[number - 1](c)
+                if version != SCHEMA_VERSION:
+                    c.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                    migrated = True
+                c.execute("COMMIT")
+            except BaseException:
+                c.execute("ROLLBACK")
+                raise
+    finally:
+        conn.close()
+    seeded = build_catalog(catalog_path(db_path), seed=seed)
+    if migrated or seeded:
+        print("Database initialized successfully at", db_path)
+
+def reset_db(db_path=DB_PATH):
+    """Delete the database and its catalog and rebuild them from the seed files."""
+    for path in (db_path, catalog_path(db_path)):
+        if os.path.exists(path):
+            os.remove(path)
+            print(f"Removed existing {os.path.basename(path)}.")
+    init_db(db_path)
 
 if __name__ == "__main__":
-    init_db()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reset", action="store_true",
+                        help="drop the existing database (including users and quiz history) and reseed")
+    parser.add_argument("--catalog-out", metavar="PATH",
+                        help="only build a catalog from the seed files into PATH, starting from the "
+                             "live one so subject ids are kept; deploy it by renaming it over the live one")
+    parser.add_argument("--check-plans", action="store_true",
+                        help="exit non-zero if any route query falls back to a full table scan")
+    parser.add_argument("--rebuild-mastery", action="store_true",
+                        help="regenerate the per-subject mastery summary from raw quiz rows")
+    args = parser.parse_args()
+    if args.catalog_out:
+        build_catalog(args.catalog_out, base=catalog_path(DB_PATH))
+        raise SystemExit(0)
+    if args.reset:
+        reset_db()
+    else:
+        init_db()
+    if args.rebuild_mastery:
+        conn = sqlite3.connect(DB_PATH)
+        with conn:
+            rows = rebuild_mastery(conn)
+        conn.close()
+        print(f"Rebuilt mastery summary: {rows} rows.")
+    if args.check_plans:
+        conn = sqlite3.connect(DB_PATH)
+        attach_catalog(conn)
+        failures = check_query_plans(conn)
+        conn.close()
+        for name, detail in failures:
+            print(f"SCAN in {name}: {detail}")
+        if failures:
+            raise SystemExit(1)
+        print(f"All {len(route_queries())} route queries use an index.")
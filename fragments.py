@@ -0,0 +1,141 @@
+# fragments.py
+
+"""Rendered-fragment cache for catalog-driven template sections.
+Pages like the semester view render the same subject list for every student
+of a branch/semester. Wrapping such a section in
+
+    {% cache "semester-subjects", branch, semester %} ... {% endcache %}
+
+renders it once per key and catalog version and reuses the HTML from a
+per-process LRU bounded by FRAGMENT_CACHE_BYTES (0 disables caching).
+
+Per-student bits inside a cached section are left as holes: ``{{ slot(...) }}``
+marks one, and ``using <macro>`` names the macro that fills it on every
+request with the slot's arguments. For example, in dashboard.html:
+
+    {% cache "dashboard-subjects", branch, semester using score_slot %}
+        <div class="subject-card {{ slot('class', subj.name) }}">
+    {% endcache %}
+
+The fragment is stored pre-split around its holes, so a hit is a join of
+static strings and a few macro calls.
+"""
+
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+import catalog
+
+MAX_BYTES = int(os.environ.get("FRAGMENT_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+_HOLE = re.compile("\x1e(.*?)\x1e")     # slot() marker; json.dumps never emits \x1e
+
+def slot(*args):
+    """Mark a per-request hole in a cached fragment, filled by the block's macro."""
+    return Markup("\x1e" + json.dumps(args) + "\x1e")
+
+class FragmentCache:
+    """LRU of rendered fragments, bounded by the UTF-8 size of their text."""
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (pieces, size)
+        self._bytes = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key, version):
+        with self._lock:
+            if version != self._version:
+                # Catalog reseeded: everything cached was rendered from the old one
+                self._entries.clear()
+                self._bytes = 0
+                self._version = version
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[0]
+
+    def put(self, key, version, pieces, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if version != self._version:
+                return  # rendered from a catalog that has been replaced meanwhile
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (pieces, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.stats["evictions"] += 1
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), bytes=self._bytes)
+
+def _split(html):
+    """Split rendered HTML into static strings and slot argument lists."""
+    parts = _HOLE.split(html)
+    return tuple(json.loads(part) if i % 2 else part for i, part in enumerate(parts))
+
+def _fill(pieces, fill):
+    if len(pieces) == 1:
+        return Markup(pieces[0])
+    out = []
+    for i, piece in enumerate(pieces):
+        out.append(str(fill(*piece)) if i % 2 else piece)
+    return Markup("".join(out))
+
+class FragmentCacheExtension(Extension):
+    """Adds ``{% cache name, key... [using macro] %}...{% endcache %}``."""
+
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=FragmentCache())
+        environment.globals["slot"] = slot
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        keys = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            keys.append(parser.parse_expression())
+        fill = nodes.Const(None)
+        if parser.stream.skip_if("name:using"):
+            fill = parser.parse_expression()
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        call = self.call_method("_render", [nodes.Const(parser.name), nodes.List(keys), fill])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, template, keys, fill, caller):
+        cache = self.environment.fragment_cache
+        if cache.max_bytes <= 0:
+            return _fill(_split(caller()), fill)
+        key = (template, *keys)
+        version = catalog.get_version()[0]
+        pieces = cache.get(key, version)
+        if pieces is None:
+            html = str(caller())
+            pieces = _split(html)
+            cache.put(key, version, pieces, len(html.encode("utf-8")))
+        return _fill(pieces, fill)
+
+def install(app):
+    """Enable {% cache %} in `app`'s templates. Returns the FragmentCache."""
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    return app.jinja_env.fragment_cache
@@ -1,6 +1,22 @@
 # generate_data.py
+
+"""Seed and load-test data for LearningAI.
+
+    python generate_data.py                      # data/subjects.json + data/resources.json
+    python generate_data.py --format sqlite --out load.db --users 1000000 --attempts 30
+
+The sqlite format also generates users and quiz history. Everything
+is streamed from generators, so memory is bounded by the catalog size and not
+by the number of users or attempts, and a given --seed always produces the
+same data.
+"""
+
+import argparse
 import json
+import random
+import time
 import urllib.parse
+from collections import Counter, defaultdict
 
 branches = [
     "Computer Science Engineering",
@@ -56,12 +72,14 @@ def generate_subjects():
         
         for sem in range(1, 9):
             sem_subjects = []
+            seen = set()
             start_index = (sem - 1) * 3
             count = 0
             while count < 5:
                 idx = (start_index + count) % len(full_pool)
                 subj_name = full_pool[idx]
-                if subj_name not in [s['name'] for s in sem_subjects]:
+                if subj_name not in seen:
+                     seen.add(subj_name)
                      sem_subjects.append({
                         "name": subj_name,
                         "branch": branch,
@@ -78,9 +96,9 @@ def generate_subjects():
             subjects_data.extend(sem_subjects)
     return subjects_data
 
-def generate_resources(subjects_list):
-    resources_data = []
-    for sub in subjects_list:
+def iter_resources(subjects_iter):
+    """Yield one resource record per subject; works on lists or generators."""
+    for sub in subjects_iter:
         # Notes: Direct tutorial URL
         note_slug = sub['name'].replace(' ', '-').lower()
         notes_link = f"https://www.geeksforgeeks.org/{note_slug}/"
@@ -90,24 +108,194 @@ def generate_resources(subjects_list):
         query_video = urllib.parse.quote(f"{sub['name']} {sub['branch']} engineering tutorial")
         video_embed_url = f"https://www.youtube.com/embed?listType=search&list={query_video}"
         
-        resources_data.append({
+        yield {
             "branch": sub["branch"],
             "semester": sub["semester"],
             "subject": sub["name"],
             "note_url": notes_link,
             "video_url": video_embed_url
-        })
-    return resources_data
+        }
+
+def generate_resources(subjects_list):
+    return list(iter_resources(subjects_list))
+
+def iter_synthetic_subjects(n_subjects, subjects_per_semester=5, semesters=8):
+    """Yield `n_subjects` unique synthetic subjects for load testing the seeder."""
+    per_branch = subjects_per_semester * semesters
+    for i in range(n_subjects):
+        branch_no, offset = divmod(i, per_branch)
+        name = f"Synthetic Subject {i:07d}"
+        yield {
+            "name": name,
+            "branch": f"Synthetic Branch {branch_no:05d}",
+            "semester": offset // subjects_per_semester + 1,
+            "roadmap": [f"Introduction to {name}", "Module 1: Basics", "Review & Assessment"]
+        }
+
+# ---------- Load-test data ----------
+
+LOAD_TEST_PASSWORD = "load-test"   # every generated user shares it; hashed once
+SEMESTERS = 8
+WRITE_BATCH = 50_000                 # rows per SQLite commit
+
+def iter_catalog(subjects_per_semester=5, extra_branches=0, semesters=SEMESTERS):
+    """Yield the generate_subjects() catalog padded with electives to
+    `subjects_per_semester`, then `extra_branches` synthetic branches."""
+    counts = Counter()
+    for sub in generate_subjects():
+        counts[sub["branch"], sub["semester"]] += 1
+        yield sub
+    for branch in branches:
+        for sem in range(1, semesters + 1):
+            for k in range(counts[branch, sem], subjects_per_semester):
+                name = f"{branch} Elective {sem}.{k}"
+                yield {
+                    "name": name,
+                    "branch": branch,
+                    "semester": sem,
+                    "roadmap": [f"Introduction to {name}", "Module 1: Basics", "Review & Assessment"]
+                }
+    yield from iter_synthetic_subjects(extra_branches * subjects_per_semester * semesters,
+                                       subjects_per_semester, semesters)
+
+def iter_users(n_users, branch_names, seed=0, start_id=1):
+    """Yield `n_users` students spread over `branch_names`, each with a latent
+    `ability` (mean quiz score) used by iter_quiz_attempts()."""
+    rng = random.Random(f"{seed}:users")
+    for user_id in range(start_id, start_id + n_users):
+        yield {
+            "id": user_id,
+            "name": f"Load Test User {user_id}",
+            "email": f"loadtest{user_id}@example.com",
+            "branch": rng.choice(branch_names),
+            "semester": rng.randint(1, SEMESTERS),
+            "ability": min(95.0, max(15.0, rng.gauss(62, 14))),
+        }
+
+def subject_difficulty(key, seed=0):
+    """Deterministic per-subject difficulty offset (points subtracted from scores)."""
+    return random.Random(f"{seed}:subject:{key}").gauss(0, 8)
+
+def iter_quiz_attempts(users, subjects_by_branch, attempts_per_user, seed=0):
+    """Yield (user, subject_key, score) quiz attempts.
+
+    `subjects_by_branch` maps branch -> [(subject_key, semester, difficulty)].
+    Attempts per user are gamma-distributed around `attempts_per_user`, mostly
+    on subjects up to the user's semester. A score is the user's ability minus
+    the subject's difficulty plus noise, and retakes score a little higher.
+    """
+    rng = random.Random(f"{seed}:attempts")
+    for user in users:
+        pool = subjects_by_branch.get(user["branch"])
+        if not pool or attempts_per_user <= 0:
+            continue
+        current = [s for s in pool if s[1] <= user["semester"]] or pool
+        taken = Counter()
+        for _ in range(int(rng.gammavariate(2.0, attempts_per_user / 2.0))):
+            key, _, difficulty = rng.choice(current if rng.random() < 0.85 else pool)
+            score = user["ability"] - difficulty + 4 * taken[key] + rng.gauss(0, 12)
+            taken[key] += 1
+            yield user, key, int(min(100, max(0, round(score))))
+
+def _subjects_by_branch(rows, seed):
+    """Group (key, branch, semester) rows for iter_quiz_attempts()."""
+    grouped = defaultdict(list)
+    for key, branch, semester in rows:
+        grouped[branch].append((key, semester, subject_difficulty(key, seed)))
+    return grouped
+
+def _progress(label, rows, started):
+    seconds = time.perf_counter() - started
+    print(f"  {label}: {rows:,} rows in {seconds:.2f}s ({rows / max(seconds, 1e-9):,.0f} rows/s)")
+
+def write_sqlite(db_path, subjects, n_users=0, attempts_per_user=0, seed=0):
+    """Load the catalog, users and quiz history straight into a LearningAI
+    database and its catalog file (created if needed), committing every
+    WRITE_BATCH rows, then rebuild the mastery summary."""
+    import sqlite3
+    import db
+    import db_init
+    from recommender import rebuild_mastery
+    from werkzeug.security import generate_password_hash
+
+    db_init.init_db(db_path, seed=False)
+    subjects = list(subjects)
+    with db_init.catalog_builder(db.catalog_path(db_path)) as c:
+        db_init.bulk_load(c, subjects, iter_resources(subjects))
+        db_init._add_default_questions(c)
+        db_init._load_prerequisites(c)
+        db_init.rebuild_search_index(c)
+        db_init.bump_catalog_version(c)
+        db_init.bump_question_bank_version(c)
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    db.attach_catalog(conn, db.catalog_path(db_path))
+    c = conn.cursor()
+    try:
+        start_id = c.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM users").fetchone()[0]
+
+        names = sorted({sub["branch"] for sub in subjects})
+        by_branch = _subjects_by_branch(c.execute("SELECT id, branch, semester FROM subjects"), seed)
+        pw_hash = generate_password_hash(LOAD_TEST_PASSWORD)
+        # Users are regenerated (same seed) for the quizzes pass rather than held in memory
+        def users():
+            return iter_users(n_users, names, seed, start_id)
+
+        for label, sql, rows in (
+            ("users", "INSERT INTO users (id, name, email, password_hash, branch, semester) VALUES (?,?,?,?,?,?)",
+             ((u["id"], u["name"], u["email"], pw_hash, u["branch"], u["semester"]) for u in users())),
+            ("quizzes", "INSERT INTO quizzes (user_id, subject_id, score) VALUES (?,?,?)",
+             ((user["id"], key, score)
+              for user, key, score in iter_quiz_attempts(users(), by_branch, attempts_per_user, seed))),
+        ):
+            started = time.perf_counter()
+            count = 0
+            for batch in db_init._batched(rows, WRITE_BATCH):
+                c.execute("BEGIN IMMEDIATE")
+                c.executemany(sql, batch)
+                c.execute("COMMIT")
+                count += len(batch)
+            _progress(label, count, started)
+
+        started = time.perf_counter()
+        c.execute("BEGIN IMMEDIATE")
+        rows = rebuild_mastery(conn)
+        c.execute("COMMIT")
+        _progress("mastery", rows, started)
+    except BaseException:
+        if conn.in_transaction:
+            c.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
 
 if __name__ == "__main__":
-    print("Generating comprehensive seed data with TOPIC-SPECIFIC LINKS...")
-    subs = generate_subjects()
-    res = generate_resources(subs)
+    parser = argparse.ArgumentParser(description="Generate seed or load-test data for LearningAI.")
+    parser.add_argument("--format", choices=["json", "sqlite"], default="json",
+                        help="json: the data/*.json seed files; sqlite: load straight into a database")
+    parser.add_argument("--out", help="database path (sqlite)")
+    parser.add_argument("--users", type=int, default=0)
+    parser.add_argument("--attempts", type=int, default=0, help="mean quiz attempts per user")
+    parser.add_argument("--subjects-per-semester", type=int, default=5)
+    parser.add_argument("--extra-branches", type=int, default=0, help="synthetic branches beyond the 16 real ones")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.format == "sqlite":
+        write_sqlite(args.out or "load_test.db",
+                     iter_catalog(args.subjects_per_semester, args.extra_branches),
+                     args.users, args.attempts, args.seed)
+    else:
+        print("Generating comprehensive seed data with TOPIC-SPECIFIC LINKS...")
+        subs = generate_subjects()
+        res = generate_resources(subs)
     
-    with open("data/subjects.json", "w", encoding="utf-8") as f:
-        json.dump(subs, f, indent=2)
+        with open("data/subjects.json", "w", encoding="utf-8") as f:
+            json.dump(subs, f, indent=2)
     
-    with open("data/resources.json", "w", encoding="utf-8") as f:
-        json.dump(res, f, indent=2)
+        with open("data/resources.json", "w", encoding="utf-8") as f:
+            json.dump(res, f, indent=2)
         
-    print(f"Generated {len(subs)} subjects and {len(res)} topic-specific resource links.")
+        print(f"Generated {len(subs)} subjects and {len(res)} topic-specific resource links.")
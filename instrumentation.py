@@ -0,0 +1,376 @@
+# instrumentation.py
+
+"""Opt-in request instrumentation for LearningAI.
+Set LEARNING_AI_METRICS=1 and install(app) will record, per route, wall time,
+SQLite time (queries, rows, per-statement timings keyed by normalized SQL),
+template render time and any timed() sections such as the recommender. The
+numbers are served at /metrics in Prometheus text format and summarised on
+each response in a Server-Timing header. Counters are per process; scrape
+every gunicorn worker or run with one.
+
+LEARNING_AI_PROFILE_RATE (0..1) additionally runs a sampling profiler on that
+fraction of requests and writes collapsed stacks (flamegraph.pl / speedscope
+input) to LEARNING_AI_PROFILE_DIR, one file per sampled request.
+"""
+
+import functools
+import os
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from flask import Response, before_render_template, current_app, request, template_rendered
+
+import assets
+import db
+import jobs
+import passwords
+
+ENABLED = os.environ.get("LEARNING_AI_METRICS", "") not in ("", "0")
+PROFILE_RATE = float(os.environ.get("LEARNING_AI_PROFILE_RATE", "0"))
+PROFILE_DIR = os.environ.get("LEARNING_AI_PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = 0.002            # seconds between stack samples
+MAX_STATEMENTS = 500                # distinct normalized statements tracked
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+_local = threading.local()          # .current -> RequestStats of the request on this thread
+_lock = threading.Lock()
+_requests = Counter()               # (route, method, status) -> count
+_durations = {}                     # route -> [bucket counts..., +Inf count, sum]
+_route_totals = defaultdict(Counter)        # route -> sql_queries, sql_seconds, sql_rows
+_templates = Counter()              # (route, template) -> seconds
+_sections = Counter()               # (route, section) -> seconds
+_statements = {}                    # normalized sql -> [executions, seconds, rows]
+
+class RequestStats:
+    __slots__ = ("route", "started", "sql_queries", "sql_seconds", "sql_rows",
+                 "templates", "sections", "render_stack", "sampler")
+
+    def __init__(self, route):
+        self.route = route
+        self.started = time.perf_counter()
+        self.sql_queries = 0
+        self.sql_seconds = 0.0
+        self.sql_rows = 0
+        self.templates = Counter()
+        self.sections = Counter()
+        self.render_stack = []
+        self.sampler = None
+
+# ---------- SQL ----------
+
+_SPACE = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+@functools.lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    """Collapse whitespace and replace literals and IN lists with placeholders."""
+    sql = _LITERALS.sub("?", _SPACE.sub(" ", sql).strip())
+    return _PLACEHOLDER_LISTS.sub("(?, ...)", sql)
+
+def _record_sql(sql, seconds, rows, executed):
+    stats = getattr(_local, "current", None)
+    if stats is not None:
+        stats.sql_queries += executed
+        stats.sql_seconds += seconds
+        stats.sql_rows += rows
+    key = normalize_sql(sql)
+    with _lock:
+        entry = _statements.get(key)
+        if entry is None:
+            if len(_statements) >= MAX_STATEMENTS:
+                key = "other"
+            entry = _statements.setdefault(key, [0, 0.0, 0])
+        entry[0] += executed
+        entry[1] += seconds
+        entry[2] += rows
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Times execute() and the fetches that follow it, and counts rows fetched."""
+
+    _sql = ""
+
+    def execute(self, sql, parameters=()):
+        self._sql = sql
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_sql(sql, time.perf_counter() - started, 0, 1)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._sql = sql
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record_sql(sql, time.perf_counter() - started, 0, 1)
+
+    def _timed_fetch(self, fetch, *args):
+        started = time.perf_counter()
+        rows = fetch(*args)
+        count = len(rows) if isinstance(rows, list) else int(rows is not None)
+        _record_sql(self._sql, time.perf_counter() - started, count, 0)
+        return rows
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, size or self.arraysize)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            _record_sql(self._sql, time.perf_counter() - started, 0, 0)
+            raise
+        _record_sql(self._sql, time.perf_counter() - started, 1, 0)
+        return row
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors (including conn.execute shortcuts) are instrumented."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+# ---------- Sections and templates ----------
+
+@contextmanager
+def timed(section):
+    """Add the time spent in the block to the current request under `section`."""
+    stats = getattr(_local, "current", None)
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.sections[section] += time.perf_counter() - started
+
+def _before_render(sender, template, context, **extra):
+    stats = getattr(_local, "current", None)
+    if stats is not None:
+        stats.render_stack.append(time.perf_counter())
+
+def _after_render(sender, template, context, **extra):
+    stats = getattr(_local, "current", None)
+    if stats is not None and stats.render_stack:
+        stats.templates[template.name or "<string>"] += time.perf_counter() - stats.render_stack.pop()
+
+# ---------- Sampling profiler ----------
+
+class StackSampler(threading.Thread):
+    """Samples one thread's Python stack every `interval` seconds into collapsed form."""
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if frames:
+                self.stacks[";".join(reversed(frames))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        return self.stacks
+
+def write_collapsed(stacks, label):
+    """Write `stacks` as "frame;frame;... count" lines. Returns the file path."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{label}-{int(time.time() * 1000)}-{os.getpid()}.collapsed")
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+# ---------- Request hooks ----------
+
+def _start_request():
+    stats = RequestStats(request.endpoint or "unmatched")
+    if PROFILE_RATE and random.random() < PROFILE_RATE:
+        stats.sampler = StackSampler(threading.get_ident())
+        stats.sampler.start()
+    _local.current = stats
+
+def _finish_request(response):
+    stats = getattr(_local, "current", None)
+    if stats is None:
+        return response
+    _local.current = None
+    total = time.perf_counter() - stats.started
+    if stats.sampler is not None:
+        write_collapsed(stats.sampler.stop(), stats.route)
+
+    route = stats.route
+    with _lock:
+        _requests[route, request.method, str(response.status_code)] += 1
+        histogram = _durations.setdefault(route, [0] * (len(DURATION_BUCKETS) + 1) + [0.0])
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if total <= bound:
+                histogram[i] += 1
+        histogram[len(DURATION_BUCKETS)] += 1
+        histogram[-1] += total
+        totals = _route_totals[route]
+        totals["sql_queries"] += stats.sql_queries
+        totals["sql_seconds"] += stats.sql_seconds
+        totals["sql_rows"] += stats.sql_rows
+        for name, seconds in stats.templates.items():
+            _templates[route, name] += seconds
+        for name, seconds in stats.sections.items():
+            _sections[route, name] += seconds
+
+    timings = [f'db;dur={stats.sql_seconds * 1000:.3f};desc="{stats.sql_queries} queries, {stats.sql_rows} rows"']
+    if stats.templates:
+        timings.append(f"tpl;dur={sum(stats.templates.values()) * 1000:.3f}")
+    timings.extend(f"{name};dur={seconds * 1000:.3f}" for name, seconds in stats.sections.items())
+    timings.append(f"total;dur={total * 1000:.3f}")
+    response.headers.add("Server-Timing", ", ".join(timings))
+    return response
+
+# ---------- Prometheus export ----------
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+def render_metrics():
+    """Return every metric in Prometheus text exposition format."""
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(f"{name}{labels} {value}" for labels, value in samples)
+
+    with _lock:
+        metric("learning_ai_requests_total", "counter", "Requests handled, by route, method and status.",
+               [(_labels(route=r, method=m, status=s), n) for (r, m, s), n in sorted(_requests.items())])
+        lines.append("# HELP learning_ai_request_duration_seconds Wall time per request, by route.")
+        lines.append("# TYPE learning_ai_request_duration_seconds histogram")
+        for route, histogram in sorted(_durations.items()):
+            for bound, count in zip(DURATION_BUCKETS, histogram):
+                lines.append(f"learning_ai_request_duration_seconds_bucket{_labels(route=route, le=bound)} {count}")
+            count = histogram[len(DURATION_BUCKETS)]
+            lines.append(f"learning_ai_request_duration_seconds_bucket{_labels(route=route, le='+Inf')} {count}")
+            lines.append(f"learning_ai_request_duration_seconds_sum{_labels(route=route)} {histogram[-1]:.6f}")
+            lines.append(f"learning_ai_request_duration_seconds_count{_labels(route=route)} {count}")
+        for key, kind, help_text in (
+            ("sql_queries", "counter", "SQL statements executed during requests, by route."),
+            ("sql_seconds", "counter", "Seconds spent in SQLite during requests, by route."),
+            ("sql_rows", "counter", "Rows fetched from SQLite during requests, by route."),
+        ):
+            metric(f"learning_ai_{key}_total", kind, help_text,
+                   [(_labels(route=route), round(totals[key], 6)) for route, totals in sorted(_route_totals.items())])
+        metric("learning_ai_template_seconds_total", "counter", "Seconds rendering templates, by route and template.",
+               [(_labels(route=r, template=t), round(s, 6)) for (r, t), s in sorted(_templates.items())])
+        metric("learning_ai_section_seconds_total", "counter", "Seconds in timed() sections, by route and section.",
+               [(_labels(route=r, section=n), round(s, 6)) for (r, n), s in sorted(_sections.items())])
+        statements = sorted(_statements.items())
+        metric("learning_ai_statement_executions_total", "counter", "Executions per normalized SQL statement.",
+               [(_labels(statement=sql), entry[0]) for sql, entry in statements])
+        metric("learning_ai_statement_seconds_total", "counter", "Seconds per normalized SQL statement (execute and fetch).",
+               [(_labels(statement=sql), round(entry[1], 6)) for sql, entry in statements])
+        metric("learning_ai_statement_rows_total", "counter", "Rows fetched per normalized SQL statement.",
+               [(_labels(statement=sql), entry[2]) for sql, entry in statements])
+
+    pool = db.get_stats()
+    metric("learning_ai_db_connects_total", "counter", "SQLite connections opened.", [("", pool["connects"])])
+    metric("learning_ai_db_reuses_total", "counter", "Pooled SQLite connection reuses.", [("", pool["reuses"])])
+    metric("learning_ai_db_lock_waits_total", "counter", "Write transactions that waited for the lock.",
+           [("", pool["lock_waits"])])
+    metric("learning_ai_db_lock_wait_seconds_total", "counter", "Seconds waited for the write lock.",
+           [("", round(pool["lock_wait_seconds"], 6))])
+    metric("learning_ai_db_catalog_attaches_total", "counter",
+           "Catalog file attachments (one per new connection, plus one per connection after a swap).",
+           [("", pool["catalog_attaches"])])
+    hashing = passwords.get_stats()
+    metric("learning_ai_password_jobs_total", "counter", "Password hash/verify jobs run on the pool.",
+           [("", hashing["jobs"])])
+    metric("learning_ai_password_rejected_total", "counter", "Password jobs refused because the pool was saturated.",
+           [("", hashing["rejected"])])
+    metric("learning_ai_password_rehashed_total", "counter", "Outdated password hashes upgraded at login.",
+           [("", hashing["rehashed"])])
+    metric("learning_ai_password_queue_seconds_total", "counter", "Seconds password jobs waited for a slot and a worker.",
+           [("", round(hashing["queue_seconds"], 6))])
+    metric("learning_ai_password_hash_seconds_total", "counter", "Seconds spent hashing in pool workers.",
+           [("", round(hashing["hash_seconds"], 6))])
+    job_stats = sorted(jobs.get_stats().items())
+    metric("learning_ai_job_runs_total", "counter", "Background job runs in this process.",
+           [(_labels(job=name), entry["runs"]) for name, entry in job_stats])
+    metric("learning_ai_job_failures_total", "counter", "Background job runs that raised.",
+           [(_labels(job=name), entry["failures"]) for name, entry in job_stats])
+    metric("learning_ai_job_seconds_total", "counter", "Seconds spent running background jobs.",
+           [(_labels(job=name), round(entry["seconds"], 6)) for name, entry in job_stats])
+    fragment_cache = getattr(current_app.jinja_env, "fragment_cache", None)
+    if fragment_cache is not None:
+        cached = fragment_cache.get_stats()
+        metric("learning_ai_fragment_cache_hits_total", "counter", "Template fragments served from the cache.",
+               [("", cached["hits"])])
+        metric("learning_ai_fragment_cache_misses_total", "counter", "Template fragments rendered and cached.",
+               [("", cached["misses"])])
+        metric("learning_ai_fragment_cache_evictions_total", "counter", "Fragments evicted to stay within the byte limit.",
+               [("", cached["evictions"])])
+        metric("learning_ai_fragment_cache_bytes", "gauge", "UTF-8 bytes of cached fragments.", [("", cached["bytes"])])
+    served = assets.get_stats()
+    metric("learning_ai_asset_requests_total", "counter", "Fingerprinted static assets served, by Content-Encoding.",
+           [(_labels(encoding=enc), served[enc]) for enc in ("br", "gzip", "identity")])
+    metric("learning_ai_asset_bytes_total", "counter", "Bytes of fingerprinted static assets sent.",
+           [("", served["bytes_sent"])])
+    interface = current_app.session_interface
+    if hasattr(interface, "get_stats"):
+        stored = interface.get_stats()
+        metric("learning_ai_session_cache_hits_total", "counter", "Sessions served from the in-process cache.",
+               [("", stored["cache_hits"])])
+        metric("learning_ai_session_cache_misses_total", "counter", "Sessions read from the sessions table.",
+               [("", stored["cache_misses"])])
+        metric("learning_ai_session_writes_total", "counter", "Sessions stored (created or modified).",
+               [("", stored["writes"])])
+        metric("learning_ai_session_purged_total", "counter", "Expired sessions deleted.", [("", stored["purged"])])
+        metric("learning_ai_sessions_cached", "gauge", "Sessions in the in-process cache.", [("", stored["cached"])])
+    return "\n".join(lines) + "\n"
+
+def metrics_view():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+def install(app):
+    """Hook instrumentation into `app` if LEARNING_AI_METRICS is set. Returns whether it did."""
+    if not ENABLED:
+        return False
+    db.CONNECTION_FACTORY = InstrumentedConnection
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
+    return True
@@ -0,0 +1,342 @@
+# jobs.py
+
+"""Background jobs for LearningAI, scheduled through the `jobs` table.
+No broker: each web process (or a sidecar, ``python jobs.py serve``) runs a
+scheduler thread that polls the table every JOBS_POLL_SECONDS and runs due
+jobs on a small thread pool.
+
+A job is claimed by taking its lease with a conditional UPDATE, so however
+many gunicorn workers poll, each run happens once. A lease lasts for the
+job's timeout; if its process dies mid-run the lease lapses and another
+worker picks the job up. Failed runs are retried with exponential backoff
+up to `retries` times before the job waits for its next regular run.
+
+Jobs with ``per_process=True`` (cache warming) are the exception: they act
+on in-memory state, so every process runs them on its own schedule and they
+take no lease.
+
+    python jobs.py list                 # schedule and last outcome of every job
+    python jobs.py run cf_index         # run a job now, in this process
+    python jobs.py request vacuum       # ask the schedulers to run it soon
+    python jobs.py serve                # run the scheduler in the foreground
+
+Set LEARNING_AI_JOBS=0 on the web processes when a sidecar runs the jobs.
+"""
+
+import argparse
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import catalog
+import db
+
+ENABLED = os.environ.get("LEARNING_AI_JOBS", "1") not in ("", "0")
+POLL_SECONDS = float(os.environ.get("JOBS_POLL_SECONDS", "5"))
+WORKERS = int(os.environ.get("JOBS_WORKERS", "2"))
+RETRY_DELAY = 30                    # seconds before the first retry; doubles per attempt
+WARM_GROUPS = 500                   # (branch, semester) groups warmed, most students first
+
+class Job:
+
+    def __init__(self, name, fn, every=None, timeout=600, retries=2, per_process=False, run_at_start=False):
+        self.name = name
+        self.fn = fn
+        self.every = every              # seconds between runs; None = only when requested
+        self.timeout = timeout          # lease length, i.e. how long before a run counts as lost
+        self.retries = retries
+        self.per_process = per_process
+        self.run_at_start = run_at_start
+
+JOBS = {}
+
+def job(name, **options):
+    """Register the decorated function as a job (see Job for the options)."""
+    def register(fn):
+        JOBS[name] = Job(name, fn, **options)
+        return fn
+    return register
+
+_stats_lock = threading.Lock()
+_stats = {}         # job name -> {"runs", "failures", "seconds"} in this process
+
+def _record(name, seconds, ok):
+    with _stats_lock:
+        entry = _stats.setdefault(name, {"runs": 0, "failures": 0, "seconds": 0.0})
+        entry["runs"] += 1
+        entry["failures"] += 0 if ok else 1
+        entry["seconds"] += seconds
+
+def get_stats():
+    """Return {job name: {"runs", "failures", "seconds"}} for jobs run by this process."""
+    with _stats_lock:
+        return {name: dict(entry) for name, entry in _stats.items()}
+
+# ---------- Jobs ----------
+
+@job("recommendation_snapshots", every=600, run_at_start=True)
+def refresh_recommendation_snapshots():
+    """Rebuild rule recommendations of users who took quizzes since the last run."""
+    from recommender import refresh_snapshots
+    conn = db.get_connection()
+    after = int(db.get_meta(conn, "snapshot_last_quiz_id") or 0)
+    users, last_quiz_id = refresh_snapshots(after)
+    with db.transaction() as conn:
+        db.set_meta(conn, "snapshot_last_quiz_id", str(last_quiz_id))
+    return f"{users} users"
+
+_warmed_version = None
+
+@job("warm_caches", every=30, per_process=True, run_at_start=True)
+def warm_caches():
+    """Load the catalog, prerequisite graphs and CF index into this process
+    whenever the catalog version changes (e.g. after init_db reseeds)."""
+    global _warmed_version
+    import cf
+    import planner
+    version = catalog.get_version()[0]
+    if version == _warmed_version:
+        return "up to date"
+    groups = db.get_connection().execute(
+        "SELECT branch, semester FROM users GROUP BY branch, semester ORDER BY COUNT(*) DESC LIMIT ?",
+        (WARM_GROUPS,)
+    ).fetchall()
+    for branch, semester in groups:
+        catalog.get_semester(branch, semester)
+    for branch in {branch for branch, _ in groups}:
+        planner.get_graph(branch)
+    cf.neighbors_of(0)
+    _warmed_version = version
+    return f"{len(groups)} groups"
+
+@job("cf_index", every=24 * 3600)
+def rebuild_cf_index():
+    """Recompute the collaborative-filtering neighbour table."""
+    import cf
+    return f"{cf.rebuild_index()} subjects"
+
+@job("analyze", every=24 * 3600)
+def analyze():
+    """Refresh the query planner's statistics and checkpoint the WAL."""
+    conn = db.get_connection()
+    conn.execute("PRAGMA analysis_limit = 1000")     # sample each index instead of reading it all
+    # main only: the attached catalog is read-only and analyzed when it is built
+    conn.execute("ANALYZE main")
+    conn.execute("PRAGMA main.optimize")
+    _, log, checkpointed = conn.execute("PRAGMA main.wal_checkpoint(PASSIVE)").fetchone()
+    return f"checkpointed {checkpointed}/{log} WAL pages"
+
+@job("vacuum", timeout=3600, retries=0)
+def vacuum():
+    """Rewrite the database file (blocks writers while it runs; request it off-peak)."""
+    conn = db.get_connection()
+    before = os.path.getsize(db.DB_PATH)
+    conn.execute("VACUUM")
+    return f"{before} -> {os.path.getsize(db.DB_PATH)} bytes"
+
+# ---------- Scheduling ----------
+
+def register_all(conn):
+    """Add a row for every job not in the table yet."""
+    now = time.time()
+    for j in JOBS.values():
+        if j.per_process:
+            continue
+        first = now if j.run_at_start else (now + j.every if j.every else None)
+        conn.execute("INSERT INTO jobs (name, next_run_at) VALUES (?, ?) ON CONFLICT(name) DO NOTHING",
+                     (j.name, first))
+
+def request(name):
+    """Ask the schedulers to run job `name` at their next poll."""
+    if name not in JOBS:
+        raise KeyError(f"unknown job {name!r}")
+    with db.transaction() as conn:
+        register_all(conn)
+        conn.execute("UPDATE jobs SET next_run_at = ? WHERE name = ?", (time.time(), name))
+
+def _claim(j, owner, now, due_only=True):
+    """Take the lease of job `j` (only if it is due, with `due_only`).
+    Returns whether `owner` got it."""
+    with db.transaction() as conn:
+        return conn.execute(
+            "UPDATE jobs SET lease_owner = ?, lease_until = ?, last_started_at = ? "
+            "WHERE name = ? AND (lease_until IS NULL OR lease_until < ?)"
+            + (" AND next_run_at <= ?" if due_only else ""),
+            (owner, now + j.timeout, now, j.name, now) + ((now,) if due_only else ())
+        ).rowcount == 1
+
+def _finish(j, owner, seconds, error):
+    now = time.time()
+    with db.transaction() as conn:
+        attempts = conn.execute("SELECT attempts FROM jobs WHERE name = ?", (j.name,)).fetchone()[0]
+        if error is None:
+            attempts, next_run = 0, (now + j.every if j.every else None)
+        elif attempts < j.retries:
+            attempts += 1
+            next_run = now + RETRY_DELAY * 2 ** (attempts - 1)
+        else:
+            attempts, next_run = 0, (now + j.every if j.every else None)
+        conn.execute(
+            "UPDATE jobs SET next_run_at = ?, lease_owner = NULL, lease_until = NULL, attempts = ?, "
+            "runs = runs + 1, failures = failures + ?, last_finished_at = ?, last_seconds = ?, "
+            "last_status = ?, last_error = ? WHERE name = ? AND lease_owner IS ?",
+            (next_run, attempts, 0 if error is None else 1, now, seconds,
+             "ok" if error is None else "error", error, j.name, owner)
+        )
+
+def run(name, owner=None):
+    """Run job `name` now in this thread and record the outcome. Returns its
+    summary. `owner` is the holder of the job's lease (taken here if None),
+    released afterwards. Returns None without running if another process
+    holds the lease.
+    """
+    j = JOBS[name]
+    if owner is None and not j.per_process:
+        owner = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        with db.transaction() as conn:
+            register_all(conn)
+        if not _claim(j, owner, time.time(), due_only=False):
+            print(f"Job {name} is already running elsewhere")
+            return None
+    started = time.time()
+    error = summary = None
+    try:
+        summary = j.fn()
+    except Exception:
+        error = traceback.format_exc(limit=5)
+    seconds = time.time() - started
+    _record(name, seconds, error is None)
+    status = f"failed:\n{error}" if error else f"ok ({summary})"
+    print(f"Job {name} {status} in {seconds:.2f}s")
+    if not j.per_process:
+        _finish(j, owner, seconds, error)
+    return summary
+
+class Scheduler:
+    """Polls the jobs table and runs due jobs on a thread pool."""
+
+    def __init__(self, workers=WORKERS, poll_seconds=POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="job")
+        self._running = set()
+        self._local_next = {}       # per-process job name -> next run (unix time)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        with db.transaction() as conn:
+            register_all(conn)
+        now = time.time()
+        for j in JOBS.values():
+            if j.per_process:
+                self._local_next[j.name] = now if j.run_at_start else now + j.every
+        self._thread = threading.Thread(target=self._loop, name="job-scheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, name, owner):
+        self._running.add(name)
+
+        def task():
+            try:
+                run(name, owner)
+            finally:
+                self._running.discard(name)
+                db.release()
+        self._pool.submit(task)
+
+    def tick(self):
+        now = time.time()
+        for name, due in self._local_next.items():
+            if due <= now and name not in self._running:
+                self._local_next[name] = now + JOBS[name].every
+                self._submit(name, None)
+        due = db.get_connection().execute(
+            "SELECT name FROM jobs WHERE next_run_at <= ? AND (lease_until IS NULL OR lease_until < ?)",
+            (now, now)
+        ).fetchall()
+        for (name,) in due:
+            j = JOBS.get(name)
+            if j is None or name in self._running:
+                continue  # a job from another version of the code, or still running here
+            if _claim(j, self.owner, now):
+                self._submit(name, self.owner)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception:
+                traceback.print_exc()
+            finally:
+                db.release()
+            self._stop.wait(self.poll_seconds)
+
+_scheduler = None
+_scheduler_pid = None
+_scheduler_lock = threading.Lock()
+
+def ensure_started():
+    """Start this process's scheduler if it is not running (after fork, too)."""
+    global _scheduler, _scheduler_pid
+    if _scheduler_pid == os.getpid():
+        return _scheduler
+    with _scheduler_lock:
+        if _scheduler_pid != os.getpid():
+            _scheduler = Scheduler().start()
+            _scheduler_pid = os.getpid()
+    return _scheduler
+
+def install(app):
+    """Start the scheduler with the first request, unless LEARNING_AI_JOBS=0.
+    Starting lazily keeps the thread out of a gunicorn --preload master."""
+    if not ENABLED:
+        return False
+
+    @app.before_request
+    def start_jobs():
+        ensure_started()
+    return True
+
+def list_jobs():
+    """Return every job row as a dict."""
+    with db.transaction() as conn:
+        register_all(conn)
+    return [dict(row) for row in db.get_connection().execute("SELECT * FROM jobs ORDER BY name")]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["list", "run", "request", "serve"])
+    parser.add_argument("name", nargs="?", choices=sorted(JOBS))
+    args = parser.parse_args()
+    if args.command in ("run", "request") and args.name is None:
+        parser.error(f"{args.command} needs a job name")
+    from db_init import init_db
+    init_db()
+    if args.command == "list":
+        for row in list_jobs():
+            when = (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(row["next_run_at"]))
+                    if row["next_run_at"] else "on request")
+            print(f"{row['name']:26} next {when:19}  runs {row['runs']:5}  failures {row['failures']:4}  "
+                  f"last {row['last_status'] or '-'} {row['last_seconds'] or 0:.2f}s")
+    elif args.command == "run":
+        run(args.name)
+    elif args.command == "request":
+        request(args.name)
+        print(f"Requested {args.name}")
+    else:
+        Scheduler().start()
+        print("Job scheduler running; Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,136 @@
+# passwords.py
+
+"""Password hashing for LearningAI on a bounded process pool.
+Hashes are deliberately slow, so hashing them inline lets a burst of logins
+occupy every request thread. Hashing runs on PASSWORD_WORKERS processes
+instead, with at most PASSWORD_MAX_PENDING jobs in flight per web process.
+A request that cannot get a slot within PASSWORD_QUEUE_TIMEOUT seconds gets
+Busy, and the caller answers 503.
+
+verify_password() also upgrades hashes made with older parameters than
+PASSWORD_METHOD. It does this in the same pool job, so a login needs no
+extra round trip.
+
+Workers are started with "spawn" (safe in threaded servers), which imports
+the parent's __main__ in each worker: scripts must guard their entry point
+with ``if __name__ == "__main__"``. This module is imported by the workers
+too; keep its imports light.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+PASSWORD_METHOD = os.environ.get("PASSWORD_METHOD", "scrypt:32768:8:1")
+WORKERS = int(os.environ.get("PASSWORD_WORKERS", str(min(2, os.cpu_count() or 1))))  # 0 = hash inline
+MAX_PENDING = int(os.environ.get("PASSWORD_MAX_PENDING", str(max(1, WORKERS) * 4)))
+QUEUE_TIMEOUT = float(os.environ.get("PASSWORD_QUEUE_TIMEOUT", "2"))
+
+class Busy(Exception):
+    """Raised when every hashing slot stayed taken for QUEUE_TIMEOUT seconds."""
+
+_slots = threading.BoundedSemaphore(MAX_PENDING)
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {
+    "jobs": 0,
+    "rejected": 0,
+    "rehashed": 0,
+    "queue_seconds": 0.0,
+    "max_queue_seconds": 0.0,
+    "hash_seconds": 0.0,
+}
+
+# ---------- Worker side ----------
+
+def needs_rehash(pw_hash):
+    """True if `pw_hash` was made with parameters other than PASSWORD_METHOD."""
+    return pw_hash.split("$", 1)[0] != PASSWORD_METHOD
+
+def _timed(fn, *args):
+    started = time.time()
+    result = fn(*args)
+    return result, started, time.time()
+
+def _hash(password):
+    return generate_password_hash(password, method=PASSWORD_METHOD)
+
+def _verify(pw_hash, password):
+    """Return (matches, upgraded hash or None)."""
+    if not check_password_hash(pw_hash, password):
+        return False, None
+    return True, _hash(password) if needs_rehash(pw_hash) else None
+
+# ---------- Web process side ----------
+
+def _get_pool():
+    global _pool, _pool_pid
+    with _pool_lock:
+        # A pool inherited across fork() (gunicorn preload) is not usable
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            _pool_pid = os.getpid()
+        return _pool
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def _run(fn, *args):
+    submitted = time.time()
+    if not _slots.acquire(timeout=QUEUE_TIMEOUT):
+        with _stats_lock:
+            _stats["rejected"] += 1
+        raise Busy("password hashing is saturated")
+    try:
+        if WORKERS:
+            try:
+                result, started, finished = _get_pool().submit(_timed, fn, *args).result()
+            except BrokenProcessPool:
+                _reset_pool()   # a worker died (e.g. OOM-killed); retry once on a fresh pool
+                result, started, finished = _get_pool().submit(_timed, fn, *args).result()
+        else:
+            result, started, finished = _timed(fn, *args)
+    finally:
+        _slots.release()
+    queued = max(0.0, started - submitted)
+    with _stats_lock:
+        _stats["jobs"] += 1
+        _stats["queue_seconds"] += queued
+        _stats["max_queue_seconds"] = max(_stats["max_queue_seconds"], queued)
+        _stats["hash_seconds"] += finished - started
+    return result
+
+def hash_password(password):
+    """Hash a new password with PASSWORD_METHOD. May raise Busy."""
+    return _run(_hash, password)
+
+def verify_password(pw_hash, password):
+    """Check `password` against `pw_hash`. Returns (matches, new_hash), where
+    new_hash is an upgraded hash to store, or None. May raise Busy.
+    """
+    matches, new_hash = _run(_verify, pw_hash, password)
+    if new_hash:
+        with _stats_lock:
+            _stats["rehashed"] += 1
+    return matches, new_hash
+
+def get_stats():
+    """Return a snapshot of the hashing counters for this process."""
+    with _stats_lock:
+        return dict(_stats)
+
+def shutdown():
+    """Stop the worker processes (they are restarted on the next job)."""
+    if _pool_pid == os.getpid():
+        _reset_pool()
@@ -0,0 +1,244 @@
+# planner.py
+
+"""Prerequisite-aware learning paths for LearningAI.
+Subjects are linked by the `prerequisites` table (subject_id requires
+requires_id, both in the same branch). Each branch's graph is compiled once
+per catalog version: its subjects are numbered in topological order
+(earlier semesters first), and every subject gets the set of its transitive
+prerequisites and dependents as int bitsets over those numbers.
+
+A remediation path is then a few ORs over the bitsets of a user's weak
+subjects. Reading the set bits from lowest to highest already gives a valid
+study order, so in the common case no graph is walked at request time.
+"""
+
+import heapq
+import re
+import threading
+
+import catalog
+from db import get_connection
+
+# Subject name -> names of the subjects it builds on, resolved within each
+# branch by db_init._load_prerequisites() when data/prerequisites.json is absent
+DEFAULT_PREREQUISITES = {
+    "Engineering Physics": ["Engineering Mathematics-I"],
+    # Computer Science Engineering
+    "Data Structures": ["Programming Fundamentals"],
+    "Algorithms": ["Data Structures", "Engineering Mathematics-I"],
+    "Operating Systems": ["Data Structures"],
+    "DBMS": ["Data Structures"],
+    "Computer Networks": ["Operating Systems"],
+    "Software Engineering": ["Programming Fundamentals"],
+    "Web Technologies": ["Programming Fundamentals"],
+    "AI Basics": ["Algorithms"],
+    "Cloud Computing": ["Operating Systems", "Computer Networks"],
+    "Machine Learning": ["AI Basics", "Engineering Mathematics-I"],
+    "Compiler Design": ["Algorithms"],
+    # Information Technology
+    "Networking": ["IT Fundamentals"],
+    "Database Systems": ["IT Fundamentals"],
+    "Web Programming": ["IT Fundamentals"],
+    "Scripting Languages": ["IT Fundamentals"],
+    "Cyber Security Basics": ["Networking"],
+    "E-Commerce": ["Web Programming", "Database Systems"],
+    "Mobile Computing": ["Networking"],
+    "Data Mining": ["Database Systems"],
+    "Cloud Architecture": ["Networking"],
+    # Mechanical Engineering
+    "Engineering Mechanics": ["Engineering Mathematics-I", "Engineering Physics"],
+    "Thermodynamics": ["Engineering Physics"],
+    "Fluid Mechanics": ["Thermodynamics", "Engineering Mechanics"],
+    "Strength of Materials": ["Engineering Mechanics"],
+    "Machine Design": ["Strength of Materials"],
+    "Manufacturing Processes": ["Engineering Graphics"],
+    "Heat Transfer": ["Thermodynamics", "Fluid Mechanics"],
+    "Robotics": ["Engineering Mechanics"],
+    "CAD/CAM": ["Engineering Graphics", "Machine Design"],
+}
+
+_CORE_SUBJECT = re.compile(r"(.+) Core (\d+)")
+
+def default_requirements(name):
+    """Names of the subjects `name` requires under the built-in rules. The
+    generated "<Branch> Core N" subjects form a chain starting from maths."""
+    if name in DEFAULT_PREREQUISITES:
+        return DEFAULT_PREREQUISITES[name]
+    match = _CORE_SUBJECT.fullmatch(name)
+    if match:
+        number = int(match[2])
+        return [f"{match[1]} Core {number - 1}"] if number > 1 else ["Engineering Mathematics-I"]
+    return []
+
+def topological_order(nodes, edges):
+    """Order `nodes` so every subject comes after the subjects it requires.
+
+    `nodes` is [(sort_key, subject_id)]; among subjects that are ready at the
+    same time the smallest key goes first. `edges` is [(subject_id, requires_id)].
+    Raises ValueError if the edges contain a cycle.
+    """
+    key_of = {node: key for key, node in nodes}
+    dependents = {node: [] for node in key_of}
+    waiting = dict.fromkeys(key_of, 0)
+    for node, required in edges:
+        dependents[required].append(node)
+        waiting[node] += 1
+    ready = [(key_of[node], node) for node, count in waiting.items() if count == 0]
+    heapq.heapify(ready)
+    order = []
+    while ready:
+        _, node = heapq.heappop(ready)
+        order.append(node)
+        for dependent in dependents[node]:
+            waiting[dependent] -= 1
+            if waiting[dependent] == 0:
+                heapq.heappush(ready, (key_of[dependent], dependent))
+    if len(order) != len(key_of):
+        stuck = sorted(node for node, count in waiting.items() if count)
+        raise ValueError(f"prerequisite cycle among subjects {stuck}")
+    return order
+
+# ---------- Compiled graphs ----------
+
+class BranchGraph:
+    """One branch's subjects in topological order, with bitset closures.
+    Bit i of a set stands for the subject at position i of `ids`.
+    """
+
+    __slots__ = ("ids", "names", "semesters", "position", "direct", "ancestors", "descendants")
+
+    def __init__(self, subjects, edges):
+        order = topological_order([((sem, sid), sid) for sid, sem, _ in subjects], edges)
+        info = {sid: (sem, name) for sid, sem, name in subjects}
+        self.ids = order
+        self.names = [info[sid][1] for sid in order]
+        self.semesters = [info[sid][0] for sid in order]
+        self.position = {sid: i for i, sid in enumerate(order)}
+        self.direct = direct = [0] * len(order)
+        for sid, required in edges:
+            direct[self.position[sid]] |= 1 << self.position[required]
+        # Prerequisites precede their dependents, so one pass each way closes the sets
+        self.ancestors = [0] * len(order)
+        for i, bits in enumerate(direct):
+            closure = bits
+            while bits:
+                low = bits & -bits
+                closure |= self.ancestors[low.bit_length() - 1]
+                bits ^= low
+            self.ancestors[i] = closure
+        self.descendants = [0] * len(order)
+        for i in range(len(order)):
+            bits = self.ancestors[i]
+            while bits:
+                low = bits & -bits
+                self.descendants[low.bit_length() - 1] |= 1 << i
+                bits ^= low
+
+    def requires(self, subject_id):
+        """Ids of every subject `subject_id` transitively builds on, in study order."""
+        return [self.ids[i] for i in _bits(self.ancestors[self.position[subject_id]])]
+
+def _bits(mask):
+    """Positions of the set bits of `mask`, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+_lock = threading.Lock()
+_version = None
+_graphs = {}        # branch -> BranchGraph
+_stats = {"hits": 0, "compiles": 0}
+
+SUBJECTS_SQL = "SELECT id, semester, name FROM subjects WHERE branch = ?"
+EDGES_SQL = (
+    "SELECT p.subject_id, p.requires_id FROM subjects s "
+    "JOIN prerequisites p ON p.subject_id = s.id WHERE s.branch = ?"
+)
+
+def _compile(branch):
+    conn = get_connection()
+    subjects = conn.execute(SUBJECTS_SQL, (branch,)).fetchall()
+    edges = conn.execute(EDGES_SQL, (branch,)).fetchall()
+    ids = {row[0] for row in subjects}
+    return BranchGraph([tuple(row) for row in subjects],
+                       [tuple(edge) for edge in edges if edge[1] in ids])
+
+def get_graph(branch):
+    """Return the compiled BranchGraph of `branch` (shared; read-only)."""
+    global _version
+    version = catalog.get_version()[0]
+    with _lock:
+        if version != _version:
+            _graphs.clear()
+            _version = version
+        graph = _graphs.get(branch)
+        if graph is not None:
+            _stats["hits"] += 1
+            return graph
+    graph = _compile(branch)
+    with _lock:
+        _stats["compiles"] += 1
+        if version == _version:
+            _graphs[branch] = graph
+    return graph
+
+def get_stats():
+    with _lock:
+        return dict(_stats, branches=len(_graphs))
+
+# ---------- Planning ----------
+
+def plan(branch, mastery):
+    """Return the remediation path for a student of `branch`.
+
+    `mastery` maps subject_id -> (score, level). The path holds every weak
+    subject plus the subjects they build on, stopping at subjects the
+    student is already strong in, in study order, as dicts with subject_id, name,
+    semester, score, level (None if never attempted) and needed_for (the
+    names of the weak subjects that depend on it).
+    """
+    graph = get_graph(branch)
+    weak = strong = 0
+    for subject_id, (_, level) in mastery.items():
+        i = graph.position.get(subject_id)
+        if i is None:
+            continue
+        if level == "weak":
+            weak |= 1 << i
+        elif level == "strong":
+            strong |= 1 << i
+    needed = weak
+    for i in _bits(weak):
+        needed |= graph.ancestors[i]
+    if needed & strong:
+        # A strong subject vouches for what it builds on: keep only what is
+        # reachable from the weak subjects without passing through one
+        needed = frontier = weak
+        while frontier:
+            low = frontier & -frontier
+            frontier ^= low
+            new = graph.direct[low.bit_length() - 1] & ~strong & ~needed
+            needed |= new
+            frontier |= new
+
+    path = []
+    for i in _bits(needed):
+        subject_id = graph.ids[i]
+        score, level = mastery.get(subject_id, (None, None))
+        path.append({
+            "subject_id": subject_id,
+            "name": graph.names[i],
+            "semester": graph.semesters[i],
+            "score": score,
+            "level": level,
+            "needed_for": [graph.names[j] for j in _bits(graph.descendants[i] & weak)],
+        })
+    return path
+
+MASTERY_SQL = "SELECT subject_id, latest_score, level FROM mastery WHERE user_id = ?"
+
+def get_learning_path(user_id, branch):
+    """plan() for a user, from their mastery summary."""
+    rows = get_connection().execute(MASTERY_SQL, (user_id,))
+    return plan(branch, {row[0]: (row[1], row[2]) for row in rows})
@@ -0,0 +1,179 @@
+# quiz_writer.py
+
+"""Quiz submission writes for LearningAI, with optional group commit.
+
+QUIZ_WRITE_MODE selects how quiz() stores a graded attempt:
+
+* ``sync``  (default) one transaction and commit per submission.
+* ``group`` the submission is queued, a single writer thread commits
+  everything that queued up while its previous commit ran (at most
+  QUIZ_WRITE_BATCH rows) in one transaction, and the request waits for that
+  commit. Acknowledged means committed. A submission the writer has not
+  picked up within ACK_TIMEOUT seconds is withdrawn and written synchronously.
+* ``async`` the submission is queued and the request returns at once.
+  Acknowledged means queued: anything still queued is lost if the process
+  is killed, but it is flushed on normal shutdown. The redirect to the
+  dashboard may show the previous score for a few milliseconds.
+
+If the queue is full, the submission is written synchronously instead.
+"""
+
+import atexit
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+import db
+from recommender import record_quiz_attempt
+
+WRITE_MODES = ("sync", "group", "async")
+WRITE_MODE = os.environ.get("QUIZ_WRITE_MODE", "sync")
+MAX_BATCH = int(os.environ.get("QUIZ_WRITE_BATCH", "200"))
+QUEUE_SIZE = 10000
+ACK_TIMEOUT = 10        # seconds a "group" request waits for its commit
+
+_STOP = object()
+
+def write_attempts(conn, attempts):
+    """Insert (user_id, subject_id, score) attempts and fold them into the
+    mastery summary. Call inside a transaction. Returns the new quiz ids.
+    """
+    quiz_ids = []
+    for user_id, subject_id, score in attempts:
+        cur = conn.execute(
+            "INSERT INTO quizzes (user_id, subject_id, score) VALUES (?,?,?)",
+            (user_id, subject_id, score)
+        )
+        record_quiz_attempt(conn, user_id, subject_id, score, cur.lastrowid)
+        quiz_ids.append(cur.lastrowid)
+    return quiz_ids
+
+class GroupCommitWriter:
+    """A bounded queue drained by one writer thread in batched transactions."""
+
+    def __init__(self, max_batch=MAX_BATCH, queue_size=QUEUE_SIZE):
+        self.max_batch = max_batch
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"submitted": 0, "batches": 0, "rows": 0, "fallbacks": 0, "timeouts": 0, "errors": 0}
+
+    def bump(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        return stats
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="quiz-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, user_id, subject_id, score):
+        """Queue one attempt. Returns a Future resolved with its quiz id once committed.
+        Raises queue.Full if the writer is saturated.
+        """
+        self.start()
+        future = Future()
+        self._queue.put_nowait(((user_id, subject_id, score), future))
+        self.bump("submitted")
+        return future
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far is committed."""
+        self.start()
+        barrier = Future()
+        self._queue.put((None, barrier))
+        barrier.result(timeout)
+
+    def stop(self, timeout=None):
+        """Commit everything still queued and stop the writer thread."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put((_STOP, None))
+        self._thread.join(timeout)
+
+    def _collect(self):
+        # Block for the first item, then take whatever else is already queued
+        # and commit straight away: batches grow by themselves while a commit
+        # is in flight, and a lone submission never waits on a timer
+        first = self._queue.get()
+        batch = [first]
+        while len(batch) < self.max_batch and batch[-1][0] is not _STOP:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _commit(self, attempts):
+        try:
+            with db.transaction() as conn:
+                quiz_ids = write_attempts(conn, [attempt for attempt, _ in attempts])
+        except Exception:
+            # Retry one by one so a single bad row doesn't fail its neighbours
+            for attempt, future in attempts:
+                try:
+                    with db.transaction() as conn:
+                        future.set_result(write_attempts(conn, [attempt])[0])
+                except Exception as exc:
+                    self.bump("errors")
+                    print(f"quiz-writer: could not store attempt {attempt}: {exc}")
+                    future.set_exception(exc)
+            return
+        self.bump("batches")
+        self.bump("rows", len(attempts))
+        for (_, future), quiz_id in zip(attempts, quiz_ids):
+            future.set_result(quiz_id)
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Skips attempts whose request gave up waiting (see store_attempt)
+            attempts = [(attempt, future) for attempt, future in batch
+                        if attempt is not None and attempt is not _STOP
+                        and future.set_running_or_notify_cancel()]
+            if attempts:
+                self._commit(attempts)
+            for attempt, future in batch:
+                if attempt is None:
+                    future.set_result(None)     # flush barrier
+            if any(attempt is _STOP for attempt, _ in batch):
+                return
+
+_writer = GroupCommitWriter()
+atexit.register(_writer.stop)
+
+def get_writer():
+    return _writer
+
+def store_attempt(user_id, subject_id, score, mode=None):
+    """Store one graded quiz attempt according to `mode` (default WRITE_MODE)."""
+    mode = mode or WRITE_MODE
+    if mode in ("group", "async"):
+        try:
+            future = _writer.submit(user_id, subject_id, score)
+        except queue.Full:
+            _writer.bump("fallbacks")
+        else:
+            if mode != "group":
+                return
+            try:
+                future.result(ACK_TIMEOUT)
+                return
+            except TimeoutError:
+                _writer.bump("timeouts")
+                if not future.cancel():
+                    # The writer already took it: its commit is in flight
+                    future.result()
+                    return
+            # Withdrawn before the writer reached it: write it here instead
+    with db.transaction() as conn:
+        write_attempts(conn, [(user_id, subject_id, score)])
@@ -0,0 +1,99 @@
+# quizbank.py
+
+"""Question bank and grading engine for LearningAI quizzes.
+Each subject's questions and answer key are loaded from the `questions`
+table once and kept in memory, so rendering a quiz and grading a submission
+need no database reads. The cache is dropped when db_init bumps the
+`question_bank_version` value in the catalog's meta table.
+"""
+
+import json
+import random
+import threading
+import time
+
+from db import get_connection, get_meta
+
+QUIZ_LENGTH = 5                 # questions served per quiz
+QUESTION_BANK_RECHECK_SECONDS = 5
+
+# Questions every subject starts with; "{subject}" is replaced by its name.
+# `answer` is the index of the correct option.
+DEFAULT_QUESTIONS = [
+    {"prompt": "What is the fundamental concept of {subject}?",
+     "options": ["Random Theory", "Core Principle of {subject}", "Outdated Idea"], "answer": 1},
+    {"prompt": "Which of the following is a key application?",
+     "options": ["Real-world problem solving", "Abstract confusion", "None of the above"], "answer": 0},
+    {"prompt": "True or False: {subject} is essential for engineering?",
+     "options": ["True", "False"], "answer": 0},
+    {"prompt": "Advanced topic related to this subject:",
+     "options": ["Basic Addition", "Complex Systems Analysis", "Alphabet learning"], "answer": 1},
+    {"prompt": "Best resource for learning?",
+     "options": ["Textbooks & Practical Labs", "Social Media", "Guesswork"], "answer": 0},
+]
+
+_lock = threading.Lock()
+_version = None
+_checked_at = 0.0
+_sets = {}      # subject_id -> (questions tuple, {question_id: answer index})
+
+def _validate():
+    global _version, _checked_at
+    now = time.monotonic()
+    if now - _checked_at < QUESTION_BANK_RECHECK_SECONDS:
+        return
+    version = get_meta(get_connection(), "question_bank_version", "catalog")
+    with _lock:
+        _checked_at = now
+        if version != _version:
+            _version = version
+            _sets.clear()
+
+QUESTIONS_SQL = "SELECT id, prompt, options_json, answer FROM questions WHERE subject_id = ? ORDER BY position"
+
+def _load(subject_id):
+    rows = get_connection().execute(QUESTIONS_SQL, (subject_id,)).fetchall()
+    questions = tuple(
+        {"id": row["id"], "prompt": row["prompt"], "options": json.loads(row["options_json"])}
+        for row in rows
+    )
+    answers = {row["id"]: row["answer"] for row in rows}
+    return questions, answers
+
+def get_question_set(subject_id):
+    """Return (questions, answer_key) for a subject from the in-memory cache."""
+    _validate()
+    cached = _sets.get(subject_id)
+    if cached is None:
+        cached = _load(subject_id)
+        with _lock:
+            _sets[subject_id] = cached
+    return cached
+
+def sample_questions(subject_id, k=QUIZ_LENGTH):
+    """Pick up to `k` random questions for one quiz, in bank order."""
+    questions, _ = get_question_set(subject_id)
+    if len(questions) <= k:
+        return list(questions)
+    picked = sorted(random.sample(range(len(questions)), k))
+    return [questions[i] for i in picked]
+
+def grade(subject_id, served, form):
+    """Grade a submitted quiz form. Returns the score as a percentage.
+
+    `served` is the list of question ids the server handed out for this quiz
+    (app.py signs it into the form); the form carries the chosen option index
+    as `q<id>`. Unanswered questions count as wrong, and ids that no longer
+    belong to the subject are dropped. Returns None if none are left (the
+    bank was reseeded since the quiz was served): there is nothing to grade.
+    """
+    _, answers = get_question_set(subject_id)
+    served = list(dict.fromkeys(qid for qid in served if qid in answers))
+    if not served:
+        return None
+    correct = 0
+    for qid in served:
+        choice = form.get(f"q{qid}", "")
+        if choice.isdigit() and int(choice) == answers[qid]:
+            correct += 1
+    return int((correct / len(served)) * 100)
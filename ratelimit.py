@@ -0,0 +1,39 @@
+# ratelimit.py
+
+"""In-process token-bucket rate limiting for LearningAI.
+Each key (an IP address, an email) gets a bucket of `burst` tokens refilled
+at `rate` tokens per second; a request spends one token or is refused. The
+buckets live in memory, per web process, and the least recently used keys
+are dropped beyond `max_keys`, so the limit is per worker, not global.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+class TokenBucketLimiter:
+
+    def __init__(self, rate, burst, max_keys=100_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()    # key -> (tokens, last refill time)
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def acquire(self, key):
+        """Spend a token for `key`. Returns 0 if allowed, else seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                wait = 0.0
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+                self.rejected += 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
@@ -2,35 +2,44 @@
 """Simple rule‑based AI for LearningAI.
 It analyses a user's quiz scores, classifies each subject, and returns
 notes & video recommendations for weak subjects.
+
+Recommendations for any number of users come from two set-based queries:
+one over the per-subject mastery summary and one for the resources of every
+subject that turned out weak.
 """
 
-import sqlite3
 import json
-import os
 
-BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-DB_PATH = os.path.join(BASE_DIR, "learning_ai.db")
+import catalog
+import db
+from db import get_connection
 
 # Scoring thresholds
 WEAK_THRESHOLD = 40
 INTERMEDIATE_THRESHOLD = 70
 
-def _get_user_scores(user_id):
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT s.id AS subject_id, s.name AS subject_name, q.score
-        FROM quizzes q
-        JOIN subjects s ON q.subject_id = s.id
-        WHERE q.user_id = ?
-        """,
-        (user_id,)
-    )
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+# "rule": threshold rules below; "cf": collaborative filtering (cf.py)
+STRATEGIES = ("rule", "cf")
+
+SNAPSHOT_BATCH = 500    # users per refresh_snapshots() transaction
+
+USER_SCORES_SQL = """
+    SELECT m.user_id, s.id AS subject_id, s.name AS subject_name, m.latest_score, m.level
+    FROM mastery m
+    JOIN subjects s ON m.subject_id = s.id
+    WHERE m.user_id IN (SELECT value FROM json_each(?))
+    ORDER BY m.last_quiz_id
+"""
+
+def _get_scores_for_users(user_ids):
+    """Return {user_id: {subject_name: (subject_id, score, level)}} from the mastery summary."""
+    scores = {user_id: {} for user_id in user_ids}
+    rows = get_connection().execute(USER_SCORES_SQL, (json.dumps(list(scores)),))
+    for row in rows:
+        scores[row["user_id"]][row["subject_name"]] = (
+            row["subject_id"], row["latest_score"], row["level"]
+        )
+    return scores
 
 def _classify_score(score):
     if score < WEAK_THRESHOLD:
@@ -40,23 +49,148 @@ def _classify_score(score):
     else:
         return "strong"
 
-def _fetch_resources_for_subject(subject_id):
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT note_url, video_url FROM resources WHERE subject_id = ?",
-        (subject_id,)
+# ---------- Mastery summary ----------
+# One row per (user, subject) with the latest and best score, attempt count
+# and level, kept in step with `quizzes` by record_quiz_attempt().
+
+def record_quiz_attempt(conn, user_id, subject_id, score, quiz_id):
+    """Fold one new quiz row into the mastery summary.
+    Call inside the same transaction that inserted the quiz row.
+    """
+    conn.execute(
+        """
+        INSERT INTO mastery (user_id, subject_id, latest_score, best_score, attempts, level, last_quiz_id)
+        VALUES (?, ?, ?, ?, 1, ?, ?)
+        ON CONFLICT(user_id, subject_id) DO UPDATE SET
+            latest_score = excluded.latest_score,
+            best_score = MAX(best_score, excluded.best_score),
+            attempts = attempts + 1,
+            level = excluded.level,
+            last_quiz_id = excluded.last_quiz_id
+        """,
+        (user_id, subject_id, score, score, _classify_score(score), quiz_id)
     )
-    rows = cur.fetchall()
-    conn.close()
-    # Return lists of notes and videos
-    notes = [r["note_url"] for r in rows]
-    videos = [r["video_url"] for r in rows]
-    return notes, videos
-
-def get_recommendations(user_id):
+
+def rebuild_mastery(conn):
+    """Regenerate the whole mastery summary from raw quiz rows. Returns the row count."""
+    conn.execute("DELETE FROM mastery")
+    cur = conn.execute(
+        """
+        INSERT INTO mastery (user_id, subject_id, latest_score, best_score, attempts, level, last_quiz_id)
+        SELECT agg.user_id, agg.subject_id, q.score, agg.best_score, agg.attempts,
+               CASE WHEN q.score < ? THEN 'weak'
+                    WHEN q.score <= ? THEN 'intermediate'
+                    ELSE 'strong' END,
+               agg.last_quiz_id
+        FROM (SELECT user_id, subject_id, MAX(id) AS last_quiz_id,
+                     MAX(score) AS best_score, COUNT(*) AS attempts
+              FROM quizzes GROUP BY user_id, subject_id) agg
+        JOIN quizzes q ON q.id = agg.last_quiz_id
+        """,
+        (WEAK_THRESHOLD, INTERMEDIATE_THRESHOLD)
+    )
+    return cur.rowcount
+
+RESOURCES_SQL = """
+    SELECT subject_id, note_url, video_url FROM resources
+    WHERE subject_id IN (SELECT value FROM json_each(?))
+    ORDER BY id
+"""
+
+def _fetch_resources_for_subjects(subject_ids):
+    """Return {subject_id: (notes, videos)} for all the given subjects at once."""
+    resources = {subject_id: ([], []) for subject_id in subject_ids}
+    if not resources:
+        return resources
+    rows = get_connection().execute(RESOURCES_SQL, (json.dumps(list(resources)),))
+    for row in rows:
+        notes, videos = resources[row["subject_id"]]
+        notes.append(row["note_url"])
+        videos.append(row["video_url"])
+    return resources
+
+def get_recommendations_bulk(user_ids):
+    """Return {user_id: recommendations} for many users in one pass.
+    Each value has the same shape as get_recommendations() output.
+    """
+    scores = _get_scores_for_users(user_ids)
+    weak_subject_ids = {
+        subject_id
+        for user_scores in scores.values()
+        for subject_id, score, level in user_scores.values()
+        if level == "weak"
+    }
+    resources = _fetch_resources_for_subjects(weak_subject_ids)
+
+    results = {}
+    for user_id, user_scores in scores.items():
+        recommendations = {}
+        for subject_name, (subject_id, score, level) in user_scores.items():
+            if level == "weak":
+                notes, videos = resources[subject_id]
+            else:
+                notes, videos = [], []
+            recommendations[subject_name] = {
+                "level": level,
+                "score": score,
+                "notes": list(notes),
+                "videos": list(videos),
+            }
+        results[user_id] = recommendations
+    return results
+
+# ---------- Snapshots ----------
+# jobs.py precomputes rule recommendations for recently active users. A
+# snapshot is served only while the user has no newer quiz in the mastery
+# summary and the catalog (resource links) is the one it was built from.
+
+def refresh_snapshots(after_quiz_id=0, batch_size=SNAPSHOT_BATCH):
+    """Recompute the snapshots of users with quizzes after `after_quiz_id`.
+    Returns (users refreshed, last quiz id seen) for the next call.
+    """
+    conn = get_connection()
+    last_quiz_id = conn.execute(
+        "SELECT COALESCE(MAX(id), ?) FROM quizzes", (after_quiz_id,)
+    ).fetchone()[0]
+    user_ids = [row[0] for row in conn.execute(
+        "SELECT DISTINCT user_id FROM quizzes WHERE id > ? AND id <= ?", (after_quiz_id, last_quiz_id)
+    )]
+    version = catalog.get_version()[0]
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        # Read the quiz marks first: a quiz landing meanwhile only makes the
+        # snapshot look older than it is, never newer
+        marks = dict(conn.execute(
+            "SELECT user_id, MAX(last_quiz_id) FROM mastery "
+            "WHERE user_id IN (SELECT value FROM json_each(?)) GROUP BY user_id",
+            (json.dumps(batch),)
+        ).fetchall())
+        results = get_recommendations_bulk(batch)
+        with db.transaction() as wconn:
+            wconn.executemany(
+                "INSERT OR REPLACE INTO recommendation_snapshots "
+                "(user_id, last_quiz_id, catalog_version, payload) VALUES (?, ?, ?, ?)",
+                [(user_id, marks.get(user_id, 0), version, json.dumps(results[user_id]))
+                 for user_id in batch]
+            )
+    return len(user_ids), last_quiz_id
+
+# A snapshot is fresh if no quiz was taken after it was computed
+SNAPSHOT_SQL = (
+    "SELECT r.payload, r.catalog_version FROM recommendation_snapshots r "
+    "WHERE r.user_id = ? AND r.last_quiz_id >= "
+    "(SELECT COALESCE(MAX(m.last_quiz_id), 0) FROM mastery m WHERE m.user_id = r.user_id)"
+)
+
+def _read_snapshot(user_id):
+    row = get_connection().execute(SNAPSHOT_SQL, (user_id,)).fetchone()
+    if row is None or row[1] != catalog.get_version()[0]:
+        return None
+    return json.loads(row[0])
+
+def get_recommendations(user_id, strategy="rule"):
     """Return a dict mapping subject name to recommendation data.
+    `strategy` picks the engine, see STRATEGIES.
     Example output:
     {
         "Programming Fundamentals": {
@@ -67,18 +201,12 @@ def get_recommendations(user_id):
         ...
     }
     """
-    scores = _get_user_scores(user_id)
-    recommendations = {}
-    for row in scores:
-        level = _classify_score(row["score"])
-        if level == "weak":
-            notes, videos = _fetch_resources_for_subject(row["subject_id"])
-        else:
-            notes, videos = [], []
-        recommendations[row["subject_name"]] = {
-            "level": level,
-            "score": row["score"],
-            "notes": notes,
-            "videos": videos,
-        }
-    return recommendations
+    if strategy == "cf":
+        import cf
+        return cf.get_recommendations(user_id)
+    if strategy != "rule":
+        raise ValueError(f"Unknown recommendation strategy: {strategy!r}")
+    snapshot = _read_snapshot(user_id)
+    if snapshot is not None:
+        return snapshot
+    return get_recommendations_bulk([user_id])[user_id]
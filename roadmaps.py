@@ -0,0 +1,66 @@
+# roadmaps.py
+
+"""Domain (career) roadmaps shown on the dashboard.
+data/domain_roadmaps.json is parsed once into a per-branch dict and only
+re-read when its mtime/size change and its content hash differs.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+ROADMAPS_JSON = os.path.join(BASE_DIR, "data", "domain_roadmaps.json")
+
+# Minimum time (seconds) between stat() calls on the roadmap file
+ROADMAP_RECHECK_SECONDS = 1
+
+_lock = threading.Lock()
+_stamp = None       # (mtime_ns, size) of the file we loaded, or None if missing
+_digest = None
+_checked_at = 0.0
+_roadmaps = {}      # branch -> list of steps
+
+def _stat_stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _refresh():
+    global _stamp, _digest, _checked_at, _roadmaps
+    now = time.monotonic()
+    if now - _checked_at < ROADMAP_RECHECK_SECONDS:
+        return
+    with _lock:
+        if now - _checked_at < ROADMAP_RECHECK_SECONDS:
+            return
+        _checked_at = now
+        stamp = _stat_stamp(ROADMAPS_JSON)
+        if stamp == _stamp:
+            return
+        _stamp = stamp
+        if stamp is None:
+            _digest, _roadmaps = None, {}
+            return
+        with open(ROADMAPS_JSON, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        if digest == _digest:
+            return  # touched but not changed
+        try:
+            parsed = json.loads(raw)
+        except ValueError:
+            return  # keep serving the last good copy while a write is in progress
+        _digest = digest
+        _roadmaps = {branch: list(steps) for branch, steps in parsed.items()}
+
+def get_branch_roadmap(branch):
+    """Return the list of roadmap steps for `branch` (empty if unknown).
+    The list is shared between requests; treat it as read-only.
+    """
+    _refresh()
+    return _roadmaps.get(branch, [])
@@ -0,0 +1,245 @@
+# sessions.py
+
+"""Server-side sessions for LearningAI.
+The session cookie carries only an opaque, signed session id. The session
+data is stored in the `sessions` table and cached in a per-process LRU, so a
+request reads a ~60 byte cookie instead of decoding the whole signed session
+payload, and the usual request reads only the row's expiry by primary key.
+
+A session's data never changes under its id: a request that modifies the
+session stores it under a fresh id and deletes the old row. Any worker's
+cached copy of an id is therefore either current or gone (logged out), and
+the cache needs no cross-process invalidation: every request checks that the
+row still exists, so a logout on one worker holds on all of them at once.
+Rotating the id also means login never reuses a pre-login session id.
+
+Sessions expire SESSION_TTL seconds after they were last refreshed. Expired
+rows are deleted in batches during later requests.
+
+The signing key comes from SECRET_KEY, or else is generated once and kept in
+the `meta` table, so every gunicorn worker (and every restart) signs with
+the same key. SESSION_BACKEND=cookie keeps Flask's signed-cookie sessions.
+"""
+
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+import db
+
+BACKEND = os.environ.get("SESSION_BACKEND", "sqlite")                     # sqlite | cookie
+SESSION_TTL = int(os.environ.get("SESSION_TTL", str(7 * 24 * 3600)))     # seconds
+CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", "10000"))          # sessions kept per process
+CLEANUP_INTERVAL = 300              # seconds between expired-session purges
+CLEANUP_BATCH = 1000                # rows deleted per purge
+
+_encoder = json.JSONEncoder(separators=(",", ":"))
+
+def load_secret_key():
+    """Return SECRET_KEY, or the key stored in `meta` (created on first use)."""
+    key = os.environ.get("SECRET_KEY")
+    if key:
+        return key
+    key = db.get_meta(db.get_connection(), "secret_key")
+    if key is None:
+        # BEGIN IMMEDIATE: workers booting together agree on one key
+        with db.transaction() as conn:
+            key = db.get_meta(conn, "secret_key")
+            if key is None:
+                key = secrets.token_hex(32)
+                db.set_meta(conn, "secret_key", key)
+    return key
+
+# ---------- Storage ----------
+
+LOAD_SQL = "SELECT data, expires_at FROM sessions WHERE id = ?"
+EXPIRY_SQL = "SELECT expires_at FROM sessions WHERE id = ?"
+PURGE_SQL = "DELETE FROM sessions WHERE id IN (SELECT id FROM sessions WHERE expires_at < ? LIMIT ?)"
+
+class SqliteSessionStore:
+    """Session rows in the `sessions` table. Any object with the same methods
+    (get/expires_at/replace/touch/delete/purge_expired) can back
+    ServerSessionInterface.
+    """
+
+    def get(self, sid):
+        """Return (data, expires_at), or None if the session does not exist."""
+        row = db.get_connection().execute(LOAD_SQL, (sid,)).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def expires_at(self, sid):
+        """Return the session's expiry, or None if it does not exist."""
+        row = db.get_connection().execute(EXPIRY_SQL, (sid,)).fetchone()
+        return row[0] if row else None
+
+    def replace(self, old_sid, sid, data, expires_at):
+        """Store `data` under `sid` and drop `old_sid` (if any) in one transaction."""
+        with db.transaction() as conn:
+            conn.execute("INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?)",
+                         (sid, _encoder.encode(data), expires_at))
+            if old_sid:
+                conn.execute("DELETE FROM sessions WHERE id = ?", (old_sid,))
+
+    def touch(self, sid, expires_at):
+        with db.transaction() as conn:
+            conn.execute("UPDATE sessions SET expires_at = ? WHERE id = ?", (expires_at, sid))
+
+    def delete(self, sid):
+        with db.transaction() as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (sid,))
+
+    def purge_expired(self, now, limit):
+        """Delete up to `limit` expired sessions. Returns how many were deleted."""
+        with db.transaction() as conn:
+            return conn.execute(PURGE_SQL, (now, limit)).rowcount
+
+# ---------- Session interface ----------
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session data plus the id it is stored under (None for a new session)."""
+
+    def __init__(self, initial=None, sid=None, expires_at=None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.modified = False
+
+class ServerSessionInterface(SessionInterface):
+
+    def __init__(self, store, ttl=SESSION_TTL, cache_size=CACHE_SIZE):
+        self.store = store
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self._cache = OrderedDict()     # sid -> data
+        self._lock = threading.Lock()
+        self._next_cleanup = 0.0
+        self.stats = {"cache_hits": 0, "cache_misses": 0, "writes": 0, "purged": 0}
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt="learning-ai-session")
+
+    def _cached(self, sid):
+        with self._lock:
+            data = self._cache.get(sid)
+            if data is None:
+                self.stats["cache_misses"] += 1
+                return None
+            self._cache.move_to_end(sid)
+            self.stats["cache_hits"] += 1
+            return data
+
+    def _remember(self, sid, data):
+        with self._lock:
+            self._cache[sid] = data
+            self._cache.move_to_end(sid)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _forget(self, sid):
+        with self._lock:
+            self._cache.pop(sid, None)
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie or not app.secret_key:
+            return ServerSession()
+        try:
+            sid = self._signer(app).unsign(cookie).decode("ascii")
+        except BadSignature:
+            return ServerSession()
+        now = int(time.time())
+        # The data under an id never changes, but the row may be gone (logged
+        # out on any worker) or expired: check that before using the cache
+        data = self._cached(sid)
+        if data is None:
+            data, expires_at = self.store.get(sid) or (None, None)
+        else:
+            expires_at = self.store.expires_at(sid)
+        if expires_at is None or expires_at <= now:
+            self._forget(sid)
+            return ServerSession()
+        self._remember(sid, data)
+        # Copy: the cached dict is shared between this process's requests
+        return ServerSession(dict(data), sid, expires_at)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        now = int(time.time())
+
+        if not session:
+            if session.modified and session.sid:
+                self.store.delete(session.sid)
+                self._forget(session.sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app),
+                                       httponly=self.get_cookie_httponly(app))
+            return
+
+        response.vary.add("Cookie")
+        if session.modified:
+            # Never rewrite a session in place; see the module docstring
+            sid = secrets.token_urlsafe(32)
+            expires_at = now + self.ttl
+            data = dict(session)
+            self.store.replace(session.sid, sid, data, expires_at)
+            if session.sid:
+                self._forget(session.sid)
+            self._remember(sid, data)
+            with self._lock:
+                self.stats["writes"] += 1
+        elif session.expires_at - now < self.ttl // 2:
+            # Sliding expiry, written at most about twice per TTL
+            sid = session.sid
+            expires_at = now + self.ttl
+            self.store.touch(sid, expires_at)
+        else:
+            self._maybe_cleanup(now)
+            return
+
+        response.set_cookie(
+            name, self._signer(app).sign(sid).decode("ascii"),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain, path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+        self._maybe_cleanup(now)
+
+    def _maybe_cleanup(self, now):
+        if now < self._next_cleanup:
+            return
+        self._next_cleanup = now + CLEANUP_INTERVAL
+        purged = self.store.purge_expired(now, CLEANUP_BATCH)
+        with self._lock:
+            self.stats["purged"] += purged
+        if purged == CLEANUP_BATCH:
+            self._next_cleanup = now    # more to do; take another batch on the next request
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, cached=len(self._cache))
+
+def install(app):
+    """Give `app` its shared secret key and, unless SESSION_BACKEND=cookie,
+    server-side sessions. Returns the session interface installed (or None).
+    """
+    app.secret_key = load_secret_key()
+    if BACKEND == "cookie":
+        return None
+    if BACKEND != "sqlite":
+        raise ValueError(f"SESSION_BACKEND must be 'sqlite' or 'cookie', not {BACKEND!r}")
+    app.session_interface = ServerSessionInterface(SqliteSessionStore())
+    return app.session_interface
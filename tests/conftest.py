@@ -0,0 +1,61 @@
+# tests/conftest.py
+
+"""Shared fixtures. The suite runs against a scratch copy of the committed
+learning_ai.db (migrated when app.py is first imported), never the file in
+the repository, with background jobs, the password pool and the asset build
+turned off.
+
+    python -m pytest -q
+"""
+
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+BASELINE_DB = os.path.join(ROOT, "learning_ai.db")
+
+# Modules read their configuration at import, so set it before any is imported
+WORKDIR = tempfile.mkdtemp(prefix="learning-ai-tests-")
+os.environ["LEARNING_AI_DB"] = os.path.join(WORKDIR, "learning_ai.db")
+os.environ.pop("LEARNING_AI_CATALOG_DB", None)
+os.environ.pop("LEARNING_AI_METRICS", None)
+os.environ["LEARNING_AI_JOBS"] = "0"
+os.environ["PASSWORD_WORKERS"] = "0"
+os.environ["PASSWORD_METHOD"] = "pbkdf2:sha256:1000"
+os.environ["ASSETS_AUTOBUILD"] = "0"
+shutil.copyfile(BASELINE_DB, os.environ["LEARNING_AI_DB"])
+
+BRANCH = "Computer Science Engineering"
+PASSWORD = "correct horse"
+_emails = (f"student{n}@example.com" for n in itertools.count(1))
+
+@pytest.fixture(scope="session")
+def app():
+    import app as app_module
+    app_module.app.config["TESTING"] = True
+    return app_module.app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def user_client(client):
+    """A test client logged in as a new first-semester student."""
+    email = next(_emails)
+    client.post("/signup", data={"name": "Student", "email": email, "password": PASSWORD,
+                                 "branch": BRANCH, "semester": "1"})
+    response = client.post("/login", data={"email": email, "password": PASSWORD})
+    assert response.status_code == 302, response.data
+    return client
+
+@pytest.fixture
+def conn(app):
+    import db
+    return db.get_connection()
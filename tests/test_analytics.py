@@ -0,0 +1,42 @@
+# tests/test_analytics.py
+
+"""Vectorised analytics against the scalar code they stand in for."""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+def test_classify_levels_matches_classify_score():
+    import analytics
+    from recommender import _classify_score
+    scores = np.arange(-5, 106)
+    levels = analytics.classify_levels(scores)
+    assert [analytics.LEVELS[code] for code in levels.tolist()] == [_classify_score(s) for s in scores.tolist()]
+
+def test_check_levels_raises_on_disagreement(monkeypatch):
+    import analytics
+    analytics.check_levels(np.arange(0, 101))
+    monkeypatch.setattr(analytics, "WEAK_THRESHOLD", analytics.WEAK_THRESHOLD + 1)
+    with pytest.raises(ValueError, match="classify_levels"):
+        analytics.check_levels(np.arange(0, 101))
+
+def test_latest_attempts_keeps_the_last_per_pair():
+    import analytics
+    users, subjects, scores = (np.array(a) for a in ([1, 1, 2, 1], [5, 6, 5, 5], [10, 20, 30, 40]))
+    latest = sorted(zip(*(a.tolist() for a in analytics.latest_attempts(users, subjects, scores))))
+    assert latest == [(1, 5, 40), (1, 6, 20), (2, 5, 30)]
+
+def test_report_counts_every_latest_attempt(conn):
+    import analytics
+    report = analytics.build_report(conn)
+    pairs = conn.execute("SELECT COUNT(*) FROM (SELECT DISTINCT user_id, subject_id FROM quizzes)").fetchone()[0]
+    assert sum(report["level_totals"].values()) == pairs
+    assert report["attempts"] == conn.execute("SELECT COUNT(*) FROM quizzes").fetchone()[0]
+
+def test_functions_need_numpy(monkeypatch):
+    import analytics
+    monkeypatch.setattr(analytics, "np", None)
+    with pytest.raises(RuntimeError, match="requirements-analytics.txt"):
+        analytics.classify_levels([50])
+    with pytest.raises(RuntimeError):
+        analytics.build_report()
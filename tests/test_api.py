@@ -0,0 +1,60 @@
+# tests/test_api.py
+
+"""The /api/v1 endpoints: login, NDJSON paging and response compression."""
+
+import gzip
+import json
+
+from conftest import BRANCH
+
+def _user_id(user_client):
+    with user_client.session_transaction() as session:
+        return session["user_id"]
+
+def _ndjson(body):
+    return [json.loads(line) for line in body.decode("utf-8").splitlines()]
+
+def test_api_requires_login(client):
+    response = client.get("/api/v1/dashboard")
+    assert response.status_code == 401 and response.get_json() == {"error": "login required"}
+
+def test_unknown_strategy_is_a_json_400(user_client):
+    response = user_client.get("/api/v1/recommendations?strategy=nope")
+    assert response.status_code == 400 and "unknown strategy" in response.get_json()["error"]
+
+def test_quiz_history_resumes_after_a_quiz_id(app, user_client):
+    import catalog
+    import quiz_writer
+    user_id = _user_id(user_client)
+    subject_ids = [s["id"] for s in catalog.get_semester(BRANCH, 1)[:3]]
+    for subject_id, score in zip(subject_ids, (10, 50, 90)):
+        quiz_writer.store_attempt(user_id, subject_id, score, mode="sync")
+
+    response = user_client.get("/api/v1/quizzes")
+    assert response.mimetype == "application/x-ndjson"
+    history = _ndjson(response.get_data())
+    assert [(q["subject_id"], q["score"]) for q in history] == list(zip(subject_ids, (10, 50, 90)))
+    assert [q["id"] for q in history] == sorted(q["id"] for q in history)
+
+    rest = _ndjson(user_client.get(f"/api/v1/quizzes?after={history[0]['id']}").get_data())
+    assert rest == history[1:]
+    assert user_client.get(f"/api/v1/quizzes?after={history[-1]['id']}").get_data() == b""
+
+def test_streamed_subjects_are_gzipped_on_request(user_client):
+    plain = user_client.get("/api/v1/subjects")
+    assert "Content-Encoding" not in plain.headers and "Accept-Encoding" in plain.headers["Vary"]
+    compressed = user_client.get("/api/v1/subjects", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(compressed.get_data()) == plain.get_data()
+    subjects = _ndjson(plain.get_data())
+    assert subjects and all(s["branch"] == BRANCH for s in subjects)
+
+def test_json_documents_are_compressed_only_when_large(user_client):
+    import api
+    large = user_client.get("/api/v1/dashboard", headers={"Accept-Encoding": "gzip"})
+    assert large.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(large.get_data()))["user"]["branch"] == BRANCH
+    small = user_client.get("/api/v1/semesters/99", headers={"Accept-Encoding": "gzip"})
+    assert len(small.get_data()) < api.MIN_COMPRESS_BYTES
+    assert "Content-Encoding" not in small.headers
+    assert small.get_json()["subjects"] == []
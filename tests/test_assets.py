@@ -0,0 +1,72 @@
+# tests/test_assets.py
+
+"""Fingerprinted asset builds and their precompressed variants."""
+
+import gzip
+import os
+import re
+
+import pytest
+
+CSS = "/* page */\n" + "".join(f".rule-{n} {{\n    color: #{n:03d};\n    margin: 0 auto;\n}}\n" for n in range(200))
+
+@pytest.fixture
+def assets(app, tmp_path, monkeypatch):
+    """The assets module building from a scratch static/ directory."""
+    import assets
+    static = tmp_path / "static"
+    (static / "css").mkdir(parents=True)
+    (static / "css" / "site.css").write_text(CSS)
+    (static / "tiny.txt").write_text("hi")
+    monkeypatch.setattr(assets, "STATIC_DIR", str(static))
+    monkeypatch.setattr(assets, "DIST_DIR", str(static / "dist"))
+    monkeypatch.setattr(assets, "MANIFEST_PATH", str(static / "dist" / "manifest.json"))
+    monkeypatch.setattr(assets, "_manifest", None)
+    monkeypatch.setattr(assets, "_bodies", {})
+    return assets
+
+def _url(app, assets, name):
+    with app.test_request_context():
+        return assets.asset_url(name)
+
+def test_without_a_build_urls_point_at_static(app, assets):
+    assert _url(app, assets, "css/site.css") == "/static/css/site.css"
+
+def test_build_fingerprints_minifies_and_precompresses(app, assets):
+    manifest = assets.load(autobuild=True)
+    hashed = manifest["files"]["css/site.css"]
+    assert re.fullmatch(r"css/site\.[0-9a-f]{12}\.css", hashed)
+    assert _url(app, assets, "css/site.css") == f"/assets/{hashed}"
+
+    built = os.path.join(assets.DIST_DIR, hashed)
+    with open(built, encoding="utf-8") as f:
+        assert f.read() == assets.minify_css(CSS)
+    assert os.path.exists(built + ".gz") and "gzip" in manifest["encodings"][hashed]
+    # Too small to be worth compressing
+    assert manifest["encodings"][manifest["files"]["tiny.txt"]] == []
+
+def test_changed_source_gets_a_new_url(app, assets):
+    before = assets.load(autobuild=True)["files"]["css/site.css"]
+    with open(os.path.join(assets.STATIC_DIR, "css", "site.css"), "a", encoding="utf-8") as f:
+        f.write(".extra { color: red; }\n")
+    after = assets.load(autobuild=True)["files"]["css/site.css"]
+    assert after != before
+    assert _url(app, assets, "css/site.css") == f"/assets/{after}"
+
+def test_assets_are_served_precompressed_and_immutable(app, assets, client):
+    hashed = assets.load(autobuild=True)["files"]["css/site.css"]
+    plain = client.get(f"/assets/{hashed}")
+    assert plain.status_code == 200 and "Content-Encoding" not in plain.headers
+    assert plain.get_data(as_text=True) == assets.minify_css(CSS)
+    assert "immutable" in plain.headers["Cache-Control"] and plain.headers["Vary"] == "Accept-Encoding"
+
+    zipped = client.get(f"/assets/{hashed}", headers={"Accept-Encoding": "gzip"})
+    assert zipped.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(zipped.get_data()) == plain.get_data()
+
+    again = client.get(f"/assets/{hashed}", headers={"If-None-Match": plain.headers["ETag"]})
+    assert again.status_code == 304
+
+def test_unknown_assets_are_404(assets, client):
+    assets.load(autobuild=True)
+    assert client.get("/assets/css/site.000000000000.css").status_code == 404
@@ -0,0 +1,65 @@
+# tests/test_fragments.py
+
+"""The {% cache %} fragment cache and its invalidation by catalog version."""
+
+import pytest
+
+@pytest.fixture
+def catalog_version(app, monkeypatch):
+    """Set the catalog version the app sees; the real one comes back afterwards."""
+    import catalog
+    for name in ("_version", "_updated_at", "_checked_at"):
+        monkeypatch.setattr(catalog, name, getattr(catalog, name))
+    monkeypatch.setattr(catalog, "CATALOG_RECHECK_SECONDS", 0)
+    current = {"version": "test-1"}
+    monkeypatch.setattr(catalog, "_read_version", lambda: (current["version"], None))
+
+    def bump(version):
+        current["version"] = version
+    return bump
+
+@pytest.fixture
+def render(app):
+    def render(source, **context):
+        with app.app_context():
+            return app.jinja_env.from_string(source).render(**context)
+    return render
+
+def test_fragment_is_reused_until_the_catalog_changes(render, catalog_version):
+    source = '{% cache "test-count", 1 %}{{ n }}{% endcache %}'
+    assert render(source, n=1) == "1"
+    assert render(source, n=2) == "1"
+    catalog_version("test-2")
+    assert render(source, n=3) == "3"
+    assert render(source, n=4) == "3"
+
+def test_fragment_keys_are_separate(render, catalog_version):
+    source = '{% cache "test-keys", key %}{{ key }}{% endcache %}'
+    assert [render(source, key=k) for k in ("a", "b", "a")] == ["a", "b", "a"]
+
+def test_slots_are_filled_on_every_render(render, catalog_version):
+    source = ('{% macro fill(name) %}{{ scores[name] }}{% endmacro %}'
+              '{% cache "test-slots", 1 using fill %}{{ title }}: {{ slot("x") }}{% endcache %}')
+    assert render(source, title="Scores", scores={"x": 10}) == "Scores: 10"
+    assert render(source, title="Changed", scores={"x": 20}) == "Scores: 20"
+
+def test_cache_drops_fragments_rendered_from_an_old_catalog():
+    import fragments
+    cache = fragments.FragmentCache(max_bytes=100)
+    assert cache.get("k", "v1") is None
+    cache.put("k", "v1", ("html",), 4)
+    assert cache.get("k", "v1") == ("html",)
+    assert cache.get("k", "v2") is None
+    cache.put("k", "v1", ("stale",), 5)         # finished rendering after the bump
+    assert cache.get("k", "v2") is None
+
+def test_cache_evicts_the_least_recent_fragments_by_size():
+    import fragments
+    cache = fragments.FragmentCache(max_bytes=10)
+    cache.get("a", "v")
+    cache.put("a", "v", ("aaaa",), 4)
+    cache.put("b", "v", ("bbbb",), 4)
+    cache.get("a", "v")
+    cache.put("c", "v", ("cccc",), 4)
+    assert cache.get("b", "v") is None and cache.get("a", "v") and cache.get("c", "v")
+    assert cache.get_stats()["evictions"] == 1
@@ -0,0 +1,97 @@
+# tests/test_jobs.py
+
+"""Job leases: one run per due job however many schedulers poll."""
+
+import threading
+import time
+
+import pytest
+
+@pytest.fixture
+def jobs(app, monkeypatch):
+    """The jobs module with only the jobs a test registers."""
+    import jobs
+    monkeypatch.setattr(jobs, "JOBS", {})
+    return jobs
+
+@pytest.fixture
+def schedulers(jobs):
+    made = []
+
+    def make(owner):
+        scheduler = jobs.Scheduler(workers=1)
+        scheduler.owner = owner
+        made.append(scheduler)
+        return scheduler
+    yield make
+    for scheduler in made:
+        scheduler.stop()
+
+def _row(conn, name):
+    return conn.execute("SELECT * FROM jobs WHERE name = ?", (name,)).fetchone()
+
+def _wait_idle(scheduler, timeout=5):
+    deadline = time.monotonic() + timeout
+    while scheduler._running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not scheduler._running
+
+def test_two_schedulers_run_a_due_job_once(jobs, schedulers, conn):
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(threading.current_thread().name)
+        release.wait(5)
+        return "done"
+    jobs.JOBS["lease_once"] = jobs.Job("lease_once", slow, timeout=60)
+    jobs.request("lease_once")
+
+    first, second = schedulers("host:first"), schedulers("host:second")
+    first.tick()
+    second.tick()
+    assert first._running == {"lease_once"} and not second._running
+    assert _row(conn, "lease_once")["lease_owner"] == "host:first"
+
+    release.set()
+    _wait_idle(first)
+    second.tick()
+    row = _row(conn, "lease_once")
+    assert len(calls) == 1
+    assert row["runs"] == 1 and row["last_status"] == "ok"
+    assert row["lease_owner"] is None and row["next_run_at"] is None    # runs only on request
+
+def test_a_lapsed_lease_is_taken_over(jobs, schedulers, conn):
+    calls = []
+    jobs.JOBS["lease_lapsed"] = jobs.Job("lease_lapsed", lambda: calls.append(1), timeout=60)
+    jobs.request("lease_lapsed")
+    now = time.time()
+    with conn:      # a process that died mid-run
+        conn.execute("UPDATE jobs SET lease_owner = 'host:dead', lease_until = ? WHERE name = 'lease_lapsed'",
+                      (now + 60,))
+    survivor = schedulers("host:survivor")
+    survivor.tick()
+    assert not survivor._running and not calls
+
+    with conn:
+        conn.execute("UPDATE jobs SET lease_until = ? WHERE name = 'lease_lapsed'", (now - 1,))
+    survivor.tick()
+    _wait_idle(survivor)
+    assert calls == [1] and _row(conn, "lease_lapsed")["lease_owner"] is None
+
+def test_failed_runs_back_off_then_wait_for_the_next_run(jobs, conn):
+    def broken():
+        raise RuntimeError("boom")
+    jobs.JOBS["lease_failing"] = jobs.Job("lease_failing", broken, every=3600, retries=1)
+
+    started = time.time()
+    jobs.run("lease_failing")
+    row = _row(conn, "lease_failing")
+    assert row["last_status"] == "error" and "boom" in row["last_error"]
+    assert row["attempts"] == 1
+    assert row["next_run_at"] == pytest.approx(started + jobs.RETRY_DELAY, abs=5)
+
+    jobs.run("lease_failing")
+    row = _row(conn, "lease_failing")
+    assert row["attempts"] == 0 and row["failures"] == 2
+    assert row["next_run_at"] == pytest.approx(started + 3600, abs=5)
@@ -0,0 +1,46 @@
+# tests/test_library.py
+
+"""Conditional GETs of the library page."""
+
+from conftest import BRANCH
+
+def _library(client, etag=None, **params):
+    headers = {"If-None-Match": etag} if etag else {}
+    return client.get("/library", query_string={"branch": BRANCH, "semester": 2, **params}, headers=headers)
+
+def test_library_has_validators(user_client):
+    response = _library(user_client)
+    assert response.status_code == 200
+    etag, weak = response.get_etag()
+    assert etag and weak and response.last_modified is not None
+    assert response.cache_control.private and response.cache_control.no_cache
+    assert "Cookie" in response.vary
+
+def test_unchanged_library_is_not_modified(user_client):
+    etag = _library(user_client).headers["ETag"]
+    response = _library(user_client, etag)
+    assert response.status_code == 304 and response.get_data() == b""
+    assert response.headers["ETag"] == etag
+
+def test_etag_depends_on_the_page(user_client):
+    etag = _library(user_client).headers["ETag"]
+    assert _library(user_client, etag, semester=3).status_code == 200
+    assert _library(user_client, etag, after=10 ** 9).status_code == 200
+
+def test_post_is_never_not_modified(user_client):
+    etag = _library(user_client).headers["ETag"]
+    response = user_client.post("/library", data={"branch": BRANCH, "semester": 2}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+def test_catalog_change_invalidates_the_etag(user_client, monkeypatch):
+    import catalog
+    etag = _library(user_client).headers["ETag"]
+    for name in ("_version", "_updated_at", "_checked_at"):
+        monkeypatch.setattr(catalog, name, getattr(catalog, name))
+    monkeypatch.setattr(catalog, "CATALOG_RECHECK_SECONDS", 0)
+    monkeypatch.setattr(catalog, "_read_version", lambda: ("reseeded", None))
+    response = _library(user_client, etag)
+    assert response.status_code == 200 and response.headers["ETag"] != etag
+
+def test_library_requires_login(client):
+    assert _library(client).status_code == 302
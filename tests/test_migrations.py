@@ -0,0 +1,113 @@
+# tests/test_migrations.py
+
+"""The migration chain, run from the committed learning_ai.db, and the
+catalog file it produces."""
+
+import os
+import shutil
+import sqlite3
+import threading
+
+import pytest
+
+from conftest import BASELINE_DB
+
+@pytest.fixture
+def baseline(tmp_path):
+    """A copy of the committed database, still at its original schema."""
+    path = str(tmp_path / "learning_ai.db")
+    shutil.copyfile(BASELINE_DB, path)
+    return path
+
+def _connect(path):
+    import db
+    conn = sqlite3.connect(path)
+    db.attach_catalog(conn, db.catalog_path(path))
+    return conn
+
+def _tables(conn, schema="main"):
+    return {row[0] for row in conn.execute(f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table'")}
+
+def test_baseline_migrates_to_the_current_schema(app, baseline):
+    import db
+    import db_init
+    before = sqlite3.connect(baseline)
+    subjects = before.execute("SELECT id, branch, semester, name FROM subjects ORDER BY id").fetchall()
+    users = before.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    assert before.execute("PRAGMA user_version").fetchone()[0] == 0
+    before.close()
+
+    db_init.init_db(baseline)
+    conn = _connect(baseline)
+    assert conn.execute("PRAGMA main.user_version").fetchone()[0] == db_init.SCHEMA_VERSION
+    assert conn.execute("PRAGMA catalog.user_version").fetchone()[0] == db_init.CATALOG_SCHEMA_VERSION
+    # The catalog moved out with its ids; users stayed
+    assert not _tables(conn) & set(db_init.CATALOG_TABLES)
+    assert conn.execute("SELECT id, branch, semester, name FROM catalog.subjects ORDER BY id").fetchall() == subjects
+    assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == users
+    assert conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0] == len(subjects) * 5
+    assert db_init.check_query_plans(conn) == []
+    conn.close()
+    assert os.path.exists(db.catalog_path(baseline))
+
+def test_migrations_are_idempotent(app, baseline):
+    import db
+    import db_init
+    db_init.init_db(baseline)
+    catalog_file = db.catalog_path(baseline)
+    identity = db._file_identity(catalog_file)
+    db_init.init_db(baseline)
+    assert db._file_identity(catalog_file) == identity
+
+def test_quiz_history_survives_the_catalog_move(app, baseline):
+    import db_init
+    conn = sqlite3.connect(baseline)
+    with conn:
+        conn.executemany("INSERT INTO quizzes (user_id, subject_id, score) VALUES (1, ?, ?)",
+                         [(3, 40), (4, 90), (5, 10)])
+        conn.execute("DELETE FROM quizzes WHERE id = (SELECT MAX(id) FROM quizzes)")
+    history = conn.execute("SELECT * FROM quizzes ORDER BY id").fetchall()
+    sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'quizzes'").fetchone()[0]
+    conn.close()
+
+    db_init.init_db(baseline)
+    conn = _connect(baseline)
+    assert conn.execute("SELECT * FROM quizzes ORDER BY id").fetchall() == history
+    assert conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'quizzes'").fetchone()[0] == sequence
+    assert conn.execute("SELECT COUNT(*) FROM mastery").fetchone()[0] == 2
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'idx_quizzes_user_history'").fetchone()
+    conn.close()
+
+def test_user_tables_accept_writes_with_foreign_keys_on(app, baseline):
+    import db_init
+    db_init.init_db(baseline)
+    conn = _connect(baseline)
+    conn.execute("PRAGMA foreign_keys = ON")
+    assert not conn.execute("SELECT name FROM sqlite_master WHERE sql LIKE '%REFERENCES subjects%'").fetchall()
+    user_id = conn.execute("SELECT MIN(id) FROM users").fetchone()[0]
+    with conn:
+        quiz_id = conn.execute("INSERT INTO quizzes (user_id, subject_id, score) VALUES (?, 1, 80)",
+                               (user_id,)).lastrowid
+        conn.execute("INSERT INTO mastery VALUES (?, 1, 80, 80, 1, 'strong', ?)", (user_id, quiz_id))
+        conn.execute("INSERT INTO recommendations (user_id, subject_id, level) VALUES (?, 1, 'strong')",
+                     (user_id,))
+    assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+    conn.close()
+
+def test_concurrent_catalog_builds_run_once(app, tmp_path):
+    import db_init
+    path = str(tmp_path / "fresh.catalog.db")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(db_init.build_catalog(path)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == [False, False, False, True]
+
+def test_missing_catalog_is_reported_clearly(app, tmp_path):
+    import db
+    conn = sqlite3.connect(":memory:")
+    with pytest.raises(FileNotFoundError, match="db_init.py"):
+        db.attach_catalog(conn, str(tmp_path / "missing.catalog.db"))
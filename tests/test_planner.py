@@ -0,0 +1,66 @@
+# tests/test_planner.py
+
+"""Prerequisite ordering and learning-path planning."""
+
+import re
+
+import pytest
+
+from conftest import BRANCH
+
+def test_topological_order_puts_requirements_first():
+    import planner
+    nodes = [(1, "maths"), (2, "programming"), (3, "data structures"), (4, "algorithms")]
+    edges = [("data structures", "programming"), ("algorithms", "data structures"), ("algorithms", "maths")]
+    assert planner.topological_order(nodes, edges) == ["maths", "programming", "data structures", "algorithms"]
+
+def test_topological_order_breaks_ties_by_key():
+    import planner
+    assert planner.topological_order([(2, "b"), (1, "a"), (3, "c")], []) == ["a", "b", "c"]
+
+def test_topological_order_rejects_cycles():
+    import planner
+    with pytest.raises(ValueError, match="cycle"):
+        planner.topological_order([(1, "a"), (2, "b")], [("a", "b"), ("b", "a")])
+
+def test_default_requirements_chain_core_subjects():
+    import planner
+    assert planner.default_requirements("Data Structures") == ["Programming Fundamentals"]
+    assert planner.default_requirements("Robotics Core 3") == ["Robotics Core 2"]
+    assert planner.default_requirements("Robotics Core 1") == ["Engineering Mathematics-I"]
+    assert planner.default_requirements("Unknown Subject") == []
+
+@pytest.fixture
+def ids(app):
+    """Subject ids of the first Algorithms prerequisite chain in the seeded catalog."""
+    import catalog
+    def find(name, semester):
+        return catalog.find_subject(name, BRANCH, semester)["id"]
+    return {"maths": find("Engineering Mathematics-I", 1), "programming": find("Programming Fundamentals", 2),
+            "data structures": find("Data Structures", 2), "algorithms": find("Algorithms", 3)}
+
+def test_plan_covers_what_a_weak_subject_builds_on(ids):
+    import planner
+    path = planner.plan(BRANCH, {ids["algorithms"]: (30, "weak")})
+    assert [step["subject_id"] for step in path] == [
+        ids["maths"], ids["programming"], ids["data structures"], ids["algorithms"]]
+    assert all(step["needed_for"] == ["Algorithms"] for step in path[:-1])
+    assert path[-1]["score"] == 30 and path[0]["score"] is None
+
+def test_plan_stops_at_strong_subjects(ids):
+    import planner
+    mastery = {ids["algorithms"]: (30, "weak"), ids["data structures"]: (90, "strong")}
+    path = planner.plan(BRANCH, mastery)
+    assert [step["subject_id"] for step in path] == [ids["maths"], ids["algorithms"]]
+
+def test_plan_is_empty_without_weak_subjects(ids):
+    import planner
+    assert planner.plan(BRANCH, {ids["algorithms"]: (60, "intermediate")}) == []
+
+def test_recommendations_page_shows_the_path(user_client, ids):
+    # Fail the Algorithms quiz: every answer left blank
+    page = user_client.get(f"/quiz/{ids['algorithms']}").get_data(as_text=True)
+    token = re.search(r'name="quiz_token" value="([^"]+)"', page).group(1)
+    user_client.post(f"/quiz/{ids['algorithms']}", data={"quiz_token": token})
+    page = user_client.get("/recommendations").get_data(as_text=True)
+    assert "Programming Fundamentals" in page and "Data Structures" in page
@@ -0,0 +1,99 @@
+# tests/test_quiz_writer.py
+
+"""quiz_writer: the three QUIZ_WRITE_MODEs, batching and the fallbacks."""
+
+import itertools
+import queue
+import threading
+import time
+
+import pytest
+
+_user_ids = itertools.count(900001)     # no such users; foreign keys are not enforced
+
+@pytest.fixture
+def user_id(app):
+    return next(_user_ids)
+
+@pytest.fixture
+def subject_id(app):
+    import catalog
+    from conftest import BRANCH
+    return catalog.get_semester(BRANCH, 1)[0]["id"]
+
+@pytest.fixture
+def writer(monkeypatch):
+    """A private GroupCommitWriter standing in for the module's."""
+    import quiz_writer
+    writer = quiz_writer.GroupCommitWriter()
+    monkeypatch.setattr(quiz_writer, "_writer", writer)
+    yield writer
+    writer.stop(5)
+
+def _stored(conn, user_id):
+    return [row[0] for row in conn.execute(
+        "SELECT score FROM quizzes WHERE user_id = ? ORDER BY id", (user_id,))]
+
+def _mastery(conn, user_id, subject_id):
+    return conn.execute("SELECT latest_score, attempts FROM mastery WHERE user_id = ? AND subject_id = ?",
+                        (user_id, subject_id)).fetchone()
+
+@pytest.mark.parametrize("mode", ["sync", "group"])
+def test_acknowledged_attempt_is_committed(conn, writer, user_id, subject_id, mode):
+    import quiz_writer
+    quiz_writer.store_attempt(user_id, subject_id, 70, mode=mode)
+    assert _stored(conn, user_id) == [70]
+    assert tuple(_mastery(conn, user_id, subject_id)) == (70, 1)
+
+def test_async_attempt_is_committed_by_flush(conn, writer, user_id, subject_id):
+    import quiz_writer
+    quiz_writer.store_attempt(user_id, subject_id, 40, mode="async")
+    writer.flush(5)
+    assert _stored(conn, user_id) == [40]
+
+def test_group_commit_under_concurrency(conn, writer, user_id, subject_id):
+    import quiz_writer
+    threads = [threading.Thread(target=quiz_writer.store_attempt, args=(user_id, subject_id, score, "group"))
+               for score in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(_stored(conn, user_id)) == list(range(50))
+    assert _mastery(conn, user_id, subject_id)[1] == 50
+    stats = writer.get_stats()
+    assert stats["rows"] == 50 and 1 <= stats["batches"] <= 50
+
+def test_collect_drains_queued_items_without_waiting():
+    import quiz_writer
+    writer = quiz_writer.GroupCommitWriter(max_batch=3)
+    for n in range(5):
+        writer._queue.put(((n, n, n), None))
+    started = time.perf_counter()
+    assert [item[0][0] for item in writer._collect()] == [0, 1, 2]
+    assert [item[0][0] for item in writer._collect()] == [3, 4]
+    assert time.perf_counter() - started < 0.005
+
+def test_ack_timeout_falls_back_to_a_sync_write(conn, writer, monkeypatch, user_id, subject_id):
+    import quiz_writer
+    monkeypatch.setattr(quiz_writer, "ACK_TIMEOUT", 0.05)
+    writer.start = lambda: None     # a stalled writer thread
+    quiz_writer.store_attempt(user_id, subject_id, 55, mode="group")
+    assert _stored(conn, user_id) == [55]
+    assert writer.get_stats()["timeouts"] == 1
+    # Once the writer resumes it skips the withdrawn submission
+    del writer.start
+    writer.flush(5)
+    assert _stored(conn, user_id) == [55]
+
+def test_full_queue_falls_back_to_a_sync_write(conn, monkeypatch, user_id, subject_id):
+    import quiz_writer
+    writer = quiz_writer.GroupCommitWriter(queue_size=1)
+    writer.start = lambda: None
+    writer._queue.put_nowait(((user_id, subject_id, 1), None))
+    monkeypatch.setattr(quiz_writer, "_writer", writer)
+    quiz_writer.store_attempt(user_id, subject_id, 90, mode="async")
+    assert _stored(conn, user_id) == [90]
+    assert writer.get_stats()["fallbacks"] == 1
+    with pytest.raises(queue.Full):
+        writer.submit(user_id, subject_id, 10)
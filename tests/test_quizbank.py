@@ -0,0 +1,120 @@
+# tests/test_quizbank.py
+
+"""Quiz grading: quizbank.grade() and the quiz route that feeds it."""
+
+import re
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from conftest import BRANCH
+
+@pytest.fixture
+def subject(app):
+    import catalog
+    return catalog.get_semester(BRANCH, 1)[0]
+
+@pytest.fixture
+def answer_key(subject):
+    import quizbank
+    _, answers = quizbank.get_question_set(subject["id"])
+    assert answers, "every subject starts with the default questions"
+    return answers
+
+def _form(answers, wrong=()):
+    return MultiDict({f"q{qid}": str(answer + 1 if qid in wrong else answer)
+                      for qid, answer in answers.items()})
+
+def test_grade_all_correct(subject, answer_key):
+    import quizbank
+    assert quizbank.grade(subject["id"], list(answer_key), _form(answer_key)) == 100
+
+def test_grade_counts_wrong_answers(subject, answer_key):
+    import quizbank
+    served = list(answer_key)
+    score = quizbank.grade(subject["id"], served, _form(answer_key, wrong=served[:2]))
+    assert score == int((len(served) - 2) / len(served) * 100)
+
+def test_grade_unanswered_counts_as_wrong(subject, answer_key):
+    import quizbank
+    served = list(answer_key)
+    form = _form({qid: answer_key[qid] for qid in served[:1]})
+    assert quizbank.grade(subject["id"], served, form) == int(100 / len(served))
+
+def test_grade_rejects_non_numeric_choices(subject, answer_key):
+    import quizbank
+    form = MultiDict({f"q{qid}": "1 OR 1=1" for qid in answer_key})
+    assert quizbank.grade(subject["id"], list(answer_key), form) == 0
+
+def test_grade_ignores_ids_outside_the_subject(subject, answer_key):
+    import quizbank
+    served = list(answer_key) + [-1, 10 ** 9]
+    assert quizbank.grade(subject["id"], served, _form(answer_key)) == 100
+
+def test_grade_nothing_left_to_grade(subject, answer_key):
+    # e.g. the bank was reseeded between serving the quiz and submitting it
+    import quizbank
+    assert quizbank.grade(subject["id"], [], _form(answer_key)) is None
+    assert quizbank.grade(subject["id"], [10 ** 9], _form(answer_key)) is None
+
+def _latest_score(conn, user_client, subject_id):
+    with user_client.session_transaction() as session:
+        user_id = session["user_id"]
+    row = conn.execute("SELECT latest_score FROM mastery WHERE user_id = ? AND subject_id = ?",
+                       (user_id, subject_id)).fetchone()
+    return row[0] if row else None
+
+def _serve(user_client, subject_id):
+    """GET the quiz and return the signed token from its form."""
+    page = user_client.get(f"/quiz/{subject_id}").get_data(as_text=True)
+    return re.search(r'name="quiz_token" value="([^"]+)"', page).group(1)
+
+def _sign(user_client, subject_id, ids):
+    import app as app_module
+    with user_client.session_transaction() as session:
+        user_id = session["user_id"]
+    payload = f"{user_id}:{subject_id}:{','.join(map(str, ids))}"
+    return app_module._quiz_signer().sign(payload).decode("ascii")
+
+def test_quiz_route_grades_what_was_served(user_client, conn, subject, answer_key):
+    token = _serve(user_client, subject["id"])
+    response = user_client.post(f"/quiz/{subject['id']}", data={**_form(answer_key), "quiz_token": token})
+    assert response.status_code == 302 and response.headers["Location"].endswith("/dashboard")
+    assert _latest_score(conn, user_client, subject["id"]) == 100
+
+def test_quiz_get_leaves_the_session_alone(app, user_client, subject):
+    name = app.config["SESSION_COOKIE_NAME"]
+    cookie = user_client.get_cookie(name).value
+    _serve(user_client, subject["id"])
+    assert user_client.get_cookie(name).value == cookie
+
+def test_quiz_route_ignores_a_client_chosen_subset(user_client, conn, subject, answer_key):
+    # Answering one question and claiming it was the whole quiz scores that one only
+    qid = next(iter(answer_key))
+    token = _serve(user_client, subject["id"])
+    user_client.post(f"/quiz/{subject['id']}",
+                     data={"quiz_token": token, "question_ids": str(qid), f"q{qid}": str(answer_key[qid])})
+    assert _latest_score(conn, user_client, subject["id"]) == int(100 / len(answer_key))
+
+@pytest.mark.parametrize("token", ["", "1:1:1.bogus.signature"])
+def test_quiz_route_requires_a_served_quiz(user_client, conn, subject, answer_key, token):
+    response = user_client.post(f"/quiz/{subject['id']}", data={**_form(answer_key), "quiz_token": token})
+    assert response.status_code == 302
+    assert response.headers["Location"].endswith(f"/quiz/{subject['id']}")
+    assert _latest_score(conn, user_client, subject["id"]) is None
+
+def test_quiz_token_is_bound_to_its_subject(app, user_client, conn, subject, answer_key):
+    import catalog
+    other = catalog.get_semester(BRANCH, 1)[1]
+    token = _serve(user_client, other["id"])
+    response = user_client.post(f"/quiz/{subject['id']}", data={**_form(answer_key), "quiz_token": token})
+    assert response.headers["Location"].endswith(f"/quiz/{subject['id']}")
+    assert _latest_score(conn, user_client, subject["id"]) is None
+
+def test_quiz_after_a_reseed_is_served_again_unrecorded(user_client, conn, subject, answer_key):
+    # Every signed id has left the bank: nothing is graded or written
+    token = _sign(user_client, subject["id"], [10 ** 9])
+    response = user_client.post(f"/quiz/{subject['id']}", data={**_form(answer_key), "quiz_token": token})
+    assert response.headers["Location"].endswith(f"/quiz/{subject['id']}")
+    assert _latest_score(conn, user_client, subject["id"]) is None
+    assert "questions for this subject were updated" in user_client.get(f"/quiz/{subject['id']}").get_data(as_text=True)
@@ -0,0 +1,62 @@
+# tests/test_ratelimit.py
+
+"""Token buckets and the login rate limits built on them."""
+
+import itertools
+
+import pytest
+
+import ratelimit
+
+_emails = (f"limited{n}@example.com" for n in itertools.count())
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    return clock
+
+def test_bucket_allows_a_burst_then_refills(clock):
+    limiter = ratelimit.TokenBucketLimiter(rate=0.5, burst=3)
+    assert [limiter.acquire("k") for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("k") == pytest.approx(2.0)
+    assert limiter.acquire("other") == 0        # buckets are per key
+    clock.now += 2
+    assert limiter.acquire("k") == 0
+    assert limiter.acquire("k") > 0
+    assert limiter.rejected == 2
+
+def test_bucket_forgets_the_least_recent_keys(clock):
+    limiter = ratelimit.TokenBucketLimiter(rate=0.001, burst=1, max_keys=2)
+    for key in ("a", "b", "c"):
+        limiter.acquire(key)
+    assert limiter.acquire("a") == 0            # dropped, so a fresh bucket
+    assert limiter.acquire("c") > 0
+
+def _login(client, email, **kwargs):
+    return client.post("/login", data={"email": email, "password": "wrong"}, **kwargs)
+
+def test_login_is_limited_per_email(app, client):
+    import app as app_module
+    email = next(_emails)
+    for _ in range(app_module.LOGIN_EMAIL_LIMIT.burst):
+        assert _login(client, email).status_code == 200
+    response = _login(client, email.upper())
+    assert response.status_code == 429 and int(response.headers["Retry-After"]) > 0
+    assert "Too many attempts" in response.get_data(as_text=True)
+    assert _login(client, next(_emails)).status_code == 200
+
+def test_forwarded_for_does_not_dodge_the_ip_limit(app, client, monkeypatch):
+    # No trusted proxy by default: X-Forwarded-For is the client's own claim
+    import app as app_module
+    monkeypatch.setattr(app_module, "LOGIN_IP_LIMIT", ratelimit.TokenBucketLimiter(rate=0.001, burst=2))
+    statuses = [_login(client, next(_emails), headers={"X-Forwarded-For": f"10.0.0.{n}"}).status_code
+                for n in range(3)]
+    assert statuses == [200, 200, 429]
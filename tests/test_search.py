@@ -0,0 +1,69 @@
+# tests/test_search.py
+
+"""Subject search and the resource viewer's lookup."""
+
+import html
+import re
+from urllib.parse import urlencode
+
+import pytest
+
+from conftest import BRANCH
+
+def test_search_matches_word_prefixes_in_any_case(app):
+    import catalog
+    results = catalog.search("STRUCTURES dat", branch=BRANCH)
+    assert results[0]["name"] == "Data Structures"
+    assert all(r["branch"] == BRANCH for r in results)
+
+def test_search_covers_roadmap_topics(app):
+    import catalog
+    # Only in the roadmaps ("Review & Assessment"), never in a subject name
+    results = catalog.search("assessment", branch=BRANCH, limit=5)
+    assert len(results) == 5 and all("assessment" not in r["name"].lower() for r in results)
+
+def test_search_needs_every_word(app):
+    import catalog
+    assert catalog.search("data structures zzzunknown") == []
+
+@pytest.mark.parametrize("text", ["", "  ", "!!!", 'data" OR name:*', "NEAR(data structures)"])
+def test_search_text_is_never_fts_syntax(app, text):
+    import catalog
+    results = catalog.search(text)
+    assert isinstance(results, list)
+
+def test_broad_queries_rank_name_matches_first(app, monkeypatch):
+    import catalog
+    # Every roadmap has "Basics of ..."; one subject name has the word too
+    matches = catalog.search("basics", branch=BRANCH, limit=100)
+    monkeypatch.setattr(catalog, "SEARCH_CANDIDATES", len(matches) - 1)
+    results = catalog.search("basics", branch=BRANCH, limit=3)
+    assert len(results) == 3
+    assert "basics" in results[0]["name"].lower()
+    assert [r["id"] for r in results[1:]] == sorted(r["id"] for r in results[1:])
+
+def test_search_page(app, user_client):
+    page = user_client.get("/search?q=data+struc").get_data(as_text=True)
+    assert "Data Structures" in page and "css/library" in page
+    assert app.test_client().get("/search?q=data").status_code == 302
+
+def _embed_url(user_client, **params):
+    page = user_client.get("/view_resource?" + urlencode(params)).get_data(as_text=True)
+    return html.unescape(re.search(r'<iframe src="([^"]*)"', page).group(1))
+
+def test_view_resource_uses_the_subject_in_that_semester(user_client):
+    url = _embed_url(user_client, type="notes", subject="Data Structures", branch=BRANCH, semester=2)
+    assert url == "https://www.geeksforgeeks.org/data-structures/"
+
+def test_view_resource_finds_the_subject_in_another_semester(user_client):
+    # Same branch, exact name in any case
+    url = _embed_url(user_client, type="notes", subject="data structures", branch=BRANCH, semester=1)
+    assert url == "https://www.geeksforgeeks.org/data-structures/"
+
+@pytest.mark.parametrize("name", [
+    "Networking",           # only taught in other branches
+    "Data",                 # a partial name is not that subject
+])
+def test_view_resource_otherwise_searches_the_web(user_client, name):
+    url = _embed_url(user_client, type="notes", subject=name, branch=BRANCH, semester=1)
+    assert url.startswith("https://www.bing.com/search?q=" + name)
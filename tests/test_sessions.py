@@ -0,0 +1,105 @@
+# tests/test_sessions.py
+
+"""Server-side sessions: id rotation, expiry, logout and purging."""
+
+import time
+
+import pytest
+
+from conftest import BRANCH
+
+@pytest.fixture
+def interface(app):
+    return app.session_interface
+
+def _sid(app, client):
+    cookie = client.get_cookie(app.config["SESSION_COOKIE_NAME"])
+    if cookie is None:
+        return None
+    return app.session_interface._signer(app).unsign(cookie.value).decode("ascii")
+
+def _row(conn, sid):
+    return conn.execute("SELECT data, expires_at FROM sessions WHERE id = ?", (sid,)).fetchone()
+
+def test_login_stores_the_session_server_side(app, conn, user_client):
+    sid = _sid(app, user_client)
+    assert sid and _row(conn, sid) is not None
+    # The cookie carries only the signed id
+    assert len(user_client.get_cookie(app.config["SESSION_COOKIE_NAME"]).value) < 100
+
+def test_modified_session_gets_a_new_id(app, conn, user_client):
+    old = _sid(app, user_client)
+    user_client.post("/update_profile", data={"branch": BRANCH, "semester": "2"})
+    new = _sid(app, user_client)
+    assert new != old
+    assert _row(conn, old) is None and _row(conn, new) is not None
+
+def test_old_id_stops_working_after_rotation(app, user_client):
+    name = app.config["SESSION_COOKIE_NAME"]
+    old_cookie = user_client.get_cookie(name).value
+    user_client.post("/update_profile", data={"branch": BRANCH, "semester": "2"})
+    app.session_interface._cache.clear()
+    stale = app.test_client()
+    stale.set_cookie(name, old_cookie)
+    assert stale.get("/dashboard").status_code == 302
+
+def test_unmodified_session_keeps_its_id(app, user_client):
+    sid = _sid(app, user_client)
+    assert user_client.get("/dashboard").status_code == 200
+    assert _sid(app, user_client) == sid
+
+def test_expired_session_is_rejected(app, conn, interface, user_client):
+    sid = _sid(app, user_client)
+    with conn:
+        conn.execute("UPDATE sessions SET expires_at = ? WHERE id = ?", (int(time.time()) - 1, sid))
+    interface._cache.clear()
+    response = user_client.get("/dashboard")
+    assert response.status_code == 302 and response.headers["Location"].endswith("/login")
+
+def test_sliding_expiry_extends_a_half_used_session(app, conn, interface, user_client):
+    sid = _sid(app, user_client)
+    soon = int(time.time()) + interface.ttl // 4
+    with conn:
+        conn.execute("UPDATE sessions SET expires_at = ? WHERE id = ?", (soon, sid))
+    interface._cache.clear()
+    assert user_client.get("/dashboard").status_code == 200
+    assert _sid(app, user_client) == sid
+    assert _row(conn, sid)[1] >= int(time.time()) + interface.ttl - 5
+
+def test_tampered_cookie_starts_a_new_session(app, user_client):
+    name = app.config["SESSION_COOKIE_NAME"]
+    user_client.set_cookie(name, user_client.get_cookie(name).value[:-2] + "xx")
+    assert user_client.get("/dashboard").status_code == 302
+
+def test_logout_deletes_the_session(app, conn, user_client):
+    sid = _sid(app, user_client)
+    user_client.get("/logout")
+    assert _row(conn, sid) is None
+    assert _sid(app, user_client) is None
+
+def test_logout_holds_on_every_worker(app, user_client):
+    import sessions
+    name = app.config["SESSION_COOKIE_NAME"]
+    cookie = user_client.get_cookie(name).value
+    other = sessions.ServerSessionInterface(sessions.SqliteSessionStore())   # another worker
+
+    def open_on(interface):
+        with app.test_request_context(headers={"Cookie": f"{name}={cookie}"}) as ctx:
+            return interface.open_session(app, ctx.request)
+
+    assert "user_id" in open_on(other)      # now cached there
+    user_client.get("/logout")
+    assert "user_id" not in open_on(other)
+
+def test_purge_expired_deletes_in_batches(conn, interface):
+    now = int(time.time())
+    interface.store.purge_expired(now, 10 ** 6)     # left over by other tests
+    with conn:
+        conn.executemany("INSERT INTO sessions (id, data, expires_at) VALUES (?, '{}', ?)",
+                         [(f"expired-{n}", now - 10) for n in range(5)] + [("live", now + 60)])
+    assert interface.store.purge_expired(now, 3) == 3
+    assert interface.store.purge_expired(now, 3) == 2
+    assert interface.store.purge_expired(now, 3) == 0
+    assert _row(conn, "live") is not None
+    with conn:
+        conn.execute("DELETE FROM sessions WHERE id = 'live'")